@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Client-side throughput of get_events and UpdateHandler over loopback
+
+UpdateHandler is measured refreshing every event one by one and in storm
+mode, where the changed events are refreshed in bulk.
+
+The Zino server is an in-process handler on a socketpair (see
+``zinolib.zino_emu.loopback``), so what is measured is the cost of the
+client: framing, parsing, pipelining and building Event objects, without
+network latency and with a server that answers at once.
+
+Usage::
+
+    PYTHONPATH=src python3 benchmarks/bench_events.py
+"""
+
+import time
+
+from zinolib.config.zino1 import ZinoV1Config
+from zinolib.controllers.zino1 import SessionAdapter, UpdateHandler, Zino1EventManager
+from zinolib.framing import LineFramer
+from zinolib.ritz import ritz
+from zinolib.zino_emu import loopback
+
+
+KEY = "909e90c2eda89a09819ee7fe9b3f67cadb31449f"
+FIRST_ID = 100000
+
+
+def attrs(caseid):
+    return [
+        "state: open",
+        "router: uninett-tor-sw3",
+        "type: portstate",
+        "opened: 1677714463",
+        "lasttrans: 1686584585",
+        "id: %d" % caseid,
+        "port: xe-0/0/%d" % (caseid % 48),
+        "flaps: 0",
+        "updated: 1686584585",
+        "priority: 100",
+        "polladdr: 158.38.129.42",
+        "portstate: down",
+        "ifindex: %d" % (caseid % 1000),
+    ]
+
+
+HISTORY = [
+    "1678273372 state change embryonic -> open (monitor)",
+    "1678276375 someuser",
+    " manually recorded history message",
+    " ",
+]
+LOG = ["1683159556 some log message", "1683218672 some other log message"]
+
+
+def multiline(code, lines):
+    return "\r\n".join(["%d follows" % code] + lines + [".", ""])
+
+
+def make_server(cases):
+    "A Zino server that answers at once"
+    caseids = multiline(304, [str(FIRST_ID + i) for i in range(cases)]).encode()
+    history = multiline(301, HISTORY).encode()
+    log = multiline(300, LOG).encode()
+
+    def serve(client):
+        sock = client.sock
+        sock.settimeout(None)
+        sock.sendall(b"200 3f7b5a0e7c1d2e3f4a5b6c7d8e9f0a1b2c3d4e5f Hello\r\n")
+        framer = LineFramer(sock, 65536)
+        out = []
+        while True:
+            if not framer.fill():
+                return
+            for line in framer:
+                verb, _, arg = line.partition(" ")
+                if verb == "getattrs":
+                    out.append(multiline(303, attrs(int(arg))).encode())
+                elif verb == "gethist":
+                    out.append(history)
+                elif verb == "getlog":
+                    out.append(log)
+                elif verb == "caseids":
+                    out.append(caseids)
+                else:  # user, ntie
+                    out.append(b"200 ok\r\n")
+            sock.sendall(b"".join(out))
+            out.clear()
+    return serve
+
+
+def make_notifier(updates):
+    def serve(client):
+        lines = ["%s Hello" % KEY]
+        lines.extend("%d attr" % (FIRST_ID + i % 1000) for i in range(updates))
+        client.sock.sendall(("\r\n".join(lines) + "\r\n").encode())
+        client.stop_signal.wait()
+    return serve
+
+
+def make_manager(connector):
+    class LoopbackSessionAdapter(SessionAdapter):
+        @classmethod
+        def _create_request(cls, config):
+            return ritz(
+                config.server,
+                username=config.username,
+                password=config.password,
+                pipeline_window=config.pipeline_window,
+                connector=connector,
+            )
+
+        class _Session:
+            push = None
+            request = None
+
+    class LoopbackManager(Zino1EventManager):
+        _session_adapter = LoopbackSessionAdapter
+
+    config = ZinoV1Config.from_dict({
+        "connections": {"default": {"server": "zino", "username": "bench", "password": "bench"}},
+    })
+    manager = LoopbackManager.configure(config)
+    manager.connect()
+    return manager
+
+
+def bench_get_events(cases):
+    with loopback({8001: make_server(cases), 8002: make_notifier(0)}) as connector:
+        manager = make_manager(connector)
+        start = time.perf_counter()
+        manager.get_events()
+        seconds = time.perf_counter() - start
+        assert len(manager.events) == cases
+        manager.disconnect()
+    return seconds
+
+
+def bench_updates(updates):
+    with loopback({8001: make_server(1000), 8002: make_notifier(updates)}) as connector:
+        manager = make_manager(connector)
+        manager.get_events()
+        handler = UpdateHandler(manager)
+        handler.connect()
+        start = time.perf_counter()
+        handled = 0
+        while handled < updates:
+            if handler.get_event_update():
+                handled += 1
+        seconds = time.perf_counter() - start
+        manager.disconnect()
+    return seconds
+
+
+def bench_storm(updates):
+    "Time until every update has been received and its event refreshed"
+    with loopback({8001: make_server(1000), 8002: make_notifier(updates)}) as connector:
+        manager = make_manager(connector)
+        manager.get_events()
+        handler = UpdateHandler(manager, storm_threshold=100, storm_interval=0.1)
+        handler.connect()
+        start = time.perf_counter()
+        while handler.received < updates or handler.queue or handler.dirty:
+            handler.get_event_update()
+        seconds = time.perf_counter() - start
+        manager.disconnect()
+    return seconds, handler.stats["bulk_refreshes"]
+
+
+def main():
+    print(f"{'get_events cases':>16} {'seconds':>8} {'cases/s':>9}")
+    for cases in (1000, 10000, 50000):
+        seconds = bench_get_events(cases)
+        print(f"{cases:>16} {seconds:>8.3f} {cases / seconds:>9.0f}")
+    print()
+    print(f"{'updates':>16} {'seconds':>8} {'updates/s':>9}")
+    for updates in (1000, 10000):
+        seconds = bench_updates(updates)
+        print(f"{updates:>16} {seconds:>8.3f} {updates / seconds:>9.0f}")
+    print()
+    print(f"{'storm updates':>16} {'seconds':>8} {'updates/s':>9} {'bulk':>5}")
+    for updates in (1000, 10000):
+        seconds, bulk = bench_storm(updates)
+        print(f"{updates:>16} {seconds:>8.3f} {updates / seconds:>9.0f} {bulk:>5}")
+
+
+if __name__ == "__main__":
+    main()
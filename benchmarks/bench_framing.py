@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare the old str-concatenating response reader with LineFramer
+
+Feeds multi-megabyte ``caseids``-like responses through both in 4 KiB chunks,
+the way they would arrive from the socket, and prints the time taken per MiB.
+The LineFramer column should stay flat as the response grows.
+
+Usage::
+
+    PYTHONPATH=src python3 benchmarks/bench_framing.py
+"""
+
+import time
+
+from zinolib.framing import LineFramer
+
+
+CHUNK = 4096
+DELIMITER = "\r\n"
+
+
+def make_response(size):
+    lines = ["304 list of active cases follows, terminated with '.'"]
+    nbytes = 0
+    caseid = 100000
+    while nbytes < size:
+        line = str(caseid)
+        lines.append(line)
+        nbytes += len(line) + 2
+        caseid += 1
+    lines.append(".")
+    return (DELIMITER.join(lines) + DELIMITER).encode("ascii")
+
+
+def chunks(data):
+    for i in range(0, len(data), CHUNK):
+        yield data[i:i + CHUNK]
+
+
+def old_reader(data):
+    "The algorithm ritz._request used before LineFramer"
+    buffer = ""
+    r = []
+    for chunk in chunks(data):
+        buffer += chunk.decode("UTF-8", errors="windows_codepage_cp1252")
+        while buffer.find(DELIMITER) != -1:
+            line, buffer = buffer.split(DELIMITER, 1)
+            if line == ".":
+                return r
+            r.append(line)
+    return r
+
+
+def framer_reader(data):
+    framer = LineFramer()
+    r = []
+    for chunk in chunks(data):
+        framer.feed(chunk)
+        for line in framer:
+            if line == ".":
+                return r
+            r.append(line)
+    return r
+
+
+def timeit(function, data):
+    start = time.perf_counter()
+    function(data)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'size MiB':>8} {'old s/MiB':>10} {'framer s/MiB':>13}")
+    for mib in (1, 2, 4, 8):
+        data = make_response(mib * 1024 * 1024)
+        assert old_reader(data) == framer_reader(data)
+        old = timeit(old_reader, data)
+        new = timeit(framer_reader, data)
+        print(f"{mib:>8} {old / mib:>10.4f} {new / mib:>13.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Measure the sans-I/O protocol parsers without any sockets
+
+Feeds a pipelined burst of ``getattrs`` responses, one large ``caseids``
+response and a burst of notifications through the parsers in 4 KiB chunks
+and prints the throughput of each.
+
+Usage::
+
+    PYTHONPATH=src python3 benchmarks/bench_protocol.py
+"""
+
+import time
+
+from zinolib.protocol import ResponseParser, NotificationParser, END
+
+
+CHUNK = 4096
+DELIMITER = "\r\n"
+
+ATTRS = [
+    "state: open",
+    "router: uninett-tor-sw3",
+    "type: portstate",
+    "opened: 1677714463",
+    "lasttrans: 1686584585",
+    "id: %d",
+    "port: xe-0/0/1",
+    "flaps: 0",
+    "updated: 1686584585",
+    "priority: 100",
+    "polladdr: 158.38.129.42",
+    "portstate: down",
+    "ifindex: 654",
+]
+
+
+def getattrs_burst(count):
+    lines = []
+    for caseid in range(count):
+        lines.append("303 simple attributes follow, terminated with '.'")
+        lines.extend(attr % caseid if "%d" in attr else attr for attr in ATTRS)
+        lines.append(".")
+    return (DELIMITER.join(lines) + DELIMITER).encode("ascii")
+
+
+def caseids_response(count):
+    lines = ["304 list of active cases follows, terminated with '.'"]
+    lines.extend(str(100000 + i) for i in range(count))
+    lines.append(".")
+    return (DELIMITER.join(lines) + DELIMITER).encode("ascii")
+
+
+def notification_burst(count):
+    kinds = ["state open working", "attr", "log", "history", "scavenged"]
+    lines = ["%d %s" % (100000 + i, kinds[i % len(kinds)]) for i in range(count)]
+    return (DELIMITER.join(lines) + DELIMITER).encode("ascii")
+
+
+def chunks(data):
+    for i in range(0, len(data), CHUNK):
+        yield data[i:i + CHUNK]
+
+
+def parse_events(data):
+    parser = ResponseParser()
+    responses = 0
+    for chunk in chunks(data):
+        parser.feed(chunk)
+        for kind, _ in parser:
+            if kind == END:
+                responses += 1
+    return responses
+
+
+def parse_responses(data):
+    parser = ResponseParser()
+    responses = 0
+    for chunk in chunks(data):
+        parser.feed(chunk)
+        for _ in parser.responses():
+            responses += 1
+    return responses
+
+
+def parse_notifications(data):
+    parser = NotificationParser()
+    notifications = 0
+    for chunk in chunks(data):
+        parser.feed(chunk)
+        for _ in parser:
+            notifications += 1
+    return notifications
+
+
+def timeit(function, data):
+    start = time.perf_counter()
+    count = function(data)
+    return count, time.perf_counter() - start
+
+
+def main():
+    cases = [
+        ("getattrs x 10000, events", parse_events, getattrs_burst(10000)),
+        ("getattrs x 10000, responses", parse_responses, getattrs_burst(10000)),
+        ("caseids 500000, events", parse_events, caseids_response(500000)),
+        ("caseids 500000, responses", parse_responses, caseids_response(500000)),
+        ("notifications x 100000", parse_notifications, notification_burst(100000)),
+    ]
+    print(f"{'case':<30} {'MiB':>6} {'items':>8} {'MiB/s':>8} {'items/s':>10}")
+    for name, function, data in cases:
+        count, seconds = timeit(function, data)
+        mib = len(data) / 1024 / 1024
+        print(f"{name:<30} {mib:>6.1f} {count:>8} {mib / seconds:>8.1f} {count / seconds:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
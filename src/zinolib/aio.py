@@ -0,0 +1,595 @@
+"""
+asyncio client for the Zino 1 data channel
+
+Usage::
+
+    > from zinolib.aio import AsyncRitz
+    > async with AsyncRitz(server, username="123", password="123") as session:
+    >     caseids = await session.get_caseids()
+
+Any number of tasks may use the same session concurrently. Commands are
+written in the order they are awaited and pipelined on the one connection, a
+single reader task hands the responses back to the callers in order.
+Commands that need a second round ("addhist", "pm addlog") hold the write
+lock until their data has been sent, so nothing gets written in between.
+
+Updates from the notification channel are delivered as soon as they
+arrive::
+
+    > async with AsyncNotifier(session) as notifier:
+    >     async for update in notifier:
+    >         print(update.id, update.type, update.info)
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from time import mktime
+from typing import Deque, Optional
+
+from .protocol import ResponseParser, NotificationParser
+from .protocol import DataResponse, NotifierResponse
+from .protocol import AuthenticationError, NotConnectedError, ProtocolError, ZinoError
+from .ritz import ritz, _decode_history, caseState
+from .utils import generate_authtoken, enable_socket_keepalive
+
+
+__all__ = [
+    "AsyncRitz",
+    "AsyncNotifier",
+]
+
+
+LOG = logging.getLogger(__name__)
+
+
+class AsyncRitz:
+    """Connect to zino datachannel with asyncio
+
+    Usage:
+        session = AsyncRitz(server, username="123", password="123")
+        await session.connect()
+    or
+        async with AsyncRitz(server, username="123", password="123") as session:
+            ...
+    """
+    DELIMITER = ritz.DELIMITER
+
+    # Pure helpers shared with the blocking client
+    convert_attribute_list_to_case_dict = ritz.convert_attribute_list_to_case_dict
+    clean_attributes = ritz.clean_attributes
+
+    def __init__(self, server, port=8001, timeout=10, username=None, password=None, keepalive=True, recv_buffer=4096):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.recv_buffer = recv_buffer
+        self.connStatus = False
+        self.authenticated = None
+        self.authChallenge = None
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._waiting: Deque[asyncio.Future] = deque()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    @property
+    def connected(self):
+        """Returns True when datachannel is connected"""
+        return bool(self._writer and self.connStatus and self.authenticated)
+
+    async def connect(self):
+        """Connect to zino datachannel
+
+        Authenticates automatically if username and password were given.
+        """
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.server, self.port), self.timeout
+            )
+        # Not the builtin TimeoutError before Python 3.11, an OSError after
+        except asyncio.TimeoutError as e:
+            raise TimeoutError("Timed out connecting to server") from e
+        except OSError as e:
+            raise NotConnectedError(e) from e
+        self._write_lock = asyncio.Lock()
+        # The server greets us without being asked
+        greeting = self._expect_response()
+        self._reader_task = asyncio.create_task(self._read_responses())
+        try:
+            response = await self._wait(greeting, None)
+        except (ZinoError, TimeoutError):
+            await self.close()
+            raise
+        if response.header[0] != 200:
+            await self.close()
+            raise NotConnectedError("Did not get a status code 200")
+        self.authChallenge = response.header[1].split(" ", 1)[0]
+        self.connStatus = True
+
+        if self.keepalive:
+            enable_socket_keepalive(self._writer.get_extra_info("socket"))
+            LOG.info("Set keepalive on protocol socket")
+
+        if self.username and self.password:
+            await self.authenticate(self.username, self.password)
+
+    async def close(self):
+        """Disconnect zino datachannel"""
+        if self._reader_task:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._writer = None
+        self._fail_waiting(NotConnectedError("Connection closed"))
+        self.connStatus = False
+        self.authenticated = False
+
+    # IO
+
+    def _expect_response(self) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append(future)
+        return future
+
+    def _fail_waiting(self, exc):
+        while self._waiting:
+            future = self._waiting.popleft()
+            if not future.done():
+                future.set_exception(exc)
+
+    def _resolve(self, response):
+        future = self._waiting.popleft()
+        # A caller that timed out has cancelled its future, its response is
+        # dropped here which keeps everybody else in sync
+        if not future.done():
+            future.set_result(response)
+
+    async def _read_responses(self):
+        "Reader task: frame the responses and hand them out in order"
+        parser = ResponseParser()
+        try:
+            while True:
+                data = await self._reader.read(self.recv_buffer)
+                if not data:
+                    partial = parser.eof()
+                    if partial is not None:
+                        self._resolve(partial)
+                    self._connection_lost(ProtocolError(
+                        "No header info detected, buffer %s" % repr(parser.framer.pending)
+                    ))
+                    return
+                parser.feed(data)
+                for response in parser.responses():
+                    if not self._waiting:
+                        raise ProtocolError("Unexpected data from server: %s" % repr(response))
+                    self._resolve(response)
+        except ProtocolError as e:
+            # The stream can no longer be trusted
+            self._connection_lost(e)
+        except OSError as e:
+            self._connection_lost(NotConnectedError(f"Lost connection to server: {e}"))
+
+    def _connection_lost(self, exc):
+        "Fail everybody waiting, later commands get NotConnectedError"
+        self._fail_waiting(exc)
+        if self._writer:
+            self._writer.close()
+        self.connStatus = False
+        self.authenticated = False
+
+    def _locked(self) -> asyncio.Lock:
+        if self._write_lock is None:
+            raise NotConnectedError("Not connected to server")
+        return self._write_lock
+
+    async def _drain(self):
+        "Flush the writes, a lost connection fails the waiting commands"
+        try:
+            await self._writer.drain()
+        except OSError as e:
+            self._connection_lost(NotConnectedError(f"Lost connection to server: {e}"))
+
+    async def _wait(self, future, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError as e:
+            raise TimeoutError("Timed out waiting for data") from e
+
+    def _write(self, command: bytes) -> asyncio.Future:
+        if not self._writer or self._writer.is_closing():
+            raise NotConnectedError("Not connected to server")
+        delimiter = bytes(self.DELIMITER, "ascii")
+        if not command.endswith(delimiter):
+            command += delimiter
+        LOG.debug("send: %r", command)
+        self._writer.write(command)
+        return self._expect_response()
+
+    async def _request(self, command: bytes, timeout=None) -> DataResponse:
+        "Send a command and wait for its response"
+        async with self._locked():
+            future = self._write(command)
+            await self._drain()
+        return await self._wait(future, timeout)
+
+    async def _request_with_data(self, command: bytes, data: bytes, timeout=None):
+        """Send a command that answers "302", then the data
+
+        Returns the first response if it was not a "302", otherwise the
+        response to the data.
+        """
+        async with self._locked():
+            try:
+                response = await self._wait(self._write(command), timeout)
+                if response.header[0] != 302:
+                    return response
+                future = self._write(data)
+                await self._drain()
+            except BaseException:
+                # We no longer know if the server expects data, which would
+                # turn the next command into data. Give up the connection.
+                await self.close()
+                raise
+        return await self._wait(future, timeout)
+
+    # Commands
+
+    def check_connection(self):
+        if not self.connStatus:
+            raise NotConnectedError("Not connected to device")
+        if not self.authenticated:
+            raise AuthenticationError("User not authenticated")
+
+    def check_id(self, id_, id_name="Id"):
+        if not isinstance(id_, int):
+            raise TypeError(f"{id_name} needs to be an integer")
+
+    async def authenticate(self, user, password):
+        """Authenticate a user on the zino datachannel"""
+        if not self.connStatus:
+            raise NotConnectedError("Not connected to device")
+
+        authToken = generate_authtoken(self.authChallenge, password)
+        response = await self._request(b"user %s %s  -" % (user.encode("UTF-8"), authToken.encode()))
+        if response.header[0] == 200:
+            self.authenticated = True
+            return
+        raise AuthenticationError("Unable to authenticate user, '%s'" % repr(response.header))
+
+    async def get_caseids(self):
+        """Get list of CaseID's that exists in zino"""
+        self.check_connection()
+        response = await self._request(b"caseids")
+        return [int(id) for id in response.data if id.isdigit()]
+
+    async def get_raw_attributes(self, caseid):
+        """Collect all attributes of a zino CaseID object as a list of lines"""
+        self.check_connection()
+        self.check_id(caseid, "CaseID")
+        response = await self._request(b"getattrs %d" % caseid)
+        if response.header[0] >= 500:
+            raise ProtocolError(response.header)
+        return response.data
+
+    async def get_attributes(self, caseid):
+        """Collect all attributes of a zino CaseID object as a dict"""
+        attrlist = await self.get_raw_attributes(caseid)
+        caseinfo = self.convert_attribute_list_to_case_dict(attrlist)
+        return self.clean_attributes(caseinfo)
+
+    async def get_raw_history(self, caseid):
+        self.check_connection()
+        self.check_id(caseid, "CaseID")
+        return await self._request(b"gethist %d" % caseid)
+
+    async def get_history(self, caseid):
+        """Return all history elements of a CaseID"""
+        response = await self.get_raw_history(caseid)
+        return _decode_history(response.data)
+
+    async def get_raw_log(self, caseid):
+        self.check_connection()
+        self.check_id(caseid, "CaseID")
+        return await self._request(b"getlog %d" % caseid)
+
+    async def get_log(self, caseid):
+        """Return all log elements of a CaseID"""
+        response = await self.get_raw_log(caseid)
+        return _decode_history(response.data)
+
+    async def add_history(self, caseid, message):
+        """Add a history element on a CaseID"""
+        self.check_id(caseid, "CaseID")
+        if isinstance(message, list):
+            message = self.DELIMITER.join(message)
+        response = await self._request_with_data(
+            b"addhist %d  -" % caseid, b"%s\r\n\r\n." % message.encode()
+        )
+        if not response.header[0] == 200:
+            raise ProtocolError("Not getting 200 OK from server: %s" % response.data)
+        return True
+
+    async def set_state(self, caseid, state):
+        """Change state of a CaseID"""
+        if isinstance(state, str):
+            state = caseState(state)
+        elif not isinstance(state, caseState):
+            raise TypeError("State needs to be a string or caseState")
+        self.check_id(caseid, "CaseID")
+
+        response = await self._request(b"setstate %d %s" % (caseid, state.value.encode()))
+        if not response.header[0] == 200:
+            raise ValueError(
+                "Unable to change state on %d to %s. error: %s"
+                % (caseid, state, repr(response.header))
+            )
+        return True
+
+    async def _expect_ok(self, command: bytes, timeout=None):
+        response = await self._request(command, timeout)
+        if not response.header or response.header[0] != 200:
+            raise ZinoError("Not getting 200 OK from server: %s" % repr(response.header))
+        return response
+
+    async def clear_flapping(self, router, ifindex):
+        """Clear port flapping information on a interface"""
+        self.check_id(ifindex, "ifindex")
+        await self._expect_ok(b"clearflap %s %d" % (router.encode(), ifindex))
+        return True
+
+    async def poll_router(self, router):
+        """Poll a router for new data"""
+        await self._expect_ok(b"pollrtr %s" % router.encode())
+        return True
+
+    async def poll_interface(self, router, ifindex):
+        """Poll interface for new information"""
+        self.check_id(ifindex, "ifindex")
+        await self._expect_ok(b"pollintf %s %d" % (router.encode(), ifindex))
+        return True
+
+    async def ntie(self, key):
+        """Tie to notification notification channel"""
+        if isinstance(key, str):
+            key = key.encode()
+        elif not isinstance(key, bytes):
+            raise ValueError("key needs to be string or bytes")
+        await self._expect_ok(b"ntie %s" % key)
+        return True
+
+    @staticmethod
+    def _pm_timestamps(from_t, to_t):
+        if not isinstance(from_t, datetime):
+            raise TypeError("from_t is not a datetime")
+        if not isinstance(to_t, datetime):
+            raise TypeError("to_t is not a datetime")
+        if from_t > to_t:
+            raise ValueError("To timestamp is earlier than From timestamp")
+        return mktime(from_t.timetuple()), mktime(to_t.timetuple())
+
+    async def _pm_add(self, command: bytes) -> int:
+        response = await self._expect_ok(command)
+        return int(response.data.split(" ", 3)[2])
+
+    async def pm_add_device(self, from_t, to_t, device, m_type="exact"):
+        """Add Maintenance window on a device level"""
+        self.check_connection()
+        from_ts, to_ts = self._pm_timestamps(from_t, to_t)
+        if m_type not in ("exact", "str", "regexp"):
+            raise ZinoError("Unknown m_type, needs to be exact, str or regexp")
+        return await self._pm_add(
+            b"pm add %d %d device %s %s" % (from_ts, to_ts, m_type.encode(), device.encode())
+        )
+
+    async def pm_add_interface_byname(self, from_t, to_t, device, interface):
+        """Adds Maintenance window for interfaces based on interface name"""
+        self.check_connection()
+        from_ts, to_ts = self._pm_timestamps(from_t, to_t)
+        return await self._pm_add(
+            b"pm add %d %d portstate intf-regexp %s %s"
+            % (from_ts, to_ts, device.encode(), interface.encode())
+        )
+
+    async def pm_add_interface_bydescr(self, from_t, to_t, description):
+        """Add Maintenance window on interface level by interface description"""
+        self.check_connection()
+        from_ts, to_ts = self._pm_timestamps(from_t, to_t)
+        return await self._pm_add(
+            b"pm add %d %d portstate regexp %s" % (from_ts, to_ts, description.encode())
+        )
+
+    async def pm_list(self):
+        """List ID of all active Maintenance windows"""
+        self.check_connection()
+        response = await self._request(b"pm list")
+        return [int(id) for id in response.data if id.isdigit()]
+
+    async def pm_cancel(self, id):
+        """Cancel a Maintenance window"""
+        self.check_connection()
+        self.check_id(id)
+        await self._expect_ok(b"pm cancel %d" % id)
+        return True
+
+    async def pm_get_details(self, id):
+        """Get details of a Maintenance window"""
+        self.check_connection()
+        self.check_id(id)
+        response = await self._request(b"pm details %d" % id)
+        data2 = response.data.split(" ", 5)
+        return {
+            "id": int(data2[0]),
+            "from": datetime.fromtimestamp(int(data2[1])),
+            "to": datetime.fromtimestamp(int(data2[2])),
+            "type": data2[3],
+            "m_type": data2[4],
+            "device": data2[5],
+        }
+
+    async def pm_get_matching(self, id):
+        """Get elements matching a Maintenance window"""
+        self.check_connection()
+        self.check_id(id)
+        response = await self._request(b"pm matching %d" % id)
+        if response.header[0] >= 500:
+            return []
+        return [d.split(" ", 5)[1::] for d in response.data]
+
+    async def pm_add_log(self, id, message):
+        """Add log entry to a Maintenance window"""
+        self.check_connection()
+        self.check_id(id)
+        if isinstance(message, list):
+            message = self.DELIMITER.join(message)
+        response = await self._request_with_data(
+            b"pm addlog %d  -" % id, b"%s\r\n\r\n." % message.encode()
+        )
+        if not response.header[0] == 200:
+            raise ZinoError("Not getting 200 OK from server: %s" % repr(response.header))
+        return True
+
+    async def pm_get_log(self, id, timeout: Optional[float] = 30):
+        """List all log entries of a Maintenance window"""
+        self.check_connection()
+        self.check_id(id)
+        response = await self._request(b"pm log %d" % id, timeout)
+        if not response.header or response.header[0] >= 500:
+            return []
+        return _decode_history(response.data)
+
+
+class AsyncNotifier:
+    """Zino notifier socket with asyncio
+
+    Connects to the notification channel, reads the key the server sends and
+    ties it to ``zino_session`` with "ntie". Iterate over it to get
+    ``NotifierResponse`` tuples. The iteration ends when the notifier is
+    closed, and raises NotConnectedError if the server goes away.
+
+    Usage:
+        notify_session = AsyncNotifier(async_ritz_session)
+        await notify_session.connect()
+        async for update in notify_session:
+            ...
+    or
+        async with AsyncNotifier(async_ritz_session) as notify_session:
+            async for update in notify_session:
+                ...
+    """
+    KEY_LENGTH = 40
+
+    def __init__(self, zino_session, port=8002, timeout=30, keepalive=True, recv_buffer=4096):
+        self.zino_session = zino_session
+        self.port = port
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.recv_buffer = recv_buffer
+        self.connStatus = False
+        self._reader = None
+        self._writer = None
+        self._parser = NotificationParser()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> NotifierResponse:
+        if not self.connStatus:
+            raise StopAsyncIteration
+        notification = self._parser.next_notification()
+        while notification is None:
+            if not await self._fill():
+                if not self.connStatus:  # closed while we waited
+                    raise StopAsyncIteration
+                self.connStatus = False
+                raise NotConnectedError("Lost connection to server")
+            notification = self._parser.next_notification()
+        return notification
+
+    async def _fill(self) -> bool:
+        "Read more data, False if the connection is gone"
+        try:
+            data = await self._reader.read(self.recv_buffer)
+        except OSError:
+            return False
+        if not data:
+            return False
+        self._parser.feed(data)
+        return True
+
+    async def _readline(self) -> Optional[str]:
+        framer = self._parser.framer
+        line = framer.next_line()
+        while line is None:
+            if not await self._fill():
+                return None
+            line = framer.next_line()
+        return line
+
+    async def connect(self):
+        """Connect to notifier socket and tie it to the data channel"""
+        if self._writer:
+            return
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.zino_session.server, self.port), self.timeout
+            )
+            line = await asyncio.wait_for(self._readline(), self.timeout)
+        # Not the builtin TimeoutError before Python 3.11, an OSError after
+        except asyncio.TimeoutError as e:
+            await self.close()
+            raise TimeoutError("Timed out connecting to notifier") from e
+        except OSError as e:
+            await self.close()
+            raise NotConnectedError(e) from e
+        if line is None:
+            await self.close()
+            raise NotConnectedError("Lost connection to server")
+        key = line.split(" ", 1)[0]
+        if len(key) != self.KEY_LENGTH:
+            await self.close()
+            raise NotConnectedError("Key not found")
+        self.connStatus = True
+        try:
+            await self.zino_session.ntie(key)
+        except BaseException:
+            await self.close()
+            raise
+
+        if self.keepalive:
+            enable_socket_keepalive(self._writer.get_extra_info("socket"))
+            LOG.info("Set keepalive on notifier socket")
+
+    async def close(self):
+        self.connStatus = False
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._writer = None
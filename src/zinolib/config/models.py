@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Optional
 
 from pydantic import BaseModel
 
@@ -21,3 +21,8 @@ class ServerV1Config(BaseModel):
 class Options(BaseModel):
     autoremove: bool = False
     timeout: int = 30
+    # Timeouts for specific command verbs, like "caseids" or "pm log"
+    timeouts: Dict[str, float] = {}
+    pipeline_window: int = 32
+    adaptive_window: bool = False
+    account_io: bool = False
@@ -10,6 +10,13 @@ Expected format of toml-file::
     [options]
     timeout = 30
     autoremove = false
+    pipeline_window = 32
+    adaptive_window = false
+    account_io = false
+
+    [options.timeouts]
+    caseids = 60
+    "pm log" = 30
 
 This is parsed into a dict of the format::
 
@@ -25,6 +32,10 @@ This is parsed into a dict of the format::
         "options": {
             "timeout": 30,
             "autoremove": False,
+            "pipeline_window": 32,
+            "adaptive_window": False,
+            "account_io": False,
+            "timeouts": {"caseids": 60, "pm log": 30},
         },
     }
 """
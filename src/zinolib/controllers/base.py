@@ -12,8 +12,12 @@ class EventManager:
 
     A list of already existing events can be manipulated by an instance of
     this class out of the box, but the actual IO is done by subclasses.
+
+    ``versions`` counts the changes to each event, removal included, so a
+    copy of an event can be checked for being current.
     """
     events: Dict[int, Event]
+    versions: Dict[int, int]
 
     class ManagerException(Exception):
         pass
@@ -21,6 +25,7 @@ class EventManager:
     def __init__(self, session=None):
         self.session = session
         self.events = {}
+        self.versions = {}
         self.removed_ids = set()
 
     def _get_event(self, event_or_id: EventOrId) -> Event:
@@ -37,13 +42,19 @@ class EventManager:
             return event_or_id.id
         raise ValueError("Unknown type")
 
+    def _bump_version(self, event_id: int) -> int:
+        version = self.versions[event_id] = self.versions.get(event_id, 0) + 1
+        return version
+
     def _set_event(self, event: Event):
         self.events[event.id] = event
+        self._bump_version(event.id)
 
     def remove_event(self, event_or_id: EventOrId):
         event_id = self._get_event_id(event_or_id)
         self.events.pop(event_id, None)
         self.removed_ids.add(event_id)
+        self._bump_version(event_id)
 
     def _verify_session(self, quiet=False):
         if not self.session:
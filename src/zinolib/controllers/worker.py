@@ -0,0 +1,400 @@
+"""
+Keep the events of a manager up to date in the background
+
+Instead of calling ``UpdateHandler.get_event_update()`` in a loop of your
+own, let a worker thread do it and subscribe to the changes::
+
+    > updater = UpdateHandler(event_manager)
+    > updater.connect()
+    > with UpdateWorker(updater) as worker:
+    >     changes = worker.subscribe(lambda change: change.event_id in interesting)
+    >     for change in changes:
+    >         print(change.event_id, change.removed, change.version)
+
+The worker sleeps in ``select()`` until a notification arrives or the
+handler has scheduled work, like a coalesced refresh. Every subscriber has a
+queue of its own, bounded by ``maxsize``: when a subscriber falls behind,
+its oldest changes are dropped (see ``Subscription.dropped``), the worker
+and the other subscribers are not held up. The event in a change is the
+copy that was current when it was published, ``event_manager.events`` has
+the latest.
+
+With asyncio, the worker still runs in a thread of its own but the changes
+are delivered to the event loop::
+
+    > async with AsyncUpdateWorker(updater) as worker:
+    >     async for change in worker.subscribe():
+    >         ...
+"""
+
+import asyncio
+import logging
+import queue
+import select
+import socket
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+from ..event_types import Event
+from ..protocol import NotConnectedError, ZinoError
+
+
+__all__ = [
+    "Change",
+    "Subscription",
+    "AsyncSubscription",
+    "UpdateWorker",
+    "AsyncUpdateWorker",
+]
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Change(NamedTuple):
+    event_id: int
+    # None if the event was removed
+    event: Optional[Event]
+    version: int
+
+    @property
+    def removed(self) -> bool:
+        return self.event is None
+
+
+class Subscription:
+    """A bounded queue of changes for one subscriber
+
+    Iterate over it, or ``get()`` one change at a time. Both end when the
+    worker stops or the subscription is cancelled.
+    """
+
+    def __init__(self, worker, filter: Optional[Callable] = None, maxsize=1000):
+        self.worker = worker
+        self.filter = filter
+        self.dropped = 0
+        self.closed = False
+        self._queue: queue.Queue = queue.Queue(maxsize)
+
+    def __iter__(self):
+        while True:
+            change = self.get()
+            if change is None:
+                return
+            yield change
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _put(self, item):
+        "Never blocks, drops the oldest change when full"
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _offer(self, change: Change):
+        if not self.closed:
+            self._put(change)
+
+    def _close(self):
+        if not self.closed:
+            self.closed = True
+            self._put(None)
+
+    def get(self, timeout=None) -> Optional[Change]:
+        """Wait up to ``timeout`` seconds for the next change
+
+        Raises queue.Empty on timeout, returns None when closed.
+        """
+        if self.closed and self._queue.empty():
+            return None
+        return self._queue.get(timeout=timeout)
+
+    def cancel(self):
+        "Stop receiving changes"
+        self.worker.unsubscribe(self)
+
+
+class AsyncSubscription:
+    """A bounded asyncio queue of changes for one subscriber
+
+    Use ``async for``, or ``await get()`` one change at a time.
+    """
+
+    def __init__(self, worker, loop, filter: Optional[Callable] = None, maxsize=1000):
+        self.worker = worker
+        self.filter = filter
+        self.dropped = 0
+        self.closed = False
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Change:
+        change = await self.get()
+        if change is None:
+            raise StopAsyncIteration
+        return change
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _put(self, item):
+        "Runs in the event loop, drops the oldest change when full"
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def _call(self, function, *args):
+        try:
+            self._loop.call_soon_threadsafe(function, *args)
+        except RuntimeError:
+            # The event loop is closed, there is no one to tell
+            pass
+
+    def _offer(self, change: Change):
+        if not self.closed:
+            self._call(self._put, change)
+
+    def _close(self):
+        if not self.closed:
+            self.closed = True
+            self._call(self._put, None)
+
+    async def get(self) -> Optional[Change]:
+        "Wait for the next change, None when closed"
+        if self.closed and self._queue.empty():
+            return None
+        return await self._queue.get()
+
+    def cancel(self):
+        "Stop receiving changes"
+        self.worker.unsubscribe(self)
+
+
+class UpdateWorker:
+    """Run an UpdateHandler in a thread and publish the changes
+
+    ``poll_timeout`` is the longest the worker sleeps without checking the
+    connection. If the notifier is lost, the worker stops and the error is
+    in ``error``.
+
+    Timeouts and lost connections on the data channel are not fatal: the
+    worker waits ``retry_delay`` seconds, reconnects the data channel if it
+    was closed and resyncs all events, since updates may have been missed.
+    """
+
+    def __init__(self, handler, poll_timeout=1.0, retry_delay=1.0):
+        self.handler = handler
+        self.manager = handler.manager
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self.recoveries = 0
+        self.subscriptions: List = []
+        self.error: Optional[BaseException] = None
+        self.published = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup_recv: Optional[socket.socket] = None
+        self._wakeup_send: Optional[socket.socket] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, filter: Optional[Callable] = None, maxsize=1000) -> Subscription:
+        """Receive the changes for which ``filter(change)`` is true, or all
+
+        At most ``maxsize`` changes are kept waiting.
+        """
+        return self._add(Subscription(self, filter, maxsize))
+
+    def _add(self, subscription):
+        with self._lock:
+            self.subscriptions.append(subscription)
+        if self.error is not None or self._stopping.is_set():
+            subscription._close()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+        subscription._close()
+
+    def _publish(self, event_id: int):
+        "Called by the handler on the worker thread for every change"
+        change = Change(
+            event_id,
+            self.manager.events.get(event_id),
+            self.manager.versions.get(event_id, 0),
+        )
+        self.published += 1
+        with self._lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                if subscription.filter is None or subscription.filter(change):
+                    subscription._offer(change)
+            except Exception:
+                LOG.exception("Filter of %r failed", subscription)
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self.error = None
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self.handler.subscribe(self._publish)
+        self._thread = threading.Thread(target=self._run, name="zino-updates", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        "Stop the worker and end all subscriptions"
+        self._stopping.set()
+        if self._wakeup_send is not None:
+            try:
+                self._wakeup_send.send(b"\0")
+            except OSError:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._close()
+
+    def _close(self):
+        if self._publish in self.handler.subscribers:
+            self.handler.unsubscribe(self._publish)
+        with self._lock:
+            subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription._close()
+        for sock in (self._wakeup_recv, self._wakeup_send):
+            if sock is not None:
+                sock.close()
+        self._wakeup_recv = self._wakeup_send = None
+
+    def _wait(self):
+        "Sleep until there is something to read or scheduled work is due"
+        timeout = self.poll_timeout
+        due = self.handler.next_due()
+        if due is not None:
+            timeout = min(timeout, due)
+        push = self.manager.session.push
+        readable, _, _ = select.select([push, self._wakeup_recv], [], [], timeout)
+        if self._wakeup_recv in readable:
+            try:
+                while self._wakeup_recv.recv(64):
+                    pass
+            except OSError:
+                pass
+
+    def _data_channel_lost(self) -> bool:
+        request = getattr(self.manager.session, "request", None)
+        return request is not None and not request.connected
+
+    def _recover(self, error):
+        "Get going again after a failure on the data channel"
+        LOG.warning("Update failed, resyncing: %s", error)
+        self.recoveries += 1
+        if self._stopping.wait(self.retry_delay):
+            return
+        if self._data_channel_lost():
+            try:
+                self.manager.session.request.connect()
+            except (ZinoError, OSError) as e:
+                LOG.warning("Failed to reconnect, retrying: %s", e)
+                return
+        self.handler.resync_pending = True
+
+    def _run(self):
+        handler = self.handler
+        try:
+            while not self._stopping.is_set():
+                try:
+                    changed = handler.get_event_update()
+                except handler.SocketError:
+                    raise
+                except NotConnectedError as e:
+                    if not self._data_channel_lost():
+                        raise  # The notifier is gone
+                    self._recover(e)
+                    continue
+                except (TimeoutError, OSError) as e:
+                    self._recover(e)
+                    continue
+                except (ZinoError, self.manager.ManagerException) as e:
+                    # The next notification may well succeed
+                    LOG.warning("Update failed: %s", e)
+                    changed = True
+                if not changed and not handler.queue:
+                    self._wait()
+        except Exception as e:
+            LOG.exception("Update worker stopped")
+            self.error = e
+        finally:
+            self._stopping.set()
+            with self._lock:
+                subscriptions, self.subscriptions = self.subscriptions, []
+            for subscription in subscriptions:
+                subscription._close()
+
+
+class AsyncUpdateWorker:
+    """An UpdateWorker delivering the changes to an asyncio event loop
+
+    The manager is blocking, so the updates are still handled in a thread.
+    """
+
+    def __init__(self, handler, poll_timeout=1.0, retry_delay=1.0):
+        self.worker = UpdateWorker(handler, poll_timeout, retry_delay)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.stop()
+
+    @property
+    def error(self):
+        return self.worker.error
+
+    def start(self):
+        self.worker.start()
+
+    async def stop(self):
+        "Stop the worker and end all subscriptions"
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.worker.stop)
+
+    def subscribe(self, filter: Optional[Callable] = None, maxsize=1000) -> AsyncSubscription:
+        """Receive the changes for which ``filter(change)`` is true, or all
+
+        Call from the event loop. At most ``maxsize`` changes are kept
+        waiting.
+        """
+        loop = asyncio.get_running_loop()
+        return self.worker._add(AsyncSubscription(self, loop, filter, maxsize))
+
+    def unsubscribe(self, subscription):
+        self.worker.unsubscribe(subscription)
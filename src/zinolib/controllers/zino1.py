@@ -18,6 +18,11 @@ The configuration can also be stored in a toml-file::
 
 Do not initialize ZinoV1Config directly, avoid ``ZinoV1Config(**dict)``.
 
+To use the event manager from several threads at once, configure it with a
+pool of request sessions::
+
+    > event_manager = Zino1EventManager.configure(config, pool_size=4)
+
 Authenticate using a username and password from the config-file::
 
     > event_manager.authenticate()
@@ -53,6 +58,42 @@ The updater is unique per authenticated user and is only available after login.
 change, falsey otherwise. Check the id against the removed_id's set to see if
 it has been removed from the server.
 
+If the updates may come faster than they are handled, bound the queue::
+
+    > updater = UpdateHandler(event_manager, queue_size=1000)
+
+When more than ``queue_size`` notifications are waiting they are dropped and
+all events are fetched anew instead, then ``get_event_update()`` returns
+True. See ``updater.stats`` for how often that happens.
+
+To not refetch every event one by one when a router reload sends thousands
+of notifications, set a threshold in updates per second::
+
+    > updater = UpdateHandler(event_manager, storm_threshold=50, on_mode_change=callback)
+
+Above it the changed events are only marked dirty and are refreshed in bulk
+every ``storm_interval`` seconds, ``get_event_update()`` returns True after
+each bulk refresh.
+
+Zino usually sends several notifications for an event at once, "attr",
+"log" and "state" say. To refresh the event once for all of them, wait a
+little before refreshing::
+
+    > updater = UpdateHandler(event_manager, coalesce_window=0.2)
+
+State changes can be shown before the server has been asked::
+
+    > updater = UpdateHandler(event_manager, apply_state=True)
+
+The new state is set on a copy of the cached event right away, and the
+event is refreshed from the server a little later to verify it. To hear
+about every change as it happens, subscribe::
+
+    > updater.subscribe(callback)  # callback(event_id)
+
+``event_manager.versions[event_id]`` is bumped on every change. To have all
+this done in a background thread, see ``zinolib.controllers.worker``.
+
 To get history for a specific event::
 
     > history_list = event_manager.get_history_for_id(INT)
@@ -76,14 +117,22 @@ Both return the changed event.
 The adapters are not meant to be used directly.
 """
 
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Dict, Iterable, List, TypedDict, Optional, Set
+from typing import Callable, Deque, Dict, FrozenSet, Iterable, List, TypedDict, Optional, Set, Tuple
+import functools
+import hashlib
 import logging
+import threading
+import time
 
 from .base import EventManager, EventOrId
 from ..compat import StrEnum
 from ..event_types import EventType, Event, HistoryEntry, LogEntry, AdmState
-from ..ritz import ZinoError, ProtocolError, ritz, notifier, NotConnectedError
+from ..pool import RitzPool, is_healthy
+from ..ritz import ZinoError, ProtocolError, ritz, NotConnectedError, NotifierResponse
+from ..singleflight import SingleFlight
 from ..utils import log_exception_with_params
 
 
@@ -128,6 +177,50 @@ def convert_timestamp(timestamp: int) -> datetime:
     return datetime.fromtimestamp(timestamp, timezone.utc)
 
 
+def coalesced(verb):
+    """Let concurrent calls for the same event id share one request
+
+    Only active if the manager has a ``singleflight``, never use on writes.
+    Other arguments are passed on but are not part of the key, so a call
+    that joins one already running gets its result or its error, timeouts
+    included, whatever timeout it was given itself. The result is shared
+    as well, never change it.
+    """
+    def inner(method):
+        @functools.wraps(method)
+        def wrapper(self, event_id, *args, **kwargs):
+            if self.singleflight is None:
+                return method(self, event_id, *args, **kwargs)
+            return self.singleflight.do((verb, event_id), method, self, event_id, *args, **kwargs)
+        return wrapper
+    return inner
+
+
+def _pipelined(request, command: bytes, event_ids: Iterable[int]):
+    """Send ``command % event_id`` for each id, one pipeline per window
+
+    Yields (event_id, lines) pairs, lines is a ProtocolError instead if the
+    server had an error for that id.
+
+    The window is the adaptive one if the session has it. It is tuned by the
+    bulk "getattrs", a pipeline is read all at once so there is no latency
+    per response to tune it with here.
+    """
+    event_ids = list(event_ids)
+    tuner = getattr(request, "window", None)
+    window = max(1, request.pipeline_window if tuner is None else tuner.size)
+    for start in range(0, len(event_ids), window):
+        chunk = event_ids[start:start + window]
+        pipe = request.pipeline()
+        for event_id in chunk:
+            pipe.request(command % event_id)
+        for event_id, response in zip(chunk, pipe.execute()):
+            if response.header[0] >= 500:
+                yield event_id, ProtocolError(response.header)
+            else:
+                yield event_id, response.data
+
+
 class UpdateHandler:
     class UpdateType(StrEnum):
         STATE = "state"
@@ -136,13 +229,55 @@ class UpdateHandler:
         LOG = "log"
         SCAVENGED = "scavenged"
 
+    class Mode(StrEnum):
+        NORMAL = "normal"
+        STORM = "storm"
+
     class UpdateError(Zino1Error):
         pass
 
     class SocketError(UpdateError):
         pass
 
-    def __init__(self, manager, autoremove=False):
+    # The parts of an event to fetch again for each update type. A state
+    # change is also recorded in the history
+    REFRESHES = {
+        UpdateType.STATE: frozenset(("attrs", "history")),
+        UpdateType.ATTR: frozenset(("attrs",)),
+        UpdateType.HISTORY: frozenset(("history",)),
+        UpdateType.LOG: frozenset(("log",)),
+    }
+    ALL_PARTS = frozenset(("attrs", "history", "log"))
+
+    # Notifications read per call while throwing them away
+    DRAIN_BATCH = 1024
+
+    # For testing
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(self, manager, autoremove=False, queue_size=None,
+                 storm_threshold=None, storm_interval=1.0, on_mode_change=None,
+                 coalesce_window=None, apply_state=False, verify_delay=2.0):
+        """
+        With a ``queue_size``, at most that many notifications are queued
+        up. If the consumer falls further behind than that, the queued
+        notifications are stale: they are dropped and the events are
+        resynced from the server instead, see ``ingest()``.
+
+        With a ``storm_threshold``, more notifications per second than that
+        switches to storm mode: the ids are only marked dirty, and the
+        dirty events are refreshed in bulk every ``storm_interval``
+        seconds. When the rate is back below the threshold, the normal mode
+        resumes. ``on_mode_change(mode, rate)`` is called on both switches.
+
+        With a ``coalesce_window``, an event is refreshed that many seconds
+        after the first notification about it, and the notifications about
+        it in the meantime share that refresh.
+
+        With ``apply_state``, a state change is applied to the local copy of
+        the event at once, and the event is verified against the server
+        ``verify_delay`` seconds later.
+        """
         self._connected = False
         if not manager.is_authenticated:
             msg = "Cannot initiate update handler, not authenticated"
@@ -150,6 +285,79 @@ class UpdateHandler:
         self.manager = manager
         self.events = manager.events
         self.autoremove = autoremove
+        self.queue_size = queue_size
+        self.queue: Deque[NotifierResponse] = deque()
+        self.resync_pending = False
+        self.received = 0
+        self.overflows = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.storm_threshold = storm_threshold
+        self.storm_interval = storm_interval
+        self.on_mode_change = on_mode_change
+        self.mode = self.Mode.NORMAL
+        self.dirty: Set[int] = set()
+        self.rate = 0.0
+        self.storms = 0
+        self.bulk_refreshes = 0
+        self._rate_start: Optional[float] = None
+        self._rate_count = 0
+        self._next_flush = 0.0
+        self.coalesce_window = coalesce_window
+        # Event id: when to refresh it and what, in the order first notified
+        self._pending: Dict[int, Tuple[float, Set[str]]] = {}
+        self.coalesced = 0
+        self.apply_state = apply_state
+        self.verify_delay = verify_delay
+        self.applied = 0
+        self.subscribers: List[Callable] = []
+
+    @property
+    def stats(self):
+        return {
+            "queued": len(self.queue),
+            "received": self.received,
+            "overflows": self.overflows,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+            "mode": str(self.mode),
+            "rate": self.rate,
+            "dirty": len(self.dirty),
+            "storms": self.storms,
+            "bulk_refreshes": self.bulk_refreshes,
+            "pending": len(self._pending),
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+        }
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until there is scheduled work for get_event_update()
+
+        None if nothing is scheduled, then only new notifications matter.
+        """
+        dues = [due for due, _ in self._pending.values()]
+        if self.mode == self.Mode.STORM:
+            dues.append(self._next_flush)
+        if not dues:
+            return None
+        return max(0.0, min(dues) - self._clock())
+
+    def subscribe(self, callback):
+        """Call ``callback(event_id)`` whenever an event has changed
+
+        The event is in ``manager.events`` unless it was removed.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def _changed(self, event_id: int):
+        for callback in self.subscribers:
+            try:
+                callback(event_id)
+            except Exception:
+                LOG.exception("Update subscriber %r failed", callback)
 
     def connect(self):
         if not self.manager.session.push:
@@ -178,21 +386,266 @@ class UpdateHandler:
         list
         """
         self.check_connection()
-        update = self.manager.session.push.poll()
-        if not update:
+        watching = self.queue_size is not None or self.storm_threshold is not None
+        if watching or not self.queue:
+            # Overflows and storms are only seen by reading the backlog
+            self.ingest()
+        if self.resync_pending:
+            self.resync()
+            return True
+        if self.storm_threshold is not None:
+            self._check_rate()
+            if self.mode == self.Mode.STORM:
+                return self._storm_update()
+        if self.coalesce_window is not None:
+            return self._coalesced_update()
+        if self.queue:
+            return self.handle_event_update(self.queue.popleft())
+        return self._refresh_due(self._clock())
+
+    def _coalesced_update(self):
+        "Merge the queued updates per id, refresh the first one that is due"
+        now = self._clock()
+        while self.queue:
+            update = self.queue.popleft()
+            if self._is_removal(update):
+                self._pending.pop(update.id, None)
+                return self.handle_event_update(update)
+            if self._apply_state(update):
+                return update.id
+            if update.id not in self.events and update.type != self.UpdateType.STATE:
+                continue
+            if update.type not in tuple(self.UpdateType):
+                self.fallback(update)
+                continue
+            if self._schedule(update.id, self.REFRESHES[update.type], now + self.coalesce_window):
+                self.coalesced += 1
+        return self._refresh_due(now)
+
+    def _schedule(self, event_id: int, parts, due: float) -> bool:
+        """Refresh ``parts`` of an event at ``due``
+
+        Returns True if merged with an already scheduled refresh.
+        """
+        pending = self._pending.get(event_id)
+        if pending is None:
+            self._pending[event_id] = (due, set(parts))
+            return False
+        self._pending[event_id] = (min(due, pending[0]), pending[1] | set(parts))
+        return True
+
+    def _refresh_due(self, now):
+        "Do the first scheduled refresh that is due, in the order scheduled"
+        for event_id, (due, parts) in self._pending.items():
+            if due <= now:
+                del self._pending[event_id]
+                self.refresh(event_id, parts)
+                return event_id
+        return False
+
+    def _apply_state(self, update) -> bool:
+        """Set the new state of a known event without asking the server
+
+        The attributes and history are verified later on. Returns False if
+        the update was not applied.
+        """
+        if not self.apply_state or update.type != self.UpdateType.STATE:
             return False
-        return self.handle_event_update(update)
+        event = self.events.get(update.id)
+        states = update.info.split(" ")
+        if event is None or len(states) < 2:
+            return False
+        # Replace rather than change, others may hold on to the old copy
+        event = event.model_copy(update={"adm_state": AdmState(states[1])})
+        self.manager._set_event(event, self.manager.loaded_parts.get(update.id, ()))
+        self.applied += 1
+        LOG.debug("Applied state %s to event #%i", states[1], update.id)
+        self._changed(update.id)
+        self._schedule(
+            update.id,
+            self.REFRESHES[self.UpdateType.STATE],
+            self._clock() + self.verify_delay,
+        )
+        return True
+
+    def _is_removal(self, update) -> bool:
+        "True if the update is handled by removing the event"
+        if update.type == self.UpdateType.SCAVENGED:
+            return True
+        return (
+            update.type == self.UpdateType.STATE
+            and self.autoremove
+            and update.info.split(" ")[1:2] == ["closed"]
+        )
+
+    def _check_rate(self):
+        "Measure the notification rate, switch modes if need be"
+        now = self._clock()
+        if self._rate_start is None:
+            self._rate_start = now
+        elapsed = now - self._rate_start
+        if self.mode == self.Mode.NORMAL and self._rate_count > self.storm_threshold * self.storm_interval:
+            # No need to wait for the end of the period
+            self.rate = self._rate_count / max(elapsed, self.storm_interval)
+            self._set_mode(self.Mode.STORM)
+        elif elapsed >= self.storm_interval:
+            self.rate = self._rate_count / elapsed
+            if self.mode == self.Mode.NORMAL and self.rate > self.storm_threshold:
+                self._set_mode(self.Mode.STORM)
+            elif self.mode == self.Mode.STORM and self.rate <= self.storm_threshold:
+                self.flush()
+                self._set_mode(self.Mode.NORMAL)
+        else:
+            return
+        self._rate_start = now
+        self._rate_count = 0
+
+    def _set_mode(self, mode):
+        LOG.info("Update rate %.1f/s, switching to %s mode", self.rate, mode)
+        self.mode = mode
+        if mode == self.Mode.STORM:
+            self.storms += 1
+            # Refreshes waiting in the coalescing window go in the bulk
+            self.dirty.update(self._pending)
+            self._pending.clear()
+            self._next_flush = self._clock() + self.storm_interval
+        if self.on_mode_change is not None:
+            self.on_mode_change(mode, self.rate)
+
+    def _storm_update(self):
+        "Mark the queued updates dirty, refresh in bulk when it is time"
+        while self.queue:
+            self.mark_dirty(self.queue.popleft())
+        if self.dirty and self._clock() >= self._next_flush:
+            self.flush()
+            return True
+        return False
+
+    def mark_dirty(self, update):
+        """Note that an event needs a refresh instead of refreshing it
+
+        Removals are cheap and are done right away.
+        """
+        if update.id not in self.events and update.type != self.UpdateType.STATE:
+            return
+        if self._is_removal(update):
+            self.dirty.discard(update.id)
+            self.remove(update.id)
+        elif update.type in tuple(self.UpdateType):
+            self.dirty.add(update.id)
+        else:
+            self.fallback(update)
+
+    def flush(self):
+        "Refresh all dirty events in bulk"
+        self._next_flush = self._clock() + self.storm_interval
+        if not self.dirty:
+            return set()
+        dirty, self.dirty = self.dirty, set()
+        refreshed = self.manager.refresh_events(sorted(dirty))
+        self.bulk_refreshes += 1
+        LOG.debug("Refreshed %i events in bulk", len(refreshed))
+        for event_id in sorted(dirty):
+            self._changed(event_id)
+        return refreshed
+
+    def ingest(self) -> int:
+        """Move the notifications that have arrived into the queue
+
+        When the queue grows past ``queue_size``, everything queued and
+        everything still waiting on the socket is dropped and a resync is
+        scheduled. Returns the number of notifications queued.
+        """
+        push = self.manager.session.push
+        queued = 0
+        wanted: Optional[int]
+        while True:
+            if self.resync_pending:
+                # Anything from before the resync is moot
+                wanted = self.DRAIN_BATCH
+                batch = push.poll_many(wanted)
+                self.dropped += len(batch)
+            else:
+                wanted = None if self.queue_size is None else self.queue_size + 1 - len(self.queue)
+                batch = push.poll_many(wanted)
+                self.queue.extend(batch)
+                queued += len(batch)
+                if self.queue_size is not None and len(self.queue) > self.queue_size:
+                    self._overflow()
+                    queued = 0
+            self.received += len(batch)
+            self._rate_count += len(batch)
+            if wanted is None or len(batch) < wanted:
+                return queued
+
+    def _overflow(self):
+        LOG.warning(
+            "More than %i notifications queued, dropping them and resyncing",
+            self.queue_size,
+        )
+        self.overflows += 1
+        self.dropped += len(self.queue)
+        self.queue.clear()
+        self.resync_pending = True
+
+    def resync(self):
+        """Replace the local events with a fresh copy from the server
+
+        Events the server no longer has are removed. Queued notifications
+        are dropped, they are older than the copy.
+        """
+        self.dropped += len(self.queue)
+        self.queue.clear()
+        self.dirty.clear()
+        self._pending.clear()
+        known = set(self.events)
+        current = self.manager.get_events()
+        for event_id in known - current:
+            self.remove(event_id)
+        for event_id in sorted(current):
+            self._changed(event_id)
+        self.resync_pending = False
+        self.resyncs += 1
 
     def update(self, event_id: int):
         "Refresh an event from the server, refreshing everything"
         event = self.manager.get_updated_event_for_id(event_id)
         self.manager._set_event(event)
+        self._changed(event_id)
         LOG.debug("Updated event #%i", event_id)
 
+    def refresh(self, event_id: int, parts: Iterable[str]):
+        """Refresh only some parts of an event from the server
+
+        The ``parts`` are "attrs", "history" and "log", what is not
+        refreshed is kept. Parts never fetched, like the history and log of
+        events from ``get_events()``, are fetched as well. Events not known
+        locally are refreshed in full.
+        """
+        event = self.events.get(event_id)
+        loaded = self.manager.loaded_parts.get(event_id, frozenset())
+        wanted = frozenset(parts) | (self.ALL_PARTS - loaded)
+        if event is None or wanted >= self.ALL_PARTS:
+            return self.update(event_id)
+        # Never change the cached event, others may hold on to it
+        update = {"history": event.history, "log": event.log}
+        if "history" in wanted:
+            update["history"] = self.manager.get_history_for_id(event_id)
+        if "log" in wanted:
+            update["log"] = self.manager.get_log_for_id(event_id)
+        if "attrs" in wanted:
+            event = self.manager.create_event_from_id(event_id)
+        event = event.model_copy(update=update)
+        self.manager._set_event(event, loaded | wanted)
+        LOG.debug("Refreshed %s of event #%i", ", ".join(sorted(wanted)), event_id)
+        self._changed(event_id)
+
     def remove(self, event_id: int):
         "Remove an event from our local copy of the events list"
+        self._pending.pop(event_id, None)
         self.manager.remove_event(event_id)
         LOG.debug("Removed event #%i", event_id)
+        self._changed(event_id)
 
     def handle_event_update(self, update):
         """Call the right handle on the update object depending on type
@@ -213,27 +666,43 @@ class UpdateHandler:
     def cmd_state(self, update):
         """State has been changed
 
-        Removes a now closed state if the setting "autoremove" is True,
-        otherwise refreshes the event from the server.
+        Removes a now closed state if the setting "autoremove" is True. With
+        "apply_state" the new state is set locally and checked later,
+        otherwise the attributes and history are refreshed from the server.
         """
         states = update.info.split(" ")
         if states[1] == "closed" and self.autoremove:
             LOG.debug('Autoremoving "%s"', update.id)
             self.remove(update.id)
+        elif self._apply_state(update):
+            pass
         else:
-            self.update(update.id)
+            self.refresh(update.id, self.REFRESHES[self.UpdateType.STATE])
         return update.id
 
     def cmd_attr(self, update):
         """Attributes has been changed
 
-        Refresh the event from the server.
+        Refresh the attributes from the server, keep the history and log.
+        """
+        self.refresh(update.id, self.REFRESHES[self.UpdateType.ATTR])
+        return update.id
+
+    def cmd_history(self, update):
+        """History has been added to
+
+        Refresh the history from the server.
         """
-        self.update(update.id)
+        self.refresh(update.id, self.REFRESHES[self.UpdateType.HISTORY])
         return update.id
 
-    cmd_history = cmd_attr
-    cmd_log = cmd_attr
+    def cmd_log(self, update):
+        """Log has been added to
+
+        Refresh the log from the server.
+        """
+        self.refresh(update.id, self.REFRESHES[self.UpdateType.LOG])
+        return update.id
 
     def cmd_scavenged(self, update):
         """The event has been removed from the server
@@ -264,16 +733,33 @@ class SessionAdapter:
         return session
 
     @staticmethod
-    def _setup_request(session, config):
+    def _create_request(config):
+        return ritz(
+            config.server,
+            username=config.username,
+            password=config.password,
+            timeout=config.timeout,
+            timeouts=config.timeouts,
+            pipeline_window=config.pipeline_window,
+            adaptive_window=config.adaptive_window,
+            account_io=config.account_io,
+        )
+
+    @classmethod
+    def _setup_request(cls, session, config):
         if not session.request:
-            session.request = ritz(
-                config.server,
-                username=config.username,
-                password=config.password,
-                timeout=config.timeout,
-            )
+            session.request = cls._create_request(config)
         return session
 
+    @classmethod
+    def create_pool(cls, config, size, **pool_options):
+        "Make a pool of ``size`` sessions, connected and authenticated on demand"
+        def factory():
+            request = cls._create_request(config)
+            request.connect()  # also authenticates
+            return request
+        return RitzPool(factory, size=size, **pool_options)
+
     @classmethod
     def connect_session(cls, session):
         session.request.connect()
@@ -282,8 +768,7 @@ class SessionAdapter:
     @staticmethod
     def connect_push_channel(session):
         if session.request.connected and session.request.authenticated:
-            session.push = notifier(session.request)
-            session.push.connect()  # ntie
+            session.push = session.request.init_notifier()  # ntie
         return session
 
     @staticmethod
@@ -297,8 +782,9 @@ class SessionAdapter:
 
     @staticmethod
     def close_push_channel(session):
-        if hasattr(session, 'push') and hasattr(session.push, '_sock'):
-            session.push._sock.close()
+        if getattr(session, 'push', None) is not None:
+            # Closes the wakeup sockets of updates() as well
+            session.push.close()
         session.push = None
 
     @classmethod
@@ -331,6 +817,14 @@ class EventAdapter:
     def get_attrlist(request, event_id: int):
         return request.get_raw_attributes(event_id)
 
+    @staticmethod
+    def get_attrlists(request, event_ids: Iterable[int]):
+        """Yield (event_id, attrlist) pairs, pipelined
+
+        attrlist is a ZinoError instead if the server had an error for that id.
+        """
+        return request.get_raw_attributes_many(event_ids)
+
     @staticmethod
     def validate_raw_attrlist(attrlist):
         for item in attrlist:
@@ -391,8 +885,18 @@ class HistoryAdapter:
     SYSTEM_USER = "monitor"
 
     @staticmethod
-    def get_history(request, event_id: int):
-        return request.get_raw_history(event_id).data
+    def get_history(request, event_id: int) -> Iterable[str]:
+        "The raw history lines, all are read before parsing to find what is new"
+        return request.iter_raw_history(event_id)
+
+    @staticmethod
+    def get_histories(request, event_ids: Iterable[int]):
+        """Yield (event_id, raw history) pairs, pipelined
+
+        The raw history is a ZinoError instead if the server had an error
+        for that id.
+        """
+        return _pipelined(request, b"gethist %d", event_ids)
 
     @classmethod
     @log_exception_with_params(LOG)
@@ -445,22 +949,27 @@ class HistoryAdapter:
 
     @classmethod
     def add(cls, request, message: str, event: EventType) -> Optional[EventType]:
+        "Add a history entry, the caller refreshes the history afterwards"
         success = request.add_history(event.id, message)
         if success:
-            # fetch history
-            raw_history = cls.get_history(request, event.id)
-            parsed_history = cls.parse_response(raw_history)
-            new_history = HistoryEntry.create_list(parsed_history)
-            if new_history != event.history:
-                event.history = new_history
             return event
         return None
 
 
 class LogAdapter:
     @staticmethod
-    def get_log(request, event_id: int) -> list[str]:
-        return request.get_raw_log(event_id).data
+    def get_log(request, event_id: int) -> Iterable[str]:
+        "The raw log lines, all are read before parsing to find what is new"
+        return request.iter_raw_log(event_id)
+
+    @staticmethod
+    def get_logs(request, event_ids: Iterable[int]):
+        """Yield (event_id, raw log) pairs, pipelined
+
+        The raw log is a ZinoError instead if the server had an error for
+        that id.
+        """
+        return _pipelined(request, b"getlog %d", event_ids)
 
     @staticmethod
     @log_exception_with_params(LOG)
@@ -493,6 +1002,75 @@ class LogAdapter:
         return log_list
 
 
+class TailCache:
+    """Remember how much of the history or log of each event is parsed
+
+    History and log are only ever appended to on the server, but Zino 1 can
+    only send them in full. When a new response starts with the raw lines
+    parsed last time, only the lines after them need to be parsed and added
+    to the entries parsed last time. What is remembered per event is the
+    number of raw lines, a digest of them and the entries they gave.
+
+    Safe to use from several threads, the raw lines and the entries are
+    always remembered and looked up together.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen: Dict[int, Tuple[int, bytes, tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _digest(raw_lines: List[str]) -> bytes:
+        # The lines were split on the delimiter, so it cannot be in them
+        text = "\r\n".join(raw_lines).encode("UTF-8", "surrogatepass")
+        return hashlib.blake2b(text, digest_size=16).digest()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def parsed(self, event_id: int, raw_lines: List[str]) -> Optional[Tuple[list, List[str]]]:
+        """Return the entries parsed last time and the raw lines after them
+
+        Returns None if ``raw_lines`` does not continue what was seen last
+        time, then everything must be parsed.
+        """
+        with self._lock:
+            seen = self._seen.get(event_id)
+        if seen is None:
+            self._count(False)
+            return None
+        count, digest, entries = seen
+        if (
+            len(raw_lines) < count
+            # A history entry that was added to since
+            or (len(raw_lines) > count and raw_lines[count].startswith(" "))
+            or self._digest(raw_lines[:count]) != digest
+        ):
+            self._count(False)
+            return None
+        self._count(True)
+        return list(entries), raw_lines[count:]
+
+    def remember(self, event_id: int, raw_lines: List[str], entries: list):
+        seen = (len(raw_lines), self._digest(raw_lines), tuple(entries))
+        with self._lock:
+            self._seen[event_id] = seen
+
+    def forget(self, event_id: int):
+        with self._lock:
+            self._seen.pop(event_id, None)
+
+
 class Zino1EventManager(EventManager):
     # Easily replaced in order to ease testing
     _session_adapter = SessionAdapter
@@ -501,6 +1079,51 @@ class Zino1EventManager(EventManager):
     _log_adapter = LogAdapter
     removed_ids: Set[int] = set()
     config = None
+    pool: Optional[RitzPool] = None
+    singleflight: Optional[SingleFlight] = None
+    COALESCED_VERBS = ("event", "getattrs", "gethist", "getlog")
+
+    def __init__(self, session=None):
+        super().__init__(session)
+        self.history_tail = TailCache()
+        self.log_tail = TailCache()
+        # Which of "attrs", "history" and "log" each cached event has
+        self.loaded_parts: Dict[int, FrozenSet[str]] = {}
+
+    def _set_event(self, event: Event, parts: Iterable[str] = UpdateHandler.ALL_PARTS):
+        super()._set_event(event)
+        self.loaded_parts[event.id] = frozenset(parts)
+
+    def remove_event(self, event_or_id: EventOrId):
+        event_id = self._get_event_id(event_or_id)
+        super().remove_event(event_id)
+        self.loaded_parts.pop(event_id, None)
+        self.history_tail.forget(event_id)
+        self.log_tail.forget(event_id)
+
+    def _parse_history(self, event_id: int, raw_history: List[str]) -> List[HistoryEntry]:
+        "Parse only what is new since last time if possible"
+        parsed = self.history_tail.parsed(event_id, raw_history)
+        if parsed is None:
+            history = HistoryEntry.create_list(self._history_adapter.parse_response(raw_history))
+        else:
+            history, new_lines = parsed
+            if new_lines:
+                history += HistoryEntry.create_list(self._history_adapter.parse_response(new_lines))
+        self.history_tail.remember(event_id, raw_history, history)
+        return history
+
+    def _parse_log(self, event_id: int, raw_log: List[str]) -> List[LogEntry]:
+        "Parse only what is new since last time if possible"
+        parsed = self.log_tail.parsed(event_id, raw_log)
+        if parsed is None:
+            log = LogEntry.create_list(self._log_adapter.parse_response(raw_log))
+        else:
+            log, new_lines = parsed
+            if new_lines:
+                log += LogEntry.create_list(self._log_adapter.parse_response(new_lines))
+        self.log_tail.remember(event_id, raw_log, log)
+        return log
 
     @property
     def is_authenticated(self):
@@ -533,12 +1156,51 @@ class Zino1EventManager(EventManager):
         return True
 
     @classmethod
-    def configure(cls, config):
+    def configure(cls, config, pool_size=0, coalesce=False, **pool_options):
+        """Set up a manager from a config object
+
+        With a ``pool_size``, requests are sent on a pool of that many extra
+        sessions so that several threads may use the manager at once. See
+        ``zinolib.pool.RitzPool`` for the ``pool_options``.
+
+        With ``coalesce``, threads reading the same event at the same time
+        share one request, see ``singleflight.stats`` for how many were saved.
+        """
         session = cls._session_adapter.create_session(config)
         classobj = cls(session)
         classobj.config = config
+        if coalesce:
+            classobj.singleflight = SingleFlight()
+        if pool_size:
+            pool_options.setdefault(
+                "health_check", functools.partial(is_healthy, test_connection=classobj.test_connection)
+            )
+            classobj.pool = cls._session_adapter.create_pool(config, pool_size, **pool_options)
         return classobj
 
+    @contextmanager
+    def _checkout(self, deadline=None):
+        """Borrow a request session from the pool, if any
+
+        With a ``deadline``, a time.monotonic() timestamp, the session may
+        not be waited for nor used past it.
+        """
+        timeout = None if deadline is None else deadline - time.monotonic()
+        if self.pool is None:
+            request = self.session.request
+            if timeout is None:
+                yield request
+                return
+            with request.budget(timeout):
+                yield request
+            return
+        with self.pool.session(timeout) as request:
+            if timeout is None:
+                yield request
+                return
+            with request.budget(deadline - time.monotonic()):
+                yield request
+
     def connect(self):
         if not self._verify_session(quiet=True):
             self.session =  self._session_adapter.create_session(self.config)
@@ -554,6 +1216,8 @@ class Zino1EventManager(EventManager):
             raise self.ManagerException(e)
 
     def disconnect(self):
+        if self.pool is not None:
+            self.pool.close()
         session_ok = self._verify_session(quiet=True)
         if session_ok:
             self.session = self._session_adapter.close_session(self.session)
@@ -569,7 +1233,8 @@ class Zino1EventManager(EventManager):
         """
         event = self._get_event(event_or_id)
         if event.type == Event.Type.PORTSTATE:
-            return self.session.request.clear_flapping(event.router, event.if_index)
+            with self._checkout() as request:
+                return request.clear_flapping(event.router, event.if_index)
         return None
 
     def poll(self, event_or_id: EventOrId):
@@ -579,82 +1244,159 @@ class Zino1EventManager(EventManager):
         handler in a bit
         """
         event = self._get_event(event_or_id)
-        return self._event_adapter.poll(self.session.request, event)
+        with self._checkout() as request:
+            return self._event_adapter.poll(request, event)
 
     def get_events(self):
+        "Fetch all events from the server, return the ids fetched"
+        self._verify_session()
+        fetched = set()
+        with self._checkout() as request:
+            event_ids = self._event_adapter.get_event_ids(request)
+            attrlists = self._event_adapter.get_attrlists(request, event_ids)
+            try:
+                for event_id, attrlist in attrlists:
+                    if isinstance(attrlist, ZinoError):
+                        self.remove_event(event_id)
+                        continue
+                    # Without history and log
+                    self._set_event(self.create_event_from_attrlist(attrlist), ("attrs",))
+                    fetched.add(event_id)
+            finally:
+                # Read any responses still in flight
+                if hasattr(attrlists, 'close'):
+                    attrlists.close()
+        return fetched
+
+    def refresh_events(self, event_ids: Iterable[int]) -> Set[int]:
+        """Fetch several events with their history and log in bulk
+
+        The requests are pipelined, so this costs a few round trips in all
+        instead of three per event. Events the server no longer has are
+        removed. Returns the ids of the events refreshed.
+        """
         self._verify_session()
-        for event_id in self._event_adapter.get_event_ids(self.session.request):
+        events: Dict[int, Event] = {}
+        with self._checkout() as request:
+            attrlists = self._event_adapter.get_attrlists(request, list(event_ids))
             try:
-                event = self.create_event_from_id(event_id)
-            except self.ManagerException:
+                for event_id, attrlist in attrlists:
+                    if isinstance(attrlist, ZinoError):
+                        self.remove_event(event_id)
+                        continue
+                    events[event_id] = self.create_event_from_attrlist(attrlist)
+            finally:
+                # Read any responses still in flight
+                if hasattr(attrlists, 'close'):
+                    attrlists.close()
+            histories = dict(self._history_adapter.get_histories(request, events))
+            logs = dict(self._log_adapter.get_logs(request, events))
+        for event_id, event in events.items():
+            raw_history, raw_log = histories[event_id], logs[event_id]
+            if isinstance(raw_history, ZinoError) or isinstance(raw_log, ZinoError):
+                # Scavenged after the attributes were read
                 self.remove_event(event_id)
                 continue
-            self.events[event_id] = event
+            event.history = self._parse_history(event_id, raw_history)
+            event.log = self._parse_log(event_id, raw_log)
+            self._set_event(event)
+        return set(events) & set(self.events)
 
-    def test_connection(self):
+    def test_connection(self, request=None):
         """Try fetching info about a non-existing event
 
         If the connection is up, we get a ProtocolError due to the
         non-existent event. Do nothing.
 
         If the connection is down we will pass on a TimeoutError.
+
+        Tests the main session unless another ``request`` is given.
         """
+        request = request or self.session.request
         try:
-            self._event_adapter.get_attrlist(self.session.request, 0)
+            self._event_adapter.get_attrlist(request, 0)
         except ProtocolError:
             pass
 
-    def create_event_from_id(self, event_id: int):
+    def _forget_in_flight(self, event_id: int):
+        "After a write, do not share reads that started before it"
+        if self.singleflight is not None:
+            for verb in self.COALESCED_VERBS:
+                self.singleflight.forget((verb, event_id))
+
+    @coalesced("getattrs")
+    def create_event_from_id(self, event_id: int, deadline=None):
         self._verify_session()
-        attrlist = self.rename_exception(self._event_adapter.get_attrlist, self.session.request, event_id)
+        with self._checkout(deadline) as request:
+            attrlist = self.rename_exception(self._event_adapter.get_attrlist, request, event_id)
+        return self.create_event_from_attrlist(attrlist)
+
+    def create_event_from_attrlist(self, attrlist: List[str]):
         if not self._event_adapter.validate_raw_attrlist(attrlist):
             raise RetryError('Zino 1 did not send event attributes, retry')
         attrdict = self._event_adapter.attrlist_to_attrdict(attrlist)
         attrdict = self._event_adapter.convert_values(attrdict)
         return Event.create(attrdict)
 
-    def get_updated_event_for_id(self, event_id):
-        event = self.create_event_from_id(event_id)
-        history_list = self.get_history_for_id(event.id)
-        self.set_history_for_event(event, history_list)
-        log_list = self.get_log_for_id(event.id)
-        self.set_log_for_event(event, log_list)
+    @coalesced("event")
+    def get_updated_event_for_id(self, event_id, timeout=None):
+        """Fetch an event with its history and log
+
+        ``timeout`` is for all of it, not for each request. A call joining
+        one already running for the same event shares its timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        event = self.create_event_from_id(event_id, deadline=deadline)
+        # Both are parsed against the cached event, so fetch before setting
+        history_list = self.get_history_for_id(event.id, deadline=deadline)
+        log_list = self.get_log_for_id(event.id, deadline=deadline)
+        # The event from create_event_from_id may be shared, do not change it
+        event = event.model_copy(update={"history": history_list, "log": log_list})
+        self._set_event(event)
         return event
 
     def change_admin_state_for_id(self, event_id, admin_state: AdmState) -> Optional[Event]:
         self._verify_session()
         event = self._get_event(event_id)
         try:
-            success = self._event_adapter.set_admin_state(self.session.request, event, admin_state)
+            with self._checkout() as request:
+                success = self._event_adapter.set_admin_state(request, event, admin_state)
         except ValueError as e:
             if 'reopen' in str(e):
                 raise EventClosedError("Cannot set state on closed event")
             else:
                 raise
         if success:
+            self._forget_in_flight(event_id)
             event = self.get_updated_event_for_id(event_id)
             self._set_event(event)
             return event
         return None
 
-    def get_history_for_id(self, event_id: int) -> list[HistoryEntry]:
+    @coalesced("gethist")
+    def get_history_for_id(self, event_id: int, deadline=None) -> list[HistoryEntry]:
         self._verify_session()
-        raw_history = self.rename_exception(self._history_adapter.get_history, self.session.request, event_id)
-        parsed_history = self._history_adapter.parse_response(raw_history)
-        return HistoryEntry.create_list(parsed_history)
+        with self._checkout(deadline) as request:
+            raw_history = self.rename_exception(self._history_adapter.get_history, request, event_id)
+            raw_history = list(raw_history)
+        return self._parse_history(event_id, raw_history)
 
     def add_history_entry_for_id(self, event_id: int, message) -> Optional[Event]:
         self._verify_session()
         event = self._get_event(event_id)
-        success = self._history_adapter.add(self.session.request, message, event)
+        with self._checkout() as request:
+            success = self._history_adapter.add(request, message, event)
         if success:
+            self._forget_in_flight(event_id)
             event = self.get_updated_event_for_id(event_id)
             self._set_event(event)
             return event
         return None
 
-    def get_log_for_id(self, event_id: int) -> list[LogEntry]:
+    @coalesced("getlog")
+    def get_log_for_id(self, event_id: int, deadline=None) -> list[LogEntry]:
         self._verify_session()
-        raw_log = self.rename_exception(self._log_adapter.get_log, self.session.request, event_id)
-        parsed_log = self._log_adapter.parse_response(raw_log)
-        return LogEntry.create_list(parsed_log)
+        with self._checkout(deadline) as request:
+            raw_log = self.rename_exception(self._log_adapter.get_log, request, event_id)
+            raw_log = list(raw_log)
+        return self._parse_log(event_id, raw_log)
@@ -0,0 +1,187 @@
+"""
+Line framing for the Zino 1 line protocols
+
+Both the data channel and the notification channel send ``\\r\\n``
+terminated lines. ``LineFramer`` keeps the undecoded bytes in a single
+``bytearray`` and hands out one decoded line at a time, so that each byte is
+copied into the buffer once, scanned for the delimiter once and decoded once,
+no matter how large the response is.
+
+Usage::
+
+    > framer = LineFramer(sock)
+    > line = framer.readline()
+
+Without a socket, feed it bytes and pull out lines::
+
+    > framer = LineFramer()
+    > framer.feed(b"200 ok\\r\\n303 foo")
+    > framer.next_line()
+    '200 ok'
+    > framer.next_line() is None
+    True
+
+Call ``count_bytes()`` to have ``consumed`` count the bytes of the lines
+handed out, delimiters included. It costs a second split of the raw bytes
+when a batch of lines is not pure ASCII, so it is off by default.
+"""
+
+import codecs
+import logging
+from collections import deque
+from typing import Deque, Iterator, Optional
+
+from .utils import windows_codepage_cp1252
+
+
+__all__ = [
+    "LineFramer",
+]
+
+
+codecs.register_error("windows_codepage_cp1252", windows_codepage_cp1252)
+LOG = logging.getLogger(__name__)
+
+
+class LineFramer:
+    """Split a byte stream into decoded lines
+
+    ``sock`` is optional, it is only needed for ``fill()`` and
+    ``readline()``. Everything else works on bytes given via ``feed()``.
+
+    All complete lines in the buffer are decoded in one go and split on the
+    delimiter, which is safe since the delimiter is ASCII and cannot be a
+    part of a multibyte character.
+    """
+    DELIMITER = b"\r\n"
+    ENCODING = "UTF-8"
+    ERRORS = "windows_codepage_cp1252"
+
+    # Compact the buffer when this many consumed bytes are in front of it
+    COMPACT_THRESHOLD = 64 * 1024
+
+    def __init__(self, sock=None, recv_buffer=4096):
+        self.sock = sock
+        self.recv_buffer = recv_buffer
+        self._buff = bytearray()
+        self._pos = 0  # start of the first unframed byte
+        self._scan = 0  # no delimiter exists before this offset
+        self._lines: Deque[str] = deque()  # framed but not yet consumed
+        self._sizes: Optional[Deque[int]] = None  # their sizes in bytes, if counted
+        self.consumed = 0
+        self._chunk = bytearray(recv_buffer)
+        self._view = memoryview(self._chunk)
+        self._str_delimiter = self.DELIMITER.decode("ascii")
+
+    def __len__(self):
+        "Number of complete lines available without reading more"
+        self._frame()
+        return len(self._lines)
+
+    def __iter__(self) -> Iterator[str]:
+        "Consume the complete lines already buffered"
+        lines = self._lines
+        if self._sizes is not None:
+            while lines or self._frame():
+                yield self._take()
+            return
+        while lines or self._frame():
+            yield lines.popleft()
+
+    def count_bytes(self):
+        "Count the bytes of the lines consumed from now on in ``consumed``"
+        if self._sizes is None:
+            # Lines framed before this are no longer bytes, this is close
+            self._sizes = deque(
+                len(line.encode(self.ENCODING)) + len(self.DELIMITER) for line in self._lines
+            )
+
+    def _take(self) -> str:
+        if self._sizes is not None:
+            self.consumed += self._sizes.popleft()
+        return self._lines.popleft()
+
+    @property
+    def pending(self) -> bytes:
+        "The unconsumed data as bytes, mostly for error messages"
+        framed = b"".join(line.encode(self.ENCODING) + self.DELIMITER for line in self._lines)
+        return framed + bytes(self._buff[self._pos:])
+
+    def clear(self):
+        "Throw away everything buffered"
+        self._lines.clear()
+        if self._sizes is not None:
+            self._sizes.clear()
+        self._buff.clear()
+        self._pos = 0
+        self._scan = 0
+
+    def _compact(self):
+        if self._pos >= self.COMPACT_THRESHOLD or self._pos == len(self._buff):
+            del self._buff[:self._pos]
+            self._scan -= self._pos
+            self._pos = 0
+
+    def _frame(self) -> int:
+        "Decode and split all complete lines in the buffer, return how many"
+        buff = self._buff
+        end = buff.rfind(self.DELIMITER, self._scan)
+        if end == -1:
+            # The delimiter might straddle the end of the buffer
+            self._scan = max(self._pos, len(buff) - len(self.DELIMITER) + 1)
+            return 0
+        with memoryview(buff) as view:
+            text = self.decode(view[self._pos:end])
+            lines = text.split(self._str_delimiter)
+            if self._sizes is not None:
+                delimiter = len(self.DELIMITER)
+                if len(text) == end - self._pos:
+                    # ASCII, a character is a byte
+                    self._sizes.extend(len(line) + delimiter for line in lines)
+                else:
+                    raw_lines = bytes(view[self._pos:end]).split(self.DELIMITER)
+                    self._sizes.extend(len(line) + delimiter for line in raw_lines)
+        self._lines.extend(lines)
+        self._pos = self._scan = end + len(self.DELIMITER)
+        return len(lines)
+
+    def feed(self, data) -> int:
+        "Append raw bytes to the buffer"
+        self._compact()
+        self._buff += data
+        return len(data)
+
+    def fill(self) -> int:
+        """Do one recv_into() on the socket and buffer the result
+
+        Returns the number of bytes read, 0 means the other end closed the
+        connection. Socket exceptions are passed on.
+        """
+        nbytes = self.sock.recv_into(self._chunk, self.recv_buffer)
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("recv: %r", bytes(self._view[:nbytes]))
+        if nbytes:
+            self.feed(self._view[:nbytes])
+        return nbytes
+
+    def decode(self, data) -> str:
+        return str(data, self.ENCODING, self.ERRORS)
+
+    def next_line(self) -> Optional[str]:
+        "Return the next complete line, or None"
+        if self._lines or self._frame():
+            return self._take()
+        return None
+
+    def readline(self) -> Optional[str]:
+        """Return the next line, reading from the socket as necessary
+
+        Returns None if the connection was closed before a complete line was
+        received.
+        """
+        line = self.next_line()
+        while line is None:
+            if not self.fill():
+                return None
+            line = self.next_line()
+        return line
@@ -0,0 +1,132 @@
+"""
+Wait for notifications from several Zino servers at once
+
+Polling a list of notifiers one after the other adds up the timeouts. A
+``NotifierHub`` waits on all of their sockets in a single ``select``
+(epoll on Linux)::
+
+    > hub = NotifierHub()
+    > for session in sessions:
+    >     hub.register(session.init_notifier())
+    > while True:
+    >     for server, update in hub.poll(timeout=1):
+    >         print(server, update.id, update.type)
+
+A notifier that loses its connection is unregistered and handed to the
+``on_disconnect`` callback, the others keep working.
+"""
+
+import logging
+import selectors
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .protocol import NotConnectedError, NotifierResponse, ProtocolError
+
+
+__all__ = [
+    "NotifierHub",
+]
+
+
+LOG = logging.getLogger(__name__)
+
+
+class NotifierHub:
+    """Multiplex any number of connected notifiers
+
+    Each notifier is known by a name, by default the server of its ritz
+    session. ``on_disconnect(name, notifier, error)`` is called when one is
+    lost.
+    """
+
+    def __init__(self, on_disconnect: Optional[Callable] = None, selector=None):
+        self.on_disconnect = on_disconnect
+        self._selector = selectors.DefaultSelector() if selector is None else selector
+        self._names: Dict[Any, str] = {}
+        self._fds: Dict[Any, int] = {}
+        # Notifiers cut short by max_items, they may have more buffered
+        self._unfinished: List[Any] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, notifier):
+        return notifier in self._names
+
+    def register(self, notifier, name=None):
+        "Start watching a connected notifier"
+        if name is None:
+            name = notifier.zino_session.server
+        # Keep the descriptor, the socket is gone after a connection error
+        fd = notifier.fileno()
+        self._selector.register(fd, selectors.EVENT_READ, notifier)
+        self._names[notifier] = name
+        self._fds[notifier] = fd
+
+    def unregister(self, notifier):
+        "Stop watching a notifier, it is not closed"
+        name = self._names.pop(notifier)
+        self._selector.unregister(self._fds.pop(notifier))
+        return name
+
+    def _lost(self, notifier, error):
+        name = self.unregister(notifier)
+        LOG.warning("Lost notifier for %s: %s", name, error)
+        if self.on_disconnect is not None:
+            self.on_disconnect(name, notifier, error)
+
+    def poll(self, timeout=None, max_items=None) -> List[Tuple[str, NotifierResponse]]:
+        """Wait up to ``timeout`` seconds for notifications from any notifier
+
+        Returns (name, NotifierResponse) pairs, up to ``max_items`` of them.
+        The notifications of each notifier are in the order they arrived.
+        None waits for ever, or until the last notifier is lost.
+        """
+        if not self._names:
+            return []
+        # Already buffered notifications should not wait for the select
+        buffered = []
+        for notifier in self._unfinished:
+            try:
+                if notifier in self._names and notifier.readable():
+                    buffered.append(notifier)
+            except NotConnectedError as e:
+                self._lost(notifier, e)
+        self._unfinished = []
+        ready = [key.data for key, _ in self._selector.select(0 if buffered else timeout)]
+        results: List[Tuple[str, NotifierResponse]] = []
+        for notifier in buffered + [n for n in ready if n not in buffered]:
+            if notifier not in self._names:
+                continue
+            wanted = None if max_items is None else max_items - len(results)
+            if wanted == 0:
+                self._unfinished.append(notifier)
+                continue
+            name = self._names[notifier]
+            try:
+                notifications = notifier.poll_many(wanted)
+            except NotConnectedError as e:
+                self._lost(notifier, e)
+                continue
+            except ProtocolError as e:
+                LOG.warning("Garbage from notifier for %s: %s", name, e)
+                # What came after it is still buffered
+                self._unfinished.append(notifier)
+                continue
+            results.extend((name, notification) for notification in notifications)
+            if wanted is not None and len(notifications) >= wanted:
+                self._unfinished.append(notifier)
+        return results
+
+    def close(self):
+        "Stop watching all notifiers, they are not closed"
+        self._names.clear()
+        self._fds.clear()
+        self._unfinished.clear()
+        self._selector.close()
@@ -0,0 +1,211 @@
+"""
+A thread-safe pool of authenticated ritz sessions
+
+One ritz session is one line protocol stream, so only one thread at a time
+may use it. The pool keeps up to ``size`` connected sessions and lends them
+out::
+
+    > pool = RitzPool(factory, size=4)
+    > with pool.session() as request:
+    >     ids = request.get_caseids()
+
+``factory`` is a callable returning a connected and authenticated ritz
+session, for instance::
+
+    > def factory():
+    >     request = ritz(server, username=username, password=password)
+    >     request.connect()
+    >     return request
+
+A session that has been idle for ``max_idle`` seconds is closed instead of
+being lent out. A session that has been idle for ``check_after`` seconds is
+health checked first, and replaced if the check fails. A session that breaks
+while lent out is thrown away, the next checkout connects a new one. A
+session that timed out is kept, it resynchronizes before its next command.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Tuple
+
+from .ritz import ZinoError, NotConnectedError, ProtocolError
+
+
+__all__ = [
+    "RitzPool",
+    "PoolTimeoutError",
+]
+
+
+LOG = logging.getLogger(__name__)
+
+# Errors that mean the session cannot be used any more
+CONNECTION_ERRORS = (OSError, NotConnectedError, TimeoutError)
+
+
+class PoolTimeoutError(ZinoError):
+    pass
+
+
+def test_connection(session):
+    """Try fetching info about a non-existing event
+
+    If the connection is up, we get a ProtocolError due to the non-existent
+    event. Do nothing. Connection errors are passed on.
+    """
+    try:
+        session.get_raw_attributes(0)
+    except ProtocolError:
+        pass
+
+
+def is_healthy(session, test_connection: Callable = test_connection) -> bool:
+    "False if ``test_connection(session)`` fails, the session is broken"
+    try:
+        test_connection(session)
+    except CONNECTION_ERRORS:
+        return False
+    return True
+
+
+class RitzPool:
+    "Lend out authenticated ritz sessions, one thread at a time"
+
+    def __init__(self, factory: Callable, size=4, max_idle=300.0, check_after=30.0,
+                 health_check=is_healthy, clock=time.monotonic):
+        if size < 1:
+            raise ValueError("A pool needs room for at least one session")
+        self.factory = factory
+        self.size = size
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.health_check = health_check
+        self.clock = clock
+        self._idle: Deque[Tuple[object, float]] = deque()
+        self._open = 0  # idle and lent out
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    @property
+    def in_use(self) -> int:
+        return self._open - len(self._idle)
+
+    def _discard(self, session):
+        try:
+            session.close()
+        except Exception:
+            LOG.exception("Failed to close pooled session")
+
+    def _evict_expired(self):
+        "Close sessions idle for too long, the oldest are at the left end"
+        now = self.clock()
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            session, _ = self._idle.popleft()
+            self._open -= 1
+            self._discard(session)
+
+    def _connect(self):
+        try:
+            return self.factory()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def checkout(self, timeout=None):
+        """Borrow a session, wait up to ``timeout`` seconds for one
+
+        Raises PoolTimeoutError if no session became available in time.
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise NotConnectedError("The pool is closed")
+                self._evict_expired()
+                if self._idle:
+                    session, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    session = None
+                    break
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeoutError("No free session in pool")
+                self._cond.wait(remaining)
+        if session is None:
+            return self._connect()
+        if self.clock() - last_used > self.check_after and not self.health_check(session):
+            LOG.info("Pooled session failed health check, reconnecting")
+            self._discard(session)
+            return self._connect()
+        return session
+
+    def checkin(self, session, broken=False):
+        "Return a borrowed session, throw it away if it is ``broken``"
+        with self._cond:
+            if broken or self._closed or not session.connected:
+                self._open -= 1
+                self._discard(session)
+            else:
+                self._idle.append((session, self.clock()))
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout=None):
+        "Borrow a session for the duration of a with-block"
+        session = self.checkout(timeout)
+        try:
+            yield session
+        except TimeoutError:
+            # The session skips what is left of the response by itself
+            self.checkin(session)
+            raise
+        except CONNECTION_ERRORS:
+            self.checkin(session, broken=True)
+            raise
+        except BaseException:
+            self.checkin(session)
+            raise
+        self.checkin(session)
+
+    def run(self, function, *args, timeout=None, **kwargs):
+        """Run ``function(session, *args, **kwargs)`` on a borrowed session
+
+        If the session turns out to be broken, for instance by a broken pipe,
+        it is replaced and the function is retried once on a new session.
+        """
+        try:
+            with self.session(timeout) as session:
+                return function(session, *args, **kwargs)
+        except TimeoutError:
+            raise
+        except CONNECTION_ERRORS:
+            LOG.info("Pooled session broke, retrying on a new session")
+        with self.session(timeout) as session:
+            return function(session, *args, **kwargs)
+
+    def close(self):
+        "Close all idle sessions, lent out sessions are closed on checkin"
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                session, _ = self._idle.pop()
+                self._open -= 1
+                self._discard(session)
+            self._cond.notify_all()
@@ -0,0 +1,238 @@
+"""
+The Zino 1 line protocol without any I/O
+
+The parsers here take bytes (or decoded lines) in and hand parsed events
+out. They never touch a socket, so the blocking client, the asyncio client,
+pipelining and tests all share the same code::
+
+    > parser = ResponseParser()
+    > parser.feed(b"304 list follows\\r\\n12\\r\\n")
+    > list(parser)
+    [(HEADER, (304, 'list follows')), (LINE, '12')]
+    > parser.feed(b".\\r\\n200 ok\\r\\n")
+    > list(parser)
+    [(END, (304, 'list follows')), (END, (200, 'ok'))]
+
+A response on the data channel is a header line "<code> <text>". Codes 200
+and 302, and any code from 500 and up, are complete responses by
+themselves. Any other code is followed by data lines up to a line with a
+single ".".
+
+The notification channel sends one "<id> <type> <info>" line per update::
+
+    > notifications = NotificationParser()
+    > notifications.feed(b"123 state open working\\r\\n")
+    > list(notifications)
+    [NotifierResponse(id=123, type='state', info='open working')]
+"""
+
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .framing import LineFramer
+
+
+__all__ = [
+    "ZinoError",
+    "AuthenticationError",
+    "NotConnectedError",
+    "ProtocolError",
+    "NotifierResponse",
+    "DataResponse",
+    "parse_header",
+    "is_single_line",
+    "parse_notification",
+    "ResponseParser",
+    "NotificationParser",
+    "HEADER",
+    "LINE",
+    "END",
+]
+
+
+class ZinoError(Exception):
+    pass
+
+
+class AuthenticationError(ZinoError):
+    pass
+
+
+class NotConnectedError(ZinoError):
+    pass
+
+
+class ProtocolError(ZinoError):
+    pass
+
+
+NotifierResponse = NamedTuple("NotifierResponse", [("id", int), ("type", str), ("info", str)])
+DataResponseData = Union[List[str], str]
+DataResponseHeader = Union[Tuple[()], Tuple[int, str]]
+DataResponse = NamedTuple("DataResponse", [("data", DataResponseData), ("header", DataResponseHeader)])
+
+TERMINATOR = "."
+
+# Response events
+HEADER = 1  # The header of a multi-line response, data lines follow
+LINE = 2  # A data line
+END = 3  # The response is complete, the value is its header
+
+Event = Tuple[int, Union[DataResponseHeader, str]]
+
+
+def parse_header(line: str) -> Tuple[int, str]:
+    "Split a response header into its code and text"
+    try:
+        code, text = line.split(" ", 1)
+        return (int(code), text)
+    except ValueError as e:
+        raise ProtocolError(
+            "Illegal response from server detected: %s" % repr(line)
+        ) from e
+
+
+def is_single_line(code: int) -> bool:
+    "True if a response with this code has no data lines"
+    # Die on Error codes >= 500
+    # 200 doesent add more data
+    # 302 means the server needs more data from us
+    return code >= 500 or code == 200 or code == 302
+
+
+def parse_notification(line: str) -> NotifierResponse:
+    """Parse a line from the notifier socket
+
+    The format is "<id> <type>[ <info>]"
+    """
+    try:
+        element = line.split(" ", 2)
+        id = int(element[0])
+        type = element[1]
+        try:
+            text = element[2]
+        except IndexError:
+            text = ""
+        return NotifierResponse(id, type, text)
+    except Exception as e:
+        raise ProtocolError("Illegal notification: {}".format(repr(line))) from e
+
+
+class ResponseParser:
+    """Turn the data channel byte stream into response events
+
+    Each event is a tuple of (kind, value):
+
+    (HEADER, header)
+        A multi-line response has started
+    (LINE, line)
+        A data line of the current response
+    (END, header)
+        The current response is complete. For responses without data lines
+        this is the only event
+
+    Feed bytes with ``feed()`` and iterate to get the events, or let a
+    transport that frames lines itself call ``receive_line()`` directly.
+    ``next_response()`` collects complete responses instead.
+    """
+
+    def __init__(self, framer: Optional[LineFramer] = None):
+        self.framer = LineFramer() if framer is None else framer
+        self.header: DataResponseHeader = ()
+        self._lines: List[str] = []
+
+    @property
+    def in_response(self) -> bool:
+        "True if a multi-line response has started but not ended"
+        return bool(self.header)
+
+    def feed(self, data):
+        self.framer.feed(data)
+
+    def receive_line(self, line: str) -> Event:
+        "Classify one line, the state machine proper"
+        header = self.header
+        if not header:
+            header = parse_header(line)
+            if is_single_line(header[0]):
+                return (END, header)
+            self.header = header
+            return (HEADER, header)
+        if line == TERMINATOR:
+            self.header = ()
+            return (END, header)
+        return (LINE, line)
+
+    def next_event(self) -> Optional[Event]:
+        "Return the next event from the buffered bytes, or None"
+        line = self.framer.next_line()
+        if line is None:
+            return None
+        return self.receive_line(line)
+
+    def __iter__(self) -> Iterator[Event]:
+        "Consume the events in the buffered bytes"
+        receive_line = self.receive_line
+        for line in self.framer:
+            yield receive_line(line)
+
+    def next_response(self) -> Optional[DataResponse]:
+        """Return the next complete response, or None
+
+        Data lines are kept between calls until their response is complete.
+        Do not mix with the other ways of reading events.
+        """
+        lines = self._lines
+        framer = self.framer
+        while True:
+            line = framer.next_line()
+            if line is None:
+                return None
+            if self.header:
+                if line != TERMINATOR:
+                    lines.append(line)
+                    continue
+                header, self.header = self.header, ()
+                self._lines = []
+                return DataResponse(lines, header)
+            header = parse_header(line)
+            if is_single_line(header[0]):
+                return DataResponse(header[1], header)
+            self.header = header
+
+    def eof(self) -> Optional[DataResponse]:
+        "The stream has ended, return what there is of an unfinished response"
+        if not self.header:
+            return None
+        header, self.header = self.header, ()
+        lines, self._lines = self._lines, []
+        return DataResponse(lines, header)
+
+    def responses(self) -> Iterator[DataResponse]:
+        "Consume the complete responses in the buffered bytes"
+        while True:
+            response = self.next_response()
+            if response is None:
+                return
+            yield response
+
+
+class NotificationParser:
+    "Turn the notification channel byte stream into NotifierResponses"
+
+    def __init__(self, framer: Optional[LineFramer] = None):
+        self.framer = LineFramer() if framer is None else framer
+
+    def feed(self, data):
+        self.framer.feed(data)
+
+    def next_notification(self) -> Optional[NotifierResponse]:
+        "Return the next notification from the buffered bytes, or None"
+        line = self.framer.next_line()
+        if line is None:
+            return None
+        return parse_notification(line)
+
+    def __iter__(self) -> Iterator[NotifierResponse]:
+        "Consume the notifications in the buffered bytes"
+        for line in self.framer:
+            yield parse_notification(line)
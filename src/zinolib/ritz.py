@@ -81,13 +81,26 @@ import enum
 import ipaddress
 from datetime import datetime, timedelta
 import errno
-from time import mktime
-from typing import NamedTuple, List, Tuple, Union
+from time import mktime, monotonic, perf_counter
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import Deque, Iterator, List, Tuple
 import codecs
 import select
 
 from .config.tcl import parse_tcl_config  # noqa: F401 (used to be in this file)
-from .utils import windows_codepage_cp1252, generate_authtoken, enable_socket_keepalive
+from .framing import LineFramer
+from . import protocol
+from .protocol import ResponseParser, NotificationParser, END
+from .protocol import ZinoError, AuthenticationError, NotConnectedError, ProtocolError  # noqa: F401
+from .protocol import NotifierResponse, DataResponse, DataResponseHeader  # noqa: F401
+from .protocol import parse_notification  # noqa: F401 (used to be in this file)
+from .sockio import CountingSocket, SocketStats
+from .trace import TracingSocket, DATA, NOTIFY
+from .window import AdaptiveWindow
+from .stats import RequestStats, command_verb
+from .utils import windows_codepage_cp1252, generate_authtoken, enable_socket_keepalive, is_tcp_socket
 
 
 codecs.register_error("windows_codepage_cp1252", windows_codepage_cp1252)
@@ -95,28 +108,6 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 
-class ZinoError(Exception):
-    pass
-
-
-class AuthenticationError(ZinoError):
-    pass
-
-
-class NotConnectedError(ZinoError):
-    pass
-
-
-class ProtocolError(ZinoError):
-    pass
-
-
-NotifierResponse = NamedTuple("NotifierResponse", [("id", int), ("type", str), ("info", str)])
-DataResponseData = Union[List[str], str]
-DataResponseHeader = Union[Tuple[()], Tuple[int, str]]
-DataResponse = NamedTuple("DataResponse", [("data", DataResponseData), ("header", DataResponseHeader)])
-
-
 class caseState(enum.Enum):
     """State field of a ritz.Case object"""
 
@@ -317,6 +308,174 @@ class Case:
         return k in self._attrs
 
 
+class ResponseStream:
+    """The response to a single command on a ritz session
+
+    The header is read when the stream is created, the data lines of a
+    multi-line response are read off the socket while iterating. Only one
+    stream can be open per session: creating a new stream first skips what
+    is left of the previous one, so the session never gets out of sync.
+
+    Reading a line raises TimeoutError once ``deadline`` has passed, the
+    session then skips what is left of the response before the next command.
+
+    Usage:
+        stream = ResponseStream(ritz_session, command)
+        for line in stream:
+            ...
+    """
+
+    def __init__(self, zino, command, sent=None, verb=None, deadline=None):
+        self._zino = zino
+        self.command = command
+        self.deadline = deadline
+        self.header: DataResponseHeader = ()
+        self.done = False
+        self.lines = 0
+        if zino._stream is not None:
+            zino._stream.close()
+        zino._stream = self
+        self._stats = zino.stats
+        if self._stats is not None:
+            self._verb = verb
+            self._sent = perf_counter() if sent is None else sent
+            self._ttfb = 0.0
+            self._consumed = zino._framer.consumed
+        self._read_header()
+
+    def _finish(self):
+        self.done = True
+        if self._zino._stream is self:
+            self._zino._stream = None
+        if self._stats is not None:
+            self._stats.record(
+                self._verb or command_verb(self.command),
+                self._ttfb,
+                perf_counter() - self._sent,
+                self._zino._framer.consumed - self._consumed,
+                self.lines,
+                self.command,
+            )
+
+    def _read_header(self):
+        line = self._zino._readline(self.command, self.deadline)
+        self._zino._outstanding -= 1
+        if self._stats is not None:
+            self._ttfb = perf_counter() - self._sent
+        if line is None:
+            self._finish()
+            raise ProtocolError(
+                "No header info detected for command %s, buffer %s"
+                % (repr(self.command), repr(self._zino._framer.pending))
+            )
+        try:
+            kind, self.header = self._zino._parser.receive_line(line)
+        except ProtocolError:
+            self._finish()
+            raise
+        if kind == END:
+            self._finish()
+
+    @property
+    def is_single_line(self):
+        return protocol.is_single_line(self.header[0])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.done:
+            raise StopIteration
+        line = self._zino._readline(self.command, self.deadline)
+        if line is None:
+            self._finish()
+            raise StopIteration
+        kind, line = self._zino._parser.receive_line(line)
+        if kind == END:
+            self._finish()
+            raise StopIteration
+        self.lines += 1
+        return line
+
+    def close(self):
+        "Skip the rest of the response"
+        for _ in self:
+            pass
+
+    def response(self) -> DataResponse:
+        "Read the rest of the response into a DataResponse"
+        header = self.header
+        if header and self.is_single_line:
+            return DataResponse(header[1], header)
+        return DataResponse(list(self), header)
+
+
+class Pipeline:
+    """Send several commands on a ritz session in one go
+
+    All queued commands are written back-to-back, then the responses are
+    read in the same order, so a batch of N commands costs one round trip
+    instead of N. Each response is classified the same way as for a single
+    command, so the responses are ``DataResponse`` objects just like the
+    ones returned by ``ritz._request``.
+
+    Usage:
+        with ritz_session.pipeline() as pipe:
+            pipe.request(b"getattrs 123")
+            pipe.request(b"getattrs 456")
+        for response in pipe.responses:
+            ...
+    or
+        pipe = ritz_session.pipeline()
+        pipe.request(b"getattrs 123").request(b"getattrs 456")
+        responses = pipe.execute()
+
+    Do not pipeline commands that need more data after a "302", like
+    "addhist", unless the data is also queued: if the first command fails
+    the data will be read as commands by the server.
+    """
+
+    def __init__(self, zino):
+        self._zino = zino
+        self._commands: List[bytes] = []
+        self.responses: List[DataResponse] = []
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None and self._commands:
+            self.execute()
+
+    def request(self, command):
+        "Queue a command, return the pipeline for chaining"
+        if isinstance(command, str):
+            command = command.encode("UTF-8")
+        self._commands.append(self._zino._terminate(command))
+        return self
+
+    def execute(self, timeout=None) -> List[DataResponse]:
+        """Send all queued commands, then read all the responses in order
+
+        ``timeout`` is for reading all of the responses.
+        """
+        zino = self._zino
+        zino.check_connection()
+        commands, self._commands = self._commands, []
+        if not commands:
+            return []
+        deadline = zino._deadline_for(None, timeout)
+        zino._sync()
+        logger.debug("send: %r", commands)
+        sent = perf_counter()
+        zino._send(b"".join(commands), len(commands))
+        self.responses = [zino._read_response(command, sent, deadline) for command in commands]
+        return self.responses
+
+
 class ritz:
     """Connect to zino datachannel.
     Usage:
@@ -327,22 +486,73 @@ class ritz:
         from ritz import ritz
         with ritz(c_server, username="123", password="123") as ritz_session:
             ...
+
+    Every command waits ``timeout`` seconds for its response, unless there
+    is a default for its verb in ``timeouts`` or it is given a ``timeout``
+    of its own:
+        ritz_session = ritz(c_server, timeout=10, timeouts={"caseids": 60})
+        ritz_session.get_log(123, timeout=5)
     """
     DELIMITER = "\r\n"
-
-    def __init__(self, server, port=8001, timeout=10, username=None, password=None, keepalive=True):
-        """Initialize"""
+    # Default timeouts per command verb
+    TIMEOUTS = {"pm log": 30}
+
+    def __init__(
+        self,
+        server,
+        port=8001,
+        timeout=10,
+        username=None,
+        password=None,
+        keepalive=True,
+        recv_buffer=4096,
+        pipeline_window=32,
+        stats=None,
+        account_io=False,
+        trace=None,
+        timeouts=None,
+        adaptive_window=False,
+        connector=None,
+    ):
+        """Initialize
+
+        With ``account_io`` set, socket calls and bytes are counted in
+        ``io_stats``, see ``zinolib.sockio``. All traffic is recorded to
+        ``trace`` if it is set to a ``zinolib.trace.TraceWriter``.
+
+        With ``adaptive_window`` set, the number of commands kept in flight
+        by bulk reads is tuned from the measured latency instead of being
+        ``pipeline_window``, see ``zinolib.window``. The current size and
+        latency estimate are in ``window.stats``.
+
+        ``connector(address, timeout)`` opens the connection, the default is
+        ``socket.create_connection``. Replace it to talk to something other
+        than a TCP server, see ``zinolib.zino_emu.loopback``.
+        """
         global logger
 
         self._sock = None
+        self._framer = None
+        self._parser = None
+        self._stream = None
         self.connStatus = False
         self.authenticated = None
         self.server = server
         self.port = port
         self.timeout = timeout
+        self.timeouts = {**self.TIMEOUTS, **(timeouts or {})}
+        self._deadline = None
+        self._outstanding = 0  # responses with headers not yet read
         self.username = username
         self.password = password
         self.keepalive = keepalive
+        self.recv_buffer = recv_buffer
+        self.pipeline_window = pipeline_window
+        self.window = AdaptiveWindow() if adaptive_window else None
+        self.connector = connector or socket.create_connection
+        self.stats = stats
+        self.io_stats = SocketStats() if account_io else None
+        self.trace = trace
         self._buff = ""
 
     def __enter__(self):
@@ -358,75 +568,167 @@ class ritz:
         """Zino object deletion"""
         self.close()
 
-    def _request(self, command: bytes, recv_buffer=4096, **_):
-        """Read a command from the ritz TCP socket
+    def _readline(self, command, deadline=None):
+        framer = self._framer
+        try:
+            line = framer.next_line()
+            while line is None:
+                if deadline is None:
+                    self._sock.settimeout(self.timeout)
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout("deadline passed")
+                    self._sock.settimeout(remaining)
+                if not framer.fill():
+                    return None
+                line = framer.next_line()
+        except socket.timeout as e:
+            raise TimeoutError(
+                "Timed out waiting for data. command: %s buffer: %s"
+                % (repr(command), repr(self._framer.pending))
+            ) from e
+        return line
+
+    def _terminate(self, command: bytes) -> bytes:
+        delimiter = bytes(self.DELIMITER, 'ascii')
+        if not command.endswith(delimiter):
+            command += delimiter
+        return command
+
+    def _send(self, data: bytes, responses=1):
+        "Send ``data``, which will be answered by ``responses`` responses"
+        try:
+            self._sock.sendall(data)
+        except BrokenPipeError as e:
+            raise NotConnectedError(f'Lost connection to server: {e}') from e
+        self._outstanding += responses
+
+    def _read_response(self, command, sent=None, deadline=None) -> DataResponse:
+        "Read one complete response off the ritz TCP socket"
+        return ResponseStream(self, command, sent, deadline=deadline).response()
+
+    def _request(self, command: bytes, verb=None, timeout=None):
+        """Send a command on the ritz TCP socket and read the response
+
+        ``verb`` names the command in the stats and in ``timeouts`` if it
+        cannot be deduced from the command itself.
+        """
+        return self.iter_request(command, verb, timeout).response()
 
-        This code needs a rewrite, maby use socket file object?
-        everything is \r\n terminated
+    def _deadline_for(self, verb, timeout=None):
+        "When a command has to be answered, given a timeout or the defaults"
+        if timeout is None:
+            timeout = self.timeouts.get(verb, self.timeout)
+        deadline = None if timeout is None else monotonic() + timeout
+        if self._deadline is not None and (deadline is None or self._deadline < deadline):
+            deadline = self._deadline
+        return deadline
+
+    @contextmanager
+    def budget(self, timeout):
+        """Share one timeout between all the commands sent in a with-block
+
+        Every command still has its own timeout, but none may run past the
+        end of the budget. Budgets can be nested, the innermost cannot
+        extend the outer ones. A ``timeout`` of None sets no budget.
+
+        Usage:
+            with ritz_session.budget(10):
+                attrs = ritz_session.get_attributes(123)
+                log = ritz_session.get_log(123)
+        """
+        previous = self._deadline
+        if timeout is not None:
+            deadline = monotonic() + timeout
+            if previous is None or deadline < previous:
+                self._deadline = deadline
+        try:
+            yield self._deadline
+        finally:
+            self._deadline = previous
+
+    def _sync(self):
+        "Make sure no response is left half-read before sending a command"
+        if self._outstanding > 0 or self._stream is not None:
+            self._resync()
+
+    def _resync(self):
+        """Skip responses left unread, for instance after a timeout
+
+        The session is closed if this cannot be done within ``self.timeout``
+        seconds, or if a skipped response is a "302": the server is waiting
+        for data and would take the next command for it.
+        """
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        stream, self._stream = self._stream, None
+        try:
+            if stream is not None and stream.header and not stream.done:
+                # Its header is read, skip the rest of it
+                stream.deadline = deadline
+                self._stream = stream
+                stream.close()
+            while self._outstanding > 0:
+                skipped = ResponseStream(self, None, verb="resync", deadline=deadline)
+                skipped.close()
+                if skipped.header[0] == 302:
+                    raise ProtocolError("Server is waiting for data")
+        except (TimeoutError, ProtocolError) as e:
+            self.close()
+            raise NotConnectedError(f"Could not resynchronize with server: {e}") from e
+        if stream is not None:
+            stream.done = True
+
+    def enable_stats(self, slow_threshold=None, on_slow=None) -> RequestStats:
+        """Record latency and size statistics per command verb
+
+        See ``zinolib.stats`` for what is recorded.
+        """
+        self.stats = RequestStats(slow_threshold, on_slow)
+        if self._framer is not None:
+            self._framer.count_bytes()
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    def iter_request(self, command: bytes, verb=None, timeout=None):
+        """Send a command and stream the response
+
+        The header is read before returning, the data lines are read off the
+        socket as the returned ``ResponseStream`` is iterated. Responses
+        without data lines, like "200" and errors, yield nothing. Any part of
+        the response left unread is skipped before the next command.
+
+        The response must be read within ``timeout`` seconds, see ``ritz``
+        for the defaults. If not, TimeoutError is raised and the rest of the
+        response is skipped before the next command.
+
+        Usage:
+            stream = ritz_session.iter_request(b"getlog 123")
+            if stream.header[0] < 500:
+                for line in stream:
+                    ...
         """
         global logger
-        buffer = ""
-        data = b"DUMMY"  # truthy, for mypy
-        header: DataResponseHeader = ()
-        r: List[str] = []
-        logger.debug("send: %s" % command.__repr__())
+        deadline = self._deadline_for(verb or command_verb(command), timeout)
+        if deadline is not None and deadline <= monotonic():
+            raise TimeoutError("No time left to send command: %s" % repr(command))
         if command:
-            delimiter = bytes(self.DELIMITER, 'ascii')
-            if not command.endswith(delimiter):
-                command += delimiter
-            try:
-                self._sock.send(command)
-            except BrokenPipeError as e:
-                raise NotConnectedError(f'Lost connection to server: {e}') from e
-        while data:
-            try:
-                data = self._sock.recv(recv_buffer)
-            except socket.timeout as e:
-                raise TimeoutError(
-                    "Timed out waiting for data. command: %s buffer: %s"
-                    % (repr(command), repr(buffer))
-                ) from e
-            logger.debug("recv: %s" % data.__repr__())
-
-            buffer += data.decode("UTF-8", errors="windows_codepage_cp1252")
-
-            if not header:
-                if buffer.find(self.DELIMITER) != -1:
-                    try:
-                        # '\r\n' is not a byte
-                        line, buffer = buffer.split(self.DELIMITER, 1)
-                        rawh = line.split(" ", 1)  # ' ' is not a byte
-                        header = (int(rawh[0]), rawh[1])
-                    except ValueError as e:
-                        raise ProtocolError(
-                            "Illegal response from server detected: %s" % repr(buffer)
-                        ) from e
-                    # header = line
-                    # Crude error detection :)
-                    if header[0] >= 500:
-                        # Die on Error codes
-                        return DataResponse(header[1], header)
-                        # raise ProtocolError("Errorcode '%s %s' reported from server" % (header[0], header[1]))
-                    if header[0] == 200:
-                        # Return to user on 200, 200 doesent add more data
-                        return DataResponse(header[1], header)
-                    if header[0] == 302:
-                        # Return to user on 302, wee need more data
-                        return DataResponse(header[1], header)
-                next
-
-            while buffer.find(self.DELIMITER) != -1:
-                # '\r\n' is not a byte
-                line, buffer = buffer.split(self.DELIMITER, 1)
-                if line == ".":
-                    return DataResponse(r, header)
-                r.append(line)
-        if not header:
-            raise ProtocolError(
-                "No header info detected for command %s, buffer %s"
-                % (repr(command), repr(buffer))
-            )
-        return DataResponse(r, header)
+            self._sync()
+        logger.debug("send: %r", command)
+        sent = perf_counter() if self.stats is not None else None
+        if command:
+            command = self._terminate(command)
+            self._send(command)
+        return ResponseStream(self, command, sent, verb, deadline)
+
+    def pipeline(self):
+        """Send several commands before reading any of the responses
+
+        See ``Pipeline`` for usage.
+        """
+        return Pipeline(self)
 
     def connect(self):
         """Connect to zino datachannel
@@ -439,11 +741,11 @@ class ritz:
         # Opens an connection to the Server
         # To do things you need to authenticate after connection
         try:
-            self._sock = socket.create_connection(
-                (self.server, self.port), self.timeout
-            )
+            sock = self.connector((self.server, self.port), self.timeout)
         except socket.gaierror as e:
             raise NotConnectedError(e) from e
+        self._attach(sock)
+        self._outstanding = 1  # The greeting
         response = self._request(None)
         if response.header[0] == 200:
             self.authChallenge = response.header[1].split(" ", 1)[0]
@@ -451,7 +753,7 @@ class ritz:
         else:
             raise NotConnectedError("Did not get a status code 200")
 
-        if self.keepalive:
+        if self.keepalive and is_tcp_socket(self._sock):
             enable_socket_keepalive(self._sock)
             logger.info("Set keepalive on protocol socket")
 
@@ -459,11 +761,32 @@ class ritz:
         if self.username and self.password:
             self.authenticate(self.username, self.password)
 
+    def _attach(self, sock):
+        "Talk to the server over ``sock``, starting from a clean slate"
+        if self.trace is not None:
+            sock = TracingSocket(sock, self.trace, DATA)
+        if self.io_stats is not None:
+            sock = CountingSocket(sock, self.io_stats)
+        self._sock = sock
+        self._framer = LineFramer(sock, self.recv_buffer)
+        if self.stats is not None:
+            self._framer.count_bytes()
+        self._parser = ResponseParser(self._framer)
+        self._stream = None
+        self._outstanding = 0
+        if self.window is not None:
+            # Latency measured on another connection says nothing
+            self.window.reset()
+
     def close(self):
         """Disconnect zino datachennel"""
         if self._sock:
             self._sock.close()
             self._sock = None
+            self._framer = None
+            self._parser = None
+            self._stream = None
+            self._outstanding = 0
             self.connStatus = False
             self.authenticated = False
 
@@ -544,7 +867,7 @@ class ritz:
         for k in self.get_caseids():
             yield Case(self, k)
 
-    def get_caseids(self):
+    def get_caseids(self, timeout=None):
         """Get list of CaseID's that exists in zino
 
         Usage:
@@ -554,16 +877,14 @@ class ritz:
         """
         self.check_connection()
 
-        response = self._request(b"caseids")
-
         ids = []
-        for id in response.data:
+        for id in self.iter_request(b"caseids", timeout=timeout):
             if id.isdigit():
                 ids.append(int(id))
 
         return ids
 
-    def get_raw_attributes(self, caseid):
+    def get_raw_attributes(self, caseid, timeout=None):
         """Collect all attributes of a zino CaseID object
 
         Returns a list of all attributes registred on this case in zino
@@ -576,11 +897,70 @@ class ritz:
         if not isinstance(caseid, int):
             raise TypeError("CaseID needs to be an integer")
         cmd = "getattrs %s" % caseid
-        response = self._request(cmd.encode("UTF-8"))
+        response = self._request(cmd.encode("UTF-8"), timeout=timeout)
         if response.header[0] >= 500:
             raise ProtocolError(response.header)
         return response.data
 
+    def get_raw_attributes_many(self, caseids, window=None, timeout=None):
+        """Collect all attributes of several zino CaseID objects
+
+        Yields (caseid, attrlist) pairs in the order of ``caseids``. Up to
+        ``window`` "getattrs" are kept in flight on the socket, the default
+        is the adaptive window if enabled, else ``self.pipeline_window``. If
+        the server answers with an error for a case the attrlist is replaced
+        by a ProtocolError, the other cases are still fetched. Each response
+        must arrive within ``timeout`` seconds of its command being sent.
+
+        Usage:
+            for caseid, attrs in ritz_session.get_raw_attributes_many([123, 456]):
+                if isinstance(attrs, ProtocolError):
+                    ...
+        """
+        self.check_connection()
+
+        tuner = self.window if window is None else None
+        if tuner is not None:
+            window = tuner.size
+        window = max(1, window or self.pipeline_window)
+        caseids = iter(caseids)
+        in_flight: Deque[Tuple[int, bytes, float, float]] = deque()
+
+        def send_more(count):
+            batch = []
+            for caseid in islice(caseids, count):
+                if not isinstance(caseid, int):
+                    raise TypeError("CaseID needs to be an integer")
+                batch.append((caseid, b"getattrs %d\r\n" % caseid))
+            if batch:
+                deadline = self._deadline_for("getattrs", timeout)
+                sent = perf_counter()
+                self._send(b"".join(command for _, command in batch), len(batch))
+                in_flight.extend((caseid, command, sent, deadline) for caseid, command in batch)
+
+        self._sync()
+        send_more(window)
+        try:
+            while in_flight:
+                caseid, command, sent, deadline = in_flight.popleft()
+                stream = ResponseStream(self, command, sent, deadline=deadline)
+                if tuner is not None:
+                    # The latency is up to the header, the data lines are
+                    # only transfer
+                    window = tuner.observe(perf_counter() - sent)
+                response = stream.response()
+                # Top up when half the window has been read
+                if len(in_flight) <= window // 2:
+                    send_more(window - len(in_flight))
+                if response.header[0] >= 500:
+                    yield caseid, ProtocolError(response.header)
+                else:
+                    yield caseid, response.data
+        except GeneratorExit:
+            # Abandoned early, skip the responses still in flight
+            self._resync()
+            raise
+
     def convert_attribute_list_to_case_dict(self, attrlist):
         caseinfo = {}
         for item in attrlist:
@@ -589,7 +969,7 @@ class ritz:
             caseinfo[safe_k] = v.strip()
         return caseinfo
 
-    def get_attributes(self, caseid):
+    def get_attributes(self, caseid, timeout=None):
         """Collect all attributes of a zino CaseID object
 
         Returns a dict of all attributes registred on this case in zino
@@ -597,7 +977,7 @@ class ritz:
         Usage:
             attrs = ritz_session.get_attributes(123)
         """
-        attrlist = self.get_raw_attributes(caseid)
+        attrlist = self.get_raw_attributes(caseid, timeout)
         caseinfo = self.convert_attribute_list_to_case_dict(attrlist)
         caseinfo = self.clean_attributes(caseinfo)
         return caseinfo
@@ -643,43 +1023,73 @@ class ritz:
 
         return caseinfo
 
-    def get_raw_history(self, caseid):
+    def get_raw_history(self, caseid, timeout=None):
         #   gethist     Get Logs from CaseID
         #   Parameters: caseID
         #   Returns a list of historylines (timestamp, message)??
         self.check_connection()
         self.check_id(caseid, "CaseID")
 
-        return self._request(b"gethist %d" % caseid)
+        return self.iter_request(b"gethist %d" % caseid, timeout=timeout).response()
 
-    def get_history(self, caseid):
+    def iter_raw_history(self, caseid, timeout=None):
+        """Stream the history lines of a CaseID
+
+        Usage:
+            for line in ritz_session.iter_raw_history(123):
+                ...
+        """
+        self.check_connection()
+        self.check_id(caseid, "CaseID")
+
+        stream = self.iter_request(b"gethist %d" % caseid, timeout=timeout)
+        if stream.header[0] >= 500:
+            raise ProtocolError(stream.header)
+        return stream
+
+    def get_history(self, caseid, timeout=None):
         """Return all history elements of a CaseID
 
         Usage:
             case_history = ritz_session.get_history(123)
         """
-        response = self.get_raw_history(caseid)
+        response = self.get_raw_history(caseid, timeout)
         return _decode_history(response.data)
 
-    def get_raw_log(self, caseid):
+    def get_raw_log(self, caseid, timeout=None):
         #   getlog      Get Logs from CaseID
         #   Parameters: caseID
         #   Returns a list of loglines (timestamp, message)
         self.check_connection()
         self.check_id(caseid, "CaseID")
 
-        return self._request(b"getlog %d" % caseid)
+        return self.iter_request(b"getlog %d" % caseid, timeout=timeout).response()
+
+    def iter_raw_log(self, caseid, timeout=None):
+        """Stream the log lines of a CaseID
+
+        Usage:
+            for line in ritz_session.iter_raw_log(123):
+                ...
+        """
+        self.check_connection()
+        self.check_id(caseid, "CaseID")
+
+        stream = self.iter_request(b"getlog %d" % caseid, timeout=timeout)
+        if stream.header[0] >= 500:
+            raise ProtocolError(stream.header)
+        return stream
 
-    def get_log(self, caseid):
+    def get_log(self, caseid, timeout=None):
         """Return all log elements of a CaseID
 
         Usage:
             case_logs = ritz_session.get_log(123)
         """
-        response = self.get_raw_log(caseid)
+        response = self.get_raw_log(caseid, timeout)
         return _decode_history(response.data)
 
-    def add_history(self, caseid, message):
+    def add_history(self, caseid, message, timeout=None):
         """Add a history element on a CaseID
 
         Usage:
@@ -695,18 +1105,19 @@ class ritz:
         else:
             msg = message
 
-        # Start Command
-        response = self._request(b"addhist %d  -" % (caseid))
-        if not response.header[0] == 302:
-            raise ProtocolError("Unknown return from server: %s" % response.data)
+        with self.budget(timeout):
+            # Start Command
+            response = self._request(b"addhist %d  -" % (caseid))
+            if not response.header[0] == 302:
+                raise ProtocolError("Unknown return from server: %s" % response.data)
 
-        # Send message
-        response = self._request(b"%s\r\n\r\n." % msg.encode())
+            # Send message
+            response = self._request(b"%s\r\n\r\n." % msg.encode(), verb="addhist data")
         if not response.header[0] == 200:
             raise ProtocolError("Not getting 200 OK from server: %s" % response.data)
         return True
 
-    def set_state(self, caseid, state):
+    def set_state(self, caseid, state, timeout=None):
         """Change state of a CaseID
 
         Inputs a caseSession object(enum)
@@ -724,7 +1135,7 @@ class ritz:
             raise TypeError("CaseID needs to be an integer")
 
         response = self._request(
-            b"setstate %d %s" % (caseid, state.value.encode())
+            b"setstate %d %s" % (caseid, state.value.encode()), timeout=timeout
         )
 
         # Check returncode
@@ -735,7 +1146,7 @@ class ritz:
             )
         return True
 
-    def clear_flapping(self, router, ifindex):
+    def clear_flapping(self, router, ifindex, timeout=None):
         """Clear port flapping information on a interface
 
         Usage:
@@ -745,7 +1156,7 @@ class ritz:
             raise TypeError("CaseID needs to be an integer")
 
         response = self._request(
-            b"clearflap %s %d" % (router.encode(), ifindex)
+            b"clearflap %s %d" % (router.encode(), ifindex), timeout=timeout
         )
 
         # Check returncode
@@ -753,20 +1164,20 @@ class ritz:
             raise ZinoError("Not getting 200 OK from server: %s" % self._buff)
         return True
 
-    def poll_router(self, router):
+    def poll_router(self, router, timeout=None):
         """Poll a router for new data
 
         Usage:
             zino_session.poll_router("routername")
         """
-        response = self._request(b"pollrtr %s" % router.encode())
+        response = self._request(b"pollrtr %s" % router.encode(), timeout=timeout)
 
         # Check returncode
         if not response.header[0] == 200:
             raise ZinoError("Not getting 200 OK from server: %s" % self._buff)
         return True
 
-    def poll_interface(self, router, ifindex):
+    def poll_interface(self, router, ifindex, timeout=None):
         """Poll interface for new information
 
         Inputs is a string containing a router name in zino and the ifindex to be polled.
@@ -776,7 +1187,7 @@ class ritz:
         if not isinstance(ifindex, int):
             raise TypeError("CaseID needs to be an interger")
         response = self._request(
-            b"pollintf %s %d" % (router.encode(), ifindex)
+            b"pollintf %s %d" % (router.encode(), ifindex), timeout=timeout
         )
 
         # Check returncode
@@ -784,7 +1195,7 @@ class ritz:
             raise ZinoError("Not getting 200 OK from server: %s" % self._buff)
         return True
 
-    def ntie(self, key):
+    def ntie(self, key, timeout=None):
         """Tie to notification notification channel
 
         Connect datachannel and notification channel together,
@@ -809,7 +1220,7 @@ class ritz:
             pass
         else:
             raise ValueError("key needs to be string or bytes")
-        response = self._request(b"ntie %s" % key)
+        response = self._request(b"ntie %s" % key, timeout=timeout)
 
         # Check returncode
         if not response.header[0] == 200:
@@ -818,7 +1229,7 @@ class ritz:
             )
         return True
 
-    def pm_add_device(self, from_t, to_t, device, m_type="exact"):
+    def pm_add_device(self, from_t, to_t, device, m_type="exact", timeout=None):
         """Add Maintenance window on a device level
 
         m_type:
@@ -852,7 +1263,8 @@ class ritz:
 
         response = self._request(
             b"pm add %d %d device %s %s"
-            % (from_ts, to_ts, m_type.encode(), device.encode())
+            % (from_ts, to_ts, m_type.encode(), device.encode()),
+            timeout=timeout,
         )
 
         # Check returncode
@@ -862,10 +1274,10 @@ class ritz:
         data2 = response.data.split(" ", 3)
         return int(data2[2])
 
-    def pm_add_interface(self, from_t, to_t, device, interface):
-        self.pm_add_interface_byname(from_t, to_t, device, interface)
+    def pm_add_interface(self, from_t, to_t, device, interface, timeout=None):
+        self.pm_add_interface_byname(from_t, to_t, device, interface, timeout)
 
-    def pm_add_interface_byname(self, from_t, to_t, device, interface):
+    def pm_add_interface_byname(self, from_t, to_t, device, interface, timeout=None):
         """Adds Maintenance window for interfaces based on interface name
 
         Does a regex match on interfaces on a device
@@ -899,7 +1311,8 @@ class ritz:
 
         response = self._request(
             b"pm add %d %d portstate intf-regexp %s %s"
-            % (from_ts, to_ts, device.encode(), interface.encode())
+            % (from_ts, to_ts, device.encode(), interface.encode()),
+            timeout=timeout,
         )
 
         # Check returncode
@@ -909,7 +1322,7 @@ class ritz:
         data2 = response.data.split(" ", 3)
         return int(data2[2])
 
-    def pm_add_interface_bydescr(self, from_t, to_t, description):
+    def pm_add_interface_bydescr(self, from_t, to_t, description, timeout=None):
         """Add Maintenance window on interface level by interface description
 
         Does a regex global match on all interfaces in zino
@@ -942,7 +1355,8 @@ class ritz:
 
         response = self._request(
             b"pm add %d %d portstate regexp %s"
-            % (from_ts, to_ts, description.encode())
+            % (from_ts, to_ts, description.encode()),
+            timeout=timeout,
         )
 
         # Check returncode
@@ -952,14 +1366,14 @@ class ritz:
         data2 = response.data.split(" ", 3)
         return int(data2[2])
 
-    def pm_list(self):
+    def pm_list(self, timeout=None):
         """List ID of all active Maintenance windows"""
         # Lists all Maintenance periods registrered
         # pm list
         # returns 300 with list of all scheduled PM's, exits with ^.$
         self.check_connection()
 
-        response = self._request(b"pm list")
+        response = self._request(b"pm list", timeout=timeout)
 
         ids = []
         for id in response.data:
@@ -968,7 +1382,7 @@ class ritz:
 
         return ids
 
-    def pm_cancel(self, id):
+    def pm_cancel(self, id, timeout=None):
         """Cancel a Maintenance window"""
         # Cansels a Maintenance period
         # pm cancel
@@ -976,7 +1390,7 @@ class ritz:
         self.check_connection()
         self.check_id(id)
 
-        response = self._request(b"pm cancel %d" % (id))
+        response = self._request(b"pm cancel %d" % (id), timeout=timeout)
 
         # Check returncode
         if not response.header[0] == 200:
@@ -984,7 +1398,7 @@ class ritz:
         else:
             return True
 
-    def pm_get_details(self, id):
+    def pm_get_details(self, id, timeout=None):
         """Get details of a Maintenance window"""
         # Get details of a Maintenance period
         # pm details
@@ -993,7 +1407,7 @@ class ritz:
         self.check_connection()
         self.check_id(id)
 
-        response = self._request(b"pm details %d" % (id))
+        response = self._request(b"pm details %d" % (id), timeout=timeout)
 
         data2 = response.data.split(" ", 5)
         # print(data2)
@@ -1009,7 +1423,7 @@ class ritz:
 
         return res
 
-    def pm_get_matching(self, id):
+    def pm_get_matching(self, id, timeout=None):
         """Get elements matching a Maintenance window"""
         # TODO: OUTPUT NEEDS A REWRITE!
         # Get list of all ports and devices matching a Maintenance id
@@ -1019,7 +1433,7 @@ class ritz:
         self.check_connection()
         self.check_id(id)
 
-        response = self._request(b"pm matching %d" % id)
+        stream = self.iter_request(b"pm matching %d" % id, timeout=timeout)
 
         # Return list with element 1: "device"portstate,
         #                          2: device
@@ -1029,9 +1443,9 @@ class ritz:
         #                          3: interface ifindex,
         #                          4: interface name,
         #                          5: interface descr
-        return [d.split(" ", 5)[1::] for d in response.data]
+        return [d.split(" ", 5)[1::] for d in stream]
 
-    def pm_add_log(self, id, message):
+    def pm_add_log(self, id, message, timeout=None):
         """Add log entry to a Maintenance window"""
         # Adds a log message on this PM
         # pm addlog
@@ -1043,26 +1457,27 @@ class ritz:
         self.check_connection()
         self.check_id(id)
 
-        response = self._request(b"pm addlog %d  -" % (id))
-
-        if not response.header[0] == 302:
-            raise ZinoError("Unknown return from server: %s" % self._buff)
-
         # Generate Message to zino
         if isinstance(message, list):
             msg = self.DELIMITER.join(message)
         else:
             msg = message
 
-        # Send message
-        response = self._request(b"%s\r\n\r\n." % msg.encode())
+        with self.budget(timeout):
+            response = self._request(b"pm addlog %d  -" % (id))
+
+            if not response.header[0] == 302:
+                raise ZinoError("Unknown return from server: %s" % self._buff)
+
+            # Send message
+            response = self._request(b"%s\r\n\r\n." % msg.encode(), verb="pm addlog data")
 
         # Check returncode
         if not response.header[0] == 200:
             raise ZinoError("Not getting 200 OK from server: %s" % self._buff)
         return True
 
-    def pm_get_log(self, id):
+    def pm_get_log(self, id, timeout=None):
         """List all log entries of a Maintenance window"""
         # Get log of a PM
         # pm log
@@ -1072,16 +1487,15 @@ class ritz:
         self.check_connection()
         self.check_id(id)
 
-        self._sock.settimeout(30)
-        response = self._request(b"pm log %d" % id)
+        stream = self.iter_request(b"pm log %d" % id, timeout=timeout)
 
-        # print(header)
-        # print(data)
-        return _decode_history(response.data)
+        return _decode_history(stream)
         # raise NotImplementedError("Not Implemented")
 
     def init_notifier(self):
-        notif = notifier(self)
+        notif = notifier(
+            self, account_io=self.io_stats is not None, trace=self.trace, connector=self.connector
+        )
         notif.connect()
         return notif
 
@@ -1094,17 +1508,43 @@ class notifier:
     or
         with notifier(ritz_session) as notify_session:
             ....
+
+    Integrate with an event loop by watching ``fileno()`` and calling
+    ``poll_many()`` when it is readable, or iterate in a thread of its own:
+        for n in notify_session.updates():
+            ....
+    and call ``notify_session.wakeup()`` from another thread to stop.
     """
     DELIMITER = "\r\n"
-
-    def __init__(self, zino_session, port=8002, timeout=30, keepalive=True):
+    KEY_LENGTH = 40
+
+    def __init__(
+        self,
+        zino_session,
+        port=8002,
+        timeout=30,
+        keepalive=True,
+        account_io=False,
+        trace=None,
+        recv_buffer=4096,
+        connector=None,
+    ):
         self._sock = None
+        self._framer = None
+        self._parser = None
+        self.io_stats = SocketStats() if account_io else None
+        self.trace = trace
         self.connStatus = False
-        self._buff = ""
         self.zino_session = zino_session
         self.port = port
         self.timeout = timeout
         self.keepalive = keepalive
+        self.recv_buffer = recv_buffer
+        self.connector = connector or socket.create_connection
+        # Self-pipe for wakeup(), created by the first updates()
+        self._wakeup_recv = None
+        self._wakeup_send = None
+        self._woken = False
 
     def __enter__(self):
         self.connect()
@@ -1123,28 +1563,61 @@ class notifier:
           notify_session.connect()
         """
         if not self._sock:
-            self._sock = socket.create_connection(
+            self._attach(self.connector(
                 (self.zino_session.server, self.port), self.timeout
-            )
-            self._buff = self._sock.recv(4096)
-            if not self._buff:
+            ))
+            line = self._framer.readline()
+            if line is None:
                 raise NotConnectedError("Lost connection to server")
             self._sock.setblocking(False)
-            rawHeader = self._buff.split(bytes(self.DELIMITER, 'ascii'))[0]
-            header = rawHeader.split(b" ", 1)
-            # print(len(header[0]))
-            if len(header[0]) == 40:
+            key = line.split(" ", 1)[0]
+            if len(key) == self.KEY_LENGTH:
                 self.connStatus = True
-                self._buff = ""
 
-                self.zino_session.ntie(header[0])
+                self.zino_session.ntie(key)
             else:
                 raise NotConnectedError("Key not found")
 
-            if self.keepalive:
+            if self.keepalive and is_tcp_socket(self._sock):
                 enable_socket_keepalive(self._sock)
                 logger.info("Set keepalive on notifier socket")
 
+    def _attach(self, sock):
+        "Listen on ``sock``, starting from a clean slate"
+        if self.trace is not None:
+            sock = TracingSocket(sock, self.trace, NOTIFY)
+        if self.io_stats is not None:
+            sock = CountingSocket(sock, self.io_stats)
+        self._sock = sock
+        self._framer = LineFramer(sock, self.recv_buffer)
+        self._parser = NotificationParser(self._framer)
+
+    def _wait_readable(self, timeout) -> bool:
+        if self.io_stats is not None:
+            return self._sock.wait_readable(timeout)
+        r, _, _ = select.select([self._sock], [], [], timeout)
+        return bool(r)
+
+    def _fill(self) -> int:
+        """Read once from the socket into the buffer
+
+        Returns the number of bytes read, 0 if there was nothing to read.
+        """
+        try:
+            nbytes = self._framer.fill()
+        except OSError as e:
+            if not (
+                e.args[0] == errno.EAGAIN or e.args[0] == errno.EWOULDBLOCK
+            ):
+                # a "real" error occurred
+                self._sock = None
+                self.connStatus = False
+                raise NotConnectedError("Not connected to server")
+            return 0
+        if not nbytes:
+            raise NotConnectedError("Lost connection to server")
+        return nbytes
+
     def poll(self, timeout=0):
         """Poll the notifier socket for new data
 
@@ -1154,35 +1627,111 @@ class notifier:
             if n:
                 ....
         """
-
-        if self.DELIMITER not in self._buff:
+        notification = self._parser.next_notification()
+        if notification is not None:
             # Only check for new messages if no message is waiting for processing
-            r, _, _ = select.select([self._sock], [], [], timeout)
-            if r:
+            return notification
+        if self._wait_readable(timeout):
+            self._fill()
+            return self._parser.next_notification()
+        return None
+
+    def poll_many(self, max_items=None, timeout=0) -> List[NotifierResponse]:
+        """Return all the notifications that have arrived, up to ``max_items``
+
+        Waits up to ``timeout`` seconds if there are none. Everything
+        available on the socket is read, then all complete lines are decoded
+        and parsed in one go. An empty list means there was nothing new.
+        Usage:
+            for n in notify_socket.poll_many(100, timeout=1):
+                ....
+        """
+        if not len(self._framer) and self._wait_readable(timeout):
+            self._read_available(max_items)
+        return list(islice(self._parser, max_items))
+
+    def fileno(self) -> int:
+        "The socket to watch for readability in an event loop"
+        if not self._sock:
+            raise NotConnectedError("Not connected to server")
+        return self._sock.fileno()
+
+    def readable(self) -> bool:
+        "True if poll() would return a notification, or news of a lost connection"
+        if not self._sock:
+            raise NotConnectedError("Not connected to server")
+        return bool(len(self._framer)) or self._wait_readable(0)
+
+    def updates(self, timeout=None) -> Iterator[NotifierResponse]:
+        """Yield notifications as they arrive
+
+        Blocks in the kernel until there is something to read. Stops when
+        nothing has arrived for ``timeout`` seconds, or when ``wakeup()`` is
+        called from another thread. None waits for ever.
+        Usage:
+            for n in notify_session.updates():
+                ....
+        """
+        if self._wakeup_recv is None:
+            self._wakeup_recv, self._wakeup_send = socket.socketpair()
+            self._wakeup_recv.setblocking(False)
+            self._wakeup_send.setblocking(False)
+        wakeup_recv = self._wakeup_recv
+        while not self._woken:
+            if len(self._framer):
+                for notification in self._parser:
+                    yield notification
+                    if self._woken:
+                        break
+                continue
+            start = perf_counter()
+            readable, _, _ = select.select([self._sock, wakeup_recv], [], [], timeout)
+            if self.io_stats is not None:
+                self.io_stats.selects += 1
+                self.io_stats.select_time += perf_counter() - start
+            if not readable:
+                return
+            if wakeup_recv in readable:
                 try:
-                    newbuff = self._sock.recv(4096).decode()
-                    if not newbuff:
-                        raise NotConnectedError("Lost connection to server")
-                    self._buff += newbuff
-                except OSError as e:
-                    if not (
-                        e.args[0] == errno.EAGAIN or e.args[0] == errno.EWOULDBLOCK
-                    ):
-                        # a "real" error occurred
-                        self._sock = None
-                        self.connStatus = False
-                        raise NotConnectedError("Not connected to server")
-
-        if self.DELIMITER in self._buff:
+                    while wakeup_recv.recv(64):
+                        pass
+                except OSError:
+                    pass
+            if self._sock in readable:
+                self._read_available()
+        self._woken = False
+
+    def wakeup(self):
+        "Make updates() return, safe to call from any thread"
+        self._woken = True
+        if self._wakeup_send is not None:
             try:
-                line, self._buff = self._buff.split(self.DELIMITER, 1)
-                element = line.split(" ", 2)
-                id = int(element[0])
-                type = element[1]
-                try:
-                    text = element[2]
-                except IndexError:
-                    text = ""
-                return NotifierResponse(id, type, text)
-            except Exception:
-                raise ProtocolError("line: {} , _buff: {}".format(line, self._buff))
+                self._wakeup_send.send(b"\0")
+            except OSError:
+                # The pipe is full, so a wakeup is pending anyway
+                pass
+
+    def close(self):
+        """Disconnect the notifier socket"""
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+            self.connStatus = False
+        for sock in (self._wakeup_recv, self._wakeup_send):
+            if sock is not None:
+                sock.close()
+        self._wakeup_recv = self._wakeup_send = None
+
+    def _read_available(self, max_items=None):
+        """Read what is on the socket without waiting
+
+        Stops early when ``max_items`` complete lines are buffered.
+        """
+        framer = self._framer
+        try:
+            while self._fill() and (max_items is None or len(framer) < max_items):
+                pass
+        except NotConnectedError:
+            # Hand out what did arrive, the next read raises again
+            if self._sock is None or not len(framer):
+                raise
@@ -0,0 +1,85 @@
+"""
+Coalesce concurrent identical calls
+
+When several threads ask for the same thing at the same time, only the
+first one does the work, the others wait for and share its result::
+
+    > flight = SingleFlight()
+    > event = flight.do(("getattrs", 123), fetch_event, 123)
+
+Only use this for reads: a write must always be sent.
+"""
+
+import threading
+from typing import Any, Dict, Hashable
+
+
+__all__ = [
+    "SingleFlight",
+]
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error = None
+
+
+class SingleFlight:
+    """Share the result of in-flight calls between callers with the same key
+
+    ``hits`` counts calls that were served by another caller's request,
+    ``misses`` counts calls that had to do the request themselves, the
+    difference is the number of round trips saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def do(self, key: Hashable, function, *args, **kwargs):
+        """Run ``function(*args, **kwargs)`` unless already running for ``key``
+
+        Exceptions are shared as well.
+        """
+        with self._lock:
+            running = self._calls.get(key)
+            if running is None:
+                call = self._calls[key] = _Call()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if running is not None:
+            running.done.wait()
+            if running.error is not None:
+                raise running.error
+            return running.result
+        try:
+            call.result = function(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def forget(self, key: Hashable):
+        """Make the next call for ``key`` start a new request
+
+        Use after a write, so that nobody gets a result fetched before it.
+        Callers already waiting still get the old result.
+        """
+        with self._lock:
+            self._calls.pop(key, None)
@@ -0,0 +1,126 @@
+"""
+Socket I/O accounting
+
+Wrap a socket to count what actually goes over it::
+
+    > zino_session = ritz(server, username=..., password=..., account_io=True)
+    > zino_session.connect()
+    > zino_session.get_caseids()
+    > zino_session.io_stats.as_dict()
+    {'sends': 3, 'recvs': 4, 'bytes_sent': ..., ...}
+
+The counters are per session and survive reconnects. A notifier made with
+``zino_session.init_notifier()`` counts in an ``io_stats`` of its own. They
+are:
+
+sends, bytes_sent
+    Send calls and bytes sent. A ``sendall()`` counts as one send
+recvs, bytes_received
+    Receive calls and bytes received, end of file included
+short_reads
+    Receives that returned less than was asked for. If most receives are
+    not short, the receive buffer is too small
+recv_time
+    Seconds spent waiting in receive calls
+selects, select_time
+    Calls to ``select()`` on the socket and seconds spent waiting in them
+"""
+
+import select
+from time import perf_counter
+from typing import Optional
+
+
+__all__ = [
+    "SocketStats",
+    "CountingSocket",
+]
+
+
+class SocketStats:
+    "Counters for one or more sockets"
+
+    FIELDS = (
+        "sends",
+        "bytes_sent",
+        "recvs",
+        "bytes_received",
+        "short_reads",
+        "recv_time",
+        "selects",
+        "select_time",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.sends = 0
+        self.bytes_sent = 0
+        self.recvs = 0
+        self.bytes_received = 0
+        self.short_reads = 0
+        self.recv_time = 0.0
+        self.selects = 0
+        self.select_time = 0.0
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        counters = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS)
+        return f"{self.__class__.__name__}({counters})"
+
+    def _received(self, nbytes, asked, elapsed):
+        self.recvs += 1
+        self.bytes_received += nbytes
+        self.recv_time += elapsed
+        if nbytes < asked:
+            self.short_reads += 1
+
+
+class CountingSocket:
+    """Count calls and bytes passing through a socket
+
+    Everything not counted is passed through to the wrapped socket, so this
+    can be used wherever the socket was.
+    """
+
+    def __init__(self, sock, stats: Optional[SocketStats] = None):
+        self.sock = sock
+        self.stats = SocketStats() if stats is None else stats
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def recv(self, bufsize, *args):
+        start = perf_counter()
+        data = self.sock.recv(bufsize, *args)
+        self.stats._received(len(data), bufsize, perf_counter() - start)
+        return data
+
+    def recv_into(self, buffer, nbytes=0, *args):
+        asked = nbytes or len(buffer)
+        start = perf_counter()
+        received = self.sock.recv_into(buffer, nbytes, *args)
+        self.stats._received(received, asked, perf_counter() - start)
+        return received
+
+    def send(self, data, *args):
+        sent = self.sock.send(data, *args)
+        self.stats.sends += 1
+        self.stats.bytes_sent += sent
+        return sent
+
+    def sendall(self, data, *args):
+        self.sock.sendall(data, *args)
+        self.stats.sends += 1
+        self.stats.bytes_sent += len(data)
+
+    def wait_readable(self, timeout=None) -> bool:
+        "select() on the socket, return True if there is something to read"
+        start = perf_counter()
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        self.stats.selects += 1
+        self.stats.select_time += perf_counter() - start
+        return bool(readable)
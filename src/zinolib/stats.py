@@ -0,0 +1,155 @@
+"""
+Request statistics per command verb
+
+Enable on a ritz session and read back::
+
+    > stats = ritz_session.enable_stats(slow_threshold=2.0, on_slow=callback)
+    > ritz_session.get_caseids()
+    > stats.snapshot()["caseids"]["total"]["count"]
+    1
+
+For every command verb ("caseids", "getattrs", "pm log" ...) the following
+are recorded in fixed-bucket histograms:
+
+ttfb
+    Seconds from the command was sent until the response header was read
+total
+    Seconds from the command was sent until the whole response was read
+bytes
+    Bytes received for the response
+lines
+    Number of data lines in the response
+
+``on_slow(verb, seconds, command)`` is called for every response that took
+longer than ``slow_threshold`` seconds.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+__all__ = [
+    "Histogram",
+    "CommandStats",
+    "RequestStats",
+    "command_verb",
+]
+
+
+# Upper bounds, values above the last bound go into an overflow bucket
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LINE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+
+def command_verb(command: Optional[bytes]) -> str:
+    """Find the verb of a command, the first two words for "pm" commands
+
+    The server greeting, which is read without a command, is "connect".
+    """
+    if not command:
+        return "connect"
+    words = command.split(None, 2)
+    if not words:
+        return "connect"
+    if words[0] == b"pm" and len(words) > 1:
+        return "pm " + words[1].decode("ascii", "replace")
+    return words[0].decode("ascii", "replace")
+
+
+class Histogram:
+    "Count values in fixed buckets"
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        "Estimate the q-quantile as the upper bound of its bucket"
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "buckets": dict(zip(self.buckets + (float("inf"),), self.counts)),
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class CommandStats:
+    "The histograms for one verb"
+
+    def __init__(self):
+        self.ttfb = Histogram(LATENCY_BUCKETS)
+        self.total = Histogram(LATENCY_BUCKETS)
+        self.bytes = Histogram(SIZE_BUCKETS)
+        self.lines = Histogram(LINE_BUCKETS)
+
+    def as_dict(self) -> dict:
+        return {
+            "ttfb": self.ttfb.as_dict(),
+            "total": self.total.as_dict(),
+            "bytes": self.bytes.as_dict(),
+            "lines": self.lines.as_dict(),
+        }
+
+
+class RequestStats:
+    "Collect CommandStats per verb"
+
+    def __init__(self, slow_threshold: Optional[float] = None, on_slow: Optional[Callable] = None):
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self.commands: Dict[str, CommandStats] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, verb) -> CommandStats:
+        return self.commands[verb]
+
+    def record(self, verb: str, ttfb: float, total: float, nbytes: int, lines: int, command=None):
+        with self._lock:
+            stats = self.commands.get(verb)
+            if stats is None:
+                stats = self.commands[verb] = CommandStats()
+            stats.ttfb.add(ttfb)
+            stats.total.add(total)
+            stats.bytes.add(nbytes)
+            stats.lines.add(lines)
+        if self.on_slow and self.slow_threshold is not None and total > self.slow_threshold:
+            self.on_slow(verb, total, command)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {verb: stats.as_dict() for verb, stats in self.commands.items()}
+
+    def reset(self):
+        with self._lock:
+            self.commands.clear()
@@ -0,0 +1,206 @@
+"""
+Wire traces of ritz and notifier sessions
+
+Record everything sent and received on the sockets to a trace file::
+
+    > with TraceWriter("zino.trace") as trace:
+    >     zino_session = ritz(server, username=..., password=..., trace=trace)
+    >     zino_session.connect()
+    >     notify_session = zino_session.init_notifier()
+    >     ...
+
+Read it back, for instance to feed a recorded ``caseids`` list to a
+benchmark::
+
+    > for record in read_trace("zino.trace"):
+    >     print(record.time, record.channel, record.direction, record.data)
+
+    > sock = ReplaySocket(read_trace("zino.trace"), channel=DATA)
+    > framer = LineFramer(sock)
+
+The file starts with ``MAGIC`` and the wall clock time the trace was
+started as a little endian double. Then follow records of a ``RECORD``
+header (seconds since start from a monotonic clock, channel, direction,
+length of data) and the raw bytes. A receive of zero bytes, that is the end
+of the connection, is recorded as well.
+"""
+
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Union
+
+
+__all__ = [
+    "TraceRecord",
+    "TraceWriter",
+    "TracingSocket",
+    "ReplaySocket",
+    "read_trace",
+    "DATA",
+    "NOTIFY",
+    "SEND",
+    "RECV",
+]
+
+
+MAGIC = b"ZINOTRC1"
+START = struct.Struct("<d")
+RECORD = struct.Struct("<dBBI")
+
+# Channels
+DATA = 0
+NOTIFY = 1
+
+# Directions
+SEND = 0
+RECV = 1
+
+
+class TraceRecord(NamedTuple):
+    time: float
+    channel: int
+    direction: int
+    data: bytes
+
+
+class TraceWriter:
+    """Write trace records to a file
+
+    ``file`` is either a path or a binary file object. One writer may be
+    shared between several sessions and threads.
+    """
+
+    def __init__(self, file: Union[str, BinaryIO]):
+        self.file: BinaryIO
+        if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+            self.file = open(file, "wb")
+            self._owns_file = True
+        else:
+            self.file = file
+            self._owns_file = False
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self.file.write(MAGIC + START.pack(time.time()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, channel: int, direction: int, data):
+        header = RECORD.pack(time.monotonic() - self._start, channel, direction, len(data))
+        with self._lock:
+            self.file.write(header)
+            self.file.write(data)
+
+    def flush(self):
+        with self._lock:
+            self.file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._owns_file:
+                self.file.close()
+            else:
+                self.file.flush()
+
+
+def read_trace(file: Union[str, BinaryIO]) -> Iterator[TraceRecord]:
+    "Iterate over the records in a trace file"
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as f:
+            yield from read_trace(f)
+        return
+    magic = file.read(len(MAGIC) + START.size)
+    if magic[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a zino trace file")
+    while True:
+        header = file.read(RECORD.size)
+        if len(header) < RECORD.size:
+            return
+        timestamp, channel, direction, length = RECORD.unpack(header)
+        data = file.read(length)
+        if len(data) < length:
+            return  # Truncated trace
+        yield TraceRecord(timestamp, channel, direction, data)
+
+
+class TracingSocket:
+    """Copy the bytes passing through a socket to a TraceWriter
+
+    Everything not traced is passed through to the wrapped socket.
+    """
+
+    def __init__(self, sock, trace: TraceWriter, channel: int):
+        self.sock = sock
+        self.trace = trace
+        self.channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def recv(self, bufsize, *args):
+        data = self.sock.recv(bufsize, *args)
+        self.trace.write(self.channel, RECV, data)
+        return data
+
+    def recv_into(self, buffer, nbytes=0, *args):
+        received = self.sock.recv_into(buffer, nbytes, *args)
+        with memoryview(buffer) as view:
+            self.trace.write(self.channel, RECV, view[:received])
+        return received
+
+    def send(self, data, *args):
+        sent = self.sock.send(data, *args)
+        self.trace.write(self.channel, SEND, data[:sent])
+        return sent
+
+    def sendall(self, data, *args):
+        self.sock.sendall(data, *args)
+        self.trace.write(self.channel, SEND, data)
+
+
+class ReplaySocket:
+    """Serve the bytes received on one channel of a trace
+
+    Receives return the recorded chunks in order, so the traffic is replayed
+    with the same chunking as it was received. Sends are ignored.
+    """
+
+    def __init__(self, records: Iterable[TraceRecord], channel: int = DATA):
+        self._chunks = iter(
+            [r.data for r in records if r.channel == channel and r.direction == RECV]
+        )
+        self._rest = b""
+
+    def _next_chunk(self) -> bytes:
+        if self._rest:
+            return self._rest
+        return next(self._chunks, b"")
+
+    def recv(self, bufsize, *args):
+        chunk = self._next_chunk()
+        data, self._rest = chunk[:bufsize], chunk[bufsize:]
+        return data
+
+    def recv_into(self, buffer, nbytes=0, *args):
+        data = self.recv(nbytes or len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def send(self, data, *args):
+        return len(data)
+
+    def sendall(self, data, *args):
+        pass
+
+    def settimeout(self, timeout):
+        pass
+
+    def setblocking(self, flag):
+        pass
+
+    def close(self):
+        pass
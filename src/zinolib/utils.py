@@ -8,6 +8,7 @@ __all__ = [
     "windows_codepage_cp1252",
     "generate_authtoken",
     "enable_socket_keepalive",
+    "is_tcp_socket",
 ]
 
 
@@ -113,6 +114,14 @@ def _enable_keepalive_win(sock, after_idle_sec, interval_sec, max_fails):
     sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, after_idle_sec * 1000, interval_sec * 1000))
 
 
+def is_tcp_socket(sock) -> bool:
+    "Keepalive only makes sense for TCP, not for socketpairs and the like"
+    return (
+        getattr(sock, "family", None) in (socket.AF_INET, socket.AF_INET6)
+        and getattr(sock, "type", None) == socket.SOCK_STREAM
+    )
+
+
 def enable_socket_keepalive(sock, after_idle_sec=60, interval_sec=60, max_fails=5):
     platforms = {
         "Linux": _enable_keepalive_linux_netbsd,
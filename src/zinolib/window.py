@@ -0,0 +1,124 @@
+"""
+Pick the number of commands to keep in flight from measured latency
+
+A window that is too small wastes round trips, one that is too large only
+makes the commands queue up in the server. ``AdaptiveWindow`` finds the
+size in between the way TCP Vegas does: it keeps track of the lowest
+latency seen, which is what a command costs when nothing is queued, and
+estimates how many commands are queued as::
+
+    queued = size * (1 - min_rtt / rtt)
+
+where ``rtt`` is the mean latency over the last round, one window's worth
+of responses.
+
+It starts small and doubles the window every round, like TCP slow start,
+until commands start to queue. After that it grows by one per round while
+fewer than ``alpha`` commands are queued and shrinks by one while more than
+``beta`` are. If latency rises to ``overload`` times the lowest seen, the
+window is halved: the server is overloaded.
+
+Usage::
+
+    > window = AdaptiveWindow()
+    > window.observe(seconds)  # for each response
+    > window.size
+    8
+    > window.stats
+    {'size': 8, 'srtt': 0.012, ...}
+"""
+
+from typing import Optional
+
+
+__all__ = [
+    "AdaptiveWindow",
+]
+
+
+class AdaptiveWindow:
+    "Size a window of in-flight commands from the observed latencies"
+
+    # Weight of a new sample in the smoothed rtt
+    GAIN = 0.125
+
+    def __init__(self, initial=4, minimum=1, maximum=256, alpha=2, beta=4, overload=4.0):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError("Needs 1 <= minimum <= initial <= maximum")
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.alpha = alpha
+        self.beta = beta
+        self.overload = overload
+        self.reset()
+
+    def reset(self):
+        "Start over, for instance after reconnecting"
+        self.size = self.initial
+        self.slow_start = True
+        self.srtt: Optional[float] = None
+        self.min_rtt: Optional[float] = None
+        self.samples = 0
+        self.increases = 0
+        self.decreases = 0
+        self._round_sum = 0.0
+        self._round_count = 0
+
+    @property
+    def stats(self):
+        return {
+            "size": self.size,
+            "slow_start": self.slow_start,
+            "srtt": self.srtt,
+            "min_rtt": self.min_rtt,
+            "samples": self.samples,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+    def observe(self, rtt: float) -> int:
+        "Record the latency of one response, return the new window size"
+        self.samples += 1
+        if self.srtt is None:
+            self.srtt = rtt
+        else:
+            self.srtt += self.GAIN * (rtt - self.srtt)
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+        self._round_sum += rtt
+        self._round_count += 1
+        if self._round_count >= self.size:
+            self._adjust(self._round_sum / self._round_count)
+            self._round_sum = 0.0
+            self._round_count = 0
+        return self.size
+
+    def _resize(self, size):
+        size = max(self.minimum, min(self.maximum, size))
+        if size > self.size:
+            self.increases += 1
+        elif size < self.size:
+            self.decreases += 1
+        self.size = size
+
+    def _adjust(self, rtt):
+        if rtt <= 0:
+            # Too fast to measure, nothing can be queued
+            queued = 0.0
+        else:
+            queued = self.size * (1 - self.min_rtt / rtt)
+        if rtt > self.overload * self.min_rtt:
+            self.slow_start = False
+            self._resize(self.size // 2)
+        elif self.slow_start:
+            if queued > self.beta:
+                # Found the knee, keep what is not queued
+                self.slow_start = False
+                self._resize(int(self.size - queued) + self.alpha)
+            else:
+                self._resize(self.size * 2)
+        elif queued < self.alpha:
+            self._resize(self.size + 1)
+        elif queued > self.beta:
+            self._resize(self.size - 1)
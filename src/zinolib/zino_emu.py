@@ -35,16 +35,24 @@ class clientobj:
             while True:
                 if self.stop_signal.is_set():
                     return
-                buff += self.sock.recv(4096).decode("latin-1")
+                data = self.sock.recv(4096)
+                if not data:
+                    return  # The client is gone
+                buff += data.decode("latin-1")
                 dprint(repr(buff))
-                for k in autodict.keys():
-                    if k in buff:
-                        dprint("EMU RECV: %s" % repr(buff))
-                        # We got a match
-                        if not autodict[k]:
-                            return
-                        self.send(autodict[k])
-                        buff = ""
+                # Answer every command in the buffer, in order, so that
+                # pipelined commands work
+                while True:
+                    matches = [(buff.find(k), k) for k in autodict.keys() if k in buff]
+                    if not matches:
+                        break
+                    index, k = min(matches)
+                    dprint("EMU RECV: %s" % repr(buff))
+                    # We got a match
+                    if not autodict[k]:
+                        return
+                    self.send(autodict[k])
+                    buff = buff[index + len(k):]
         except socket.timeout:
             if self.stop_signal.is_set():
                 return
@@ -148,3 +156,76 @@ class zinoemu:
             clientsock.close()
             sock.close()
             dprint("Closed socket")
+
+
+class loopback:
+    """Serve clients in-process over socketpairs instead of TCP
+
+    Use it as the ``connector`` of ritz and notifier. Each connection gets
+    its own thread running the callback for its port, so there is no port
+    to bind and no need to wait for a server to start:
+        with loopback({8001: executor, 8002: notifications}) as connector:
+            session = ritz("zino", username="testuser", password="test", connector=connector)
+            session.connect()
+            notif = session.init_notifier()
+
+    A single callback serves every port.
+    """
+
+    def __init__(
+        self,
+        client_callback: Union[Callable[[clientobj], None], Dict[int, Callable[[clientobj], None]]],
+    ) -> None:
+        self.client_callback = client_callback
+        self.stop_event = threading.Event()
+        self.threads = []  # type: List[threading.Thread]
+        self.socks = []  # type: List[socket.socket]
+        self.exception = ""
+        self.traceback = []  # type: List[str]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+        if self.traceback:
+            raise Exception(self.traceback)
+
+    def __call__(self, address, timeout=None):
+        "Connect to the callback for the port in ``address``"
+        if isinstance(self.client_callback, dict):
+            callback = self.client_callback[address[1]]
+        else:
+            callback = self.client_callback
+        client, server = socket.socketpair()
+        client.settimeout(timeout)
+        self.socks.append(server)
+        thread = threading.Thread(target=self.serve, args=(callback, server, address), daemon=True)
+        self.threads.append(thread)
+        thread.start()
+        return client
+
+    def serve(self, callback, sock, address):
+        try:
+            callback(clientobj(sock, address, self.stop_event))
+        except (BrokenPipeError, ConnectionResetError):
+            dprint("EMU: The client closed the socket")
+        except Exception as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            print("Exception in loopback server '{}'".format(repr(e)))
+            traceback.print_exc()
+            self.exception = str(e)
+            self.traceback = traceback.format_tb(exc_traceback)
+        finally:
+            sock.close()
+
+    def stop(self):
+        self.stop_event.set()
+        for sock in self.socks:
+            try:
+                # Wakes up callbacks waiting for data
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self.threads:
+            thread.join(timeout=10)
@@ -5,7 +5,7 @@ import time
 import unittest
 from ipaddress import ip_address
 
-from zinolib.ritz import ritz, ProtocolError, AuthenticationError, caseState, caseType
+from zinolib.ritz import ritz, ProtocolError, AuthenticationError, caseState, caseType, NotifierResponse
 from zinolib.zino_emu import zinoemu
 
 from ..utils import executor
@@ -185,6 +185,121 @@ class DefaultTest(unittest.TestCase):
                 with self.assertRaises(ValueError):
                     sess.ntie(123456789)
 
+    def test_O_pipeline(self):
+        with zinoemu(executor):
+            with ritz("127.0.0.1", username="testuser", password="test") as sess:
+                with sess.pipeline() as pipe:
+                    pipe.request(b"getattrs 32802")
+                    pipe.request(b"setstate 40960 open")
+                    pipe.request(b"caseids")
+                    pipe.request(b"setstate 40959 open")
+                self.assertEqual(len(pipe.responses), 4)
+                attrs, error, caseids, ok = pipe.responses
+                self.assertEqual(attrs.header[0], 303)
+                self.assertIn("id: 32802", attrs.data)
+                self.assertEqual(error.header[0], 500)
+                self.assertEqual(caseids.data, ["32802", "34978"])
+                self.assertEqual(ok.header, (200, "ok"))
+                # The session is still in sync
+                self.assertEqual(sess.get_caseids(), [32802, 34978])
+
+    def test_P_get_raw_attributes_many(self):
+        with zinoemu(executor):
+            with ritz("127.0.0.1", username="testuser", password="test") as sess:
+                ids = [32802, 40960, 34978, 40959]
+                result = list(sess.get_raw_attributes_many(ids, window=2))
+                self.assertEqual([caseid for caseid, _ in result], ids)
+                self.assertIn("id: 32802", result[0][1])
+                self.assertIsInstance(result[1][1], ProtocolError)
+                self.assertIn("id: 34978", result[2][1])
+                self.assertIn("id: 40959", result[3][1])
+
+    def test_Q_get_raw_attributes_many_abandoned_early_stays_in_sync(self):
+        with zinoemu(executor):
+            with ritz("127.0.0.1", username="testuser", password="test") as sess:
+                attrlists = sess.get_raw_attributes_many([32802, 34978, 40959])
+                caseid, _ = next(attrlists)
+                self.assertEqual(caseid, 32802)
+                attrlists.close()
+                self.assertEqual(sess.get_caseids(), [32802, 34978])
+
+    def test_R_iter_request(self):
+        with zinoemu(executor):
+            with ritz("127.0.0.1", username="testuser", password="test") as sess:
+                stream = sess.iter_request(b"getlog 40959")
+                self.assertEqual(stream.header[0], 300)
+                self.assertTrue(next(stream).startswith("1539480952 oslo-gw1"))
+                self.assertFalse(stream.done)
+                # The rest of the log is skipped by the next command
+                self.assertEqual(sess.get_caseids(), [32802, 34978])
+                self.assertTrue(stream.done)
+                lines = list(sess.iter_raw_history(40959))
+                self.assertEqual(len(lines), 4)
+                stream = sess.iter_request(b"setstate 40960 open")
+                self.assertEqual(stream.header[0], 500)
+                self.assertEqual(list(stream), [])
+
+    def test_S_stats(self):
+        with zinoemu(executor):
+            sess = ritz("127.0.0.1", username="testuser", password="test")
+            stats = sess.enable_stats()
+            with sess:
+                sess.get_caseids()
+                sess.get_raw_attributes(32802)
+                sess.get_raw_attributes(34978)
+                sess.add_history(40959, "Testmelding ifra pyRitz")
+                list(sess.get_raw_attributes_many([32802, 34978]))
+            snapshot = stats.snapshot()
+            self.assertEqual(
+                set(snapshot),
+                {"connect", "user", "caseids", "getattrs", "addhist", "addhist data"},
+            )
+            self.assertEqual(snapshot["getattrs"]["total"]["count"], 4)
+            self.assertEqual(stats["caseids"].lines.max, 2)
+            self.assertEqual(stats["caseids"].bytes.max, len(
+                "304 list of active cases follows, terminated with '.'\r\n32802\r\n34978\r\n.\r\n"
+            ))
+
+    def test_T_account_io(self):
+        with zinoemu(executor):
+            sess = ritz("127.0.0.1", username="testuser", password="test", account_io=True)
+            with sess:
+                sess.get_caseids()
+            stats = sess.io_stats
+            self.assertEqual(stats.sends, 2)
+            self.assertEqual(stats.bytes_sent, len(
+                "user testuser 7f53cac4ffa877616b8472d3b33a44cbba1907ad  -\r\ncaseids\r\n"
+            ))
+            self.assertGreaterEqual(stats.recvs, 3)
+            self.assertGreater(stats.bytes_received, 0)
+
+    def test_U_adaptive_window(self):
+        with zinoemu(executor):
+            with ritz("127.0.0.1", username="testuser", password="test", adaptive_window=True) as sess:
+                result = dict(sess.get_raw_attributes_many([32802, 34978, 40960]))
+            self.assertEqual(len(result), 3)
+            self.assertIsInstance(result[40960], ProtocolError)
+            self.assertEqual(sess.window.stats["samples"], 3)
+
+    def test_V_notifier(self):
+        def notifications(client):
+            client.send("909e90c2eda89a09819ee7fe9b3f67cadb31449f\r\n32802 state open working\r\n")
+            client.send("32802 attr\r\n")
+
+        with zinoemu(executor), zinoemu(notifications, bind_port=8002):
+            with ritz("127.0.0.1", username="testuser", password="test") as sess:
+                notif = sess.init_notifier()
+                updates = []
+                deadline = time.monotonic() + 5
+                while len(updates) < 2 and time.monotonic() < deadline:
+                    update = notif.poll(0.1)
+                    if update:
+                        updates.append(update)
+            self.assertEqual(updates, [
+                NotifierResponse(32802, "state", "open working"),
+                NotifierResponse(32802, "attr", ""),
+            ])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+import time
+import unittest
+
+from zinolib.ritz import ritz, NotifierResponse
+from zinolib.zino_emu import loopback
+
+from ..utils import executor
+
+
+def notifications(client):
+    client.send("909e90c2eda89a09819ee7fe9b3f67cadb31449f\r\n32802 attr\r\n")
+
+
+class LoopbackTest(unittest.TestCase):
+
+    def test_request_session(self):
+        with loopback(executor) as connector:
+            with ritz("zino", username="testuser", password="test", connector=connector) as sess:
+                self.assertTrue(sess.connected)
+                self.assertEqual(sess.get_caseids(), [32802, 34978])
+
+    def test_several_sessions(self):
+        with loopback(executor) as connector:
+            sessions = [ritz("zino", username="testuser", password="test", connector=connector) for _ in range(3)]
+            for sess in sessions:
+                sess.connect()
+            for sess in sessions:
+                self.assertEqual(sess.get_caseids(), [32802, 34978])
+                sess.close()
+
+    def test_notifier(self):
+        with loopback({8001: executor, 8002: notifications}) as connector:
+            with ritz("zino", username="testuser", password="test", connector=connector) as sess:
+                notif = sess.init_notifier()
+                deadline = time.monotonic() + 5
+                update = None
+                while update is None and time.monotonic() < deadline:
+                    update = notif.poll(0.1)
+                self.assertEqual(update, NotifierResponse(32802, "attr", ""))
+
+    def test_adaptive_window_starts_over_on_reconnect(self):
+        with loopback(executor) as connector:
+            sess = ritz("zino", username="testuser", password="test", adaptive_window=True, connector=connector)
+            with sess:
+                dict(sess.get_raw_attributes_many([32802, 34978]))
+                self.assertEqual(sess.window.stats["samples"], 2)
+            with sess:
+                self.assertEqual(sess.window.stats["samples"], 0)
+                self.assertEqual(sess.window.size, sess.window.initial)
+
+    def test_notifier_accounts_io_like_its_session(self):
+        def notify_and_stay(client):
+            notifications(client)
+            client.executor({})
+
+        with loopback({8001: executor, 8002: notify_and_stay}) as connector:
+            with ritz("zino", username="testuser", password="test", account_io=True, connector=connector) as sess:
+                notif = sess.init_notifier()
+                updates = list(notif.updates(timeout=0.1))
+                self.assertEqual(updates, [NotifierResponse(32802, "attr", "")])
+                stats = notif.io_stats
+                self.assertIsNotNone(stats)
+                self.assertIsNot(stats, sess.io_stats)
+                self.assertGreaterEqual(stats.selects, 1)
+                self.assertGreater(stats.select_time, 0)
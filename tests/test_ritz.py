@@ -1,6 +1,9 @@
+import socket
+import threading
+import time
 import unittest
 
-from zinolib.ritz import _decode_history
+from zinolib.ritz import ritz, notifier, _decode_history, NotConnectedError, NotifierResponse
 
 
 class DecodeHistoryTest(unittest.TestCase):
@@ -27,3 +30,211 @@ class DecodeHistoryTest(unittest.TestCase):
         ]
         history = _decode_history(raw_history)
         self.assertEqual(len(history), 1, "Should have decoded only 1 history entry")
+
+
+class TimeoutTest(unittest.TestCase):
+    def setUp(self):
+        # A connected and authenticated session talking to self.server
+        self.session = ritz("127.0.0.1", timeout=1)
+        sock, self.server = socket.socketpair()
+        self.session._attach(sock)
+        self.session.connStatus = self.session.authenticated = True
+
+    def tearDown(self):
+        self.session.close()
+        self.server.close()
+
+    def test_per_call_timeout(self):
+        with self.assertRaises(TimeoutError):
+            self.session.get_caseids(timeout=0.05)
+
+    def test_per_verb_default(self):
+        self.session.timeouts["caseids"] = 0.05
+        with self.assertRaises(TimeoutError):
+            self.session.get_caseids()
+
+    def test_session_resyncs_after_timeout(self):
+        self.server.sendall(b"304 list of active cases follows\r\n1\r\n")
+        with self.assertRaises(TimeoutError):
+            self.session.get_caseids(timeout=0.05)
+        # The rest of the old response, then the answer to the next command
+        self.server.sendall(b"2\r\n.\r\n200 ok\r\n")
+        self.assertTrue(self.session.poll_router("foo"))
+
+    def test_session_resyncs_after_timeout_waiting_for_header(self):
+        with self.assertRaises(TimeoutError):
+            self.session.get_caseids(timeout=0.05)
+        self.server.sendall(b"304 list of active cases follows\r\n1\r\n.\r\n")
+        self.server.sendall(b"304 list of active cases follows\r\n3\r\n.\r\n")
+        self.assertEqual(self.session.get_caseids(), [3])
+
+    def test_session_is_closed_if_resync_fails(self):
+        with self.assertRaises(TimeoutError):
+            self.session.get_caseids(timeout=0.05)
+        self.session.timeout = 0.05
+        with self.assertRaises(NotConnectedError):
+            self.session.get_caseids()
+        self.assertFalse(self.session.connected)
+
+    def test_session_is_closed_if_server_waits_for_data(self):
+        with self.assertRaises(TimeoutError):
+            self.session.add_history(1, "hello", timeout=0.05)
+        self.server.sendall(b"302 please provide new history entry\r\n")
+        with self.assertRaises(NotConnectedError):
+            self.session.poll_router("foo")
+        self.assertFalse(self.session.connected)
+        # Nothing was sent that the server could take for history
+        self.server.settimeout(1)
+        self.assertEqual(self.server.recv(4096), b"addhist 1  -\r\n")
+
+    def test_budget_is_shared(self):
+        self.server.sendall(b"200 ok\r\n")
+        with self.session.budget(0.1):
+            self.assertTrue(self.session.poll_router("foo"))
+            with self.assertRaises(TimeoutError):
+                self.session.get_caseids(timeout=10)
+        self.assertIsNone(self.session._deadline)
+
+    def test_spent_budget_sends_nothing(self):
+        with self.session.budget(0):
+            with self.assertRaises(TimeoutError):
+                self.session.poll_router("foo")
+        self.assertEqual(self.session._outstanding, 0)
+
+
+class PipelineTest(unittest.TestCase):
+    def test_not_connected(self):
+        pipe = ritz("127.0.0.1").pipeline()
+        pipe.request(b"caseids")
+        with self.assertRaises(NotConnectedError):
+            pipe.execute()
+        self.assertEqual(len(pipe), 1)
+
+
+class StatsTest(unittest.TestCase):
+    def test_bytes_are_counted_as_received(self):
+        session = ritz("127.0.0.1", timeout=1)
+        stats = session.enable_stats()
+        sock, server = socket.socketpair()
+        session._attach(sock)
+        session.connStatus = session.authenticated = True
+        response = "300 log follows\r\n1539480952 blåbær\r\n.\r\n".encode("UTF-8")
+        server.sendall(response + b"300 log follows\r\n1539480952 bl\xe5b\xe6r\r\n.\r\n")
+        try:
+            session.get_raw_log(1)
+            self.assertEqual(stats["getlog"].bytes.max, len(response))
+            session.get_raw_log(1)
+            self.assertEqual(stats["getlog"].bytes.min, len(response) - 2)
+        finally:
+            session.close()
+            server.close()
+
+
+class PollManyTest(unittest.TestCase):
+    def setUp(self):
+        self.notifier = notifier(None)
+        sock, self.server = socket.socketpair()
+        sock.setblocking(False)
+        self.notifier._attach(sock)
+
+    def tearDown(self):
+        self.notifier._sock.close()
+        self.server.close()
+
+    def test_nothing_to_read(self):
+        self.assertEqual(self.notifier.poll_many(timeout=0), [])
+
+    def test_reads_everything_available(self):
+        self.server.sendall(b"".join(b"%d attr\r\n" % i for i in range(5000)))
+        updates = self.notifier.poll_many(timeout=1)
+        self.assertEqual(len(updates), 5000)
+        self.assertEqual(updates[-1], NotifierResponse(4999, "attr", ""))
+
+    def test_max_items(self):
+        self.server.sendall(b"1 attr\r\n2 log\r\n3 history\r\n")
+        self.assertEqual([n.id for n in self.notifier.poll_many(2, timeout=1)], [1, 2])
+        self.assertEqual([n.id for n in self.notifier.poll_many(2, timeout=1)], [3])
+
+    def test_multibyte_character_split_across_reads(self):
+        data = "1 history blåbær\r\n".encode("UTF-8")
+        self.server.sendall(data[:14])
+        self.assertEqual(self.notifier.poll_many(timeout=0.1), [])
+        self.server.sendall(data[14:])
+        self.assertEqual(
+            self.notifier.poll_many(timeout=1),
+            [NotifierResponse(1, "history", "blåbær")],
+        )
+
+    def test_lost_connection(self):
+        self.server.sendall(b"1 attr\r\n")
+        self.server.close()
+        self.assertEqual(len(self.notifier.poll_many(timeout=1)), 1)
+        with self.assertRaises(NotConnectedError):
+            self.notifier.poll_many(timeout=1)
+
+
+class UpdatesTest(unittest.TestCase):
+    def setUp(self):
+        self.notifier = notifier(None)
+        sock, self.server = socket.socketpair()
+        sock.setblocking(False)
+        self.notifier._attach(sock)
+
+    def tearDown(self):
+        self.notifier.close()
+        self.server.close()
+
+    def test_fileno(self):
+        self.assertEqual(self.notifier.fileno(), self.notifier._sock.fileno())
+        self.notifier.close()
+        with self.assertRaises(NotConnectedError):
+            self.notifier.fileno()
+
+    def test_readable(self):
+        self.assertFalse(self.notifier.readable())
+        self.server.sendall(b"1 attr\r\n2 attr\r\n")
+        self.assertTrue(self.notifier.readable())
+        self.notifier.poll(timeout=1)
+        # The second line is buffered, the socket is drained
+        self.assertTrue(self.notifier.readable())
+        self.notifier.poll()
+        self.assertFalse(self.notifier.readable())
+
+    def test_updates_times_out(self):
+        self.server.sendall(b"1 attr\r\n2 log\r\n")
+        updates = list(self.notifier.updates(timeout=0.05))
+        self.assertEqual([n.id for n in updates], [1, 2])
+
+    def test_wakeup(self):
+        received = []
+
+        def consume():
+            for n in self.notifier.updates():
+                received.append(n)
+
+        thread = threading.Thread(target=consume)
+        thread.start()
+        self.server.sendall(b"1 attr\r\n")
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.notifier.wakeup()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(received, [NotifierResponse(1, "attr", "")])
+        # A new iteration starts over
+        self.server.sendall(b"2 attr\r\n")
+        self.assertEqual([n.id for n in self.notifier.updates(timeout=0.05)], [2])
+
+    def test_wakeup_before_updates(self):
+        self.notifier.wakeup()
+        self.server.sendall(b"1 attr\r\n")
+        self.assertEqual(list(self.notifier.updates()), [])
+
+    def test_lost_connection(self):
+        self.server.sendall(b"1 attr\r\n")
+        self.server.close()
+        updates = self.notifier.updates()
+        self.assertEqual(next(updates).id, 1)
+        with self.assertRaises(NotConnectedError):
+            next(updates)
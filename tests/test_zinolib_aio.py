@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from zinolib.aio import AsyncRitz, AsyncNotifier
+from zinolib.ritz import ProtocolError, AuthenticationError, NotConnectedError, NotifierResponse, ZinoError
+from zinolib.zino_emu import zinoemu
+
+from .utils import executor
+
+
+class AsyncRitzTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_connect_illegal_first_response(self):
+        def client(client):
+            client.send("This will crash.. :)")
+
+        with zinoemu(client):
+            session = AsyncRitz("127.0.0.1", username="testuser", password="test")
+            with self.assertRaises(ProtocolError):
+                await session.connect()
+            self.assertFalse(session.connected)
+
+    async def test_connect_authentication_failed(self):
+        with zinoemu(executor):
+            session = AsyncRitz("127.0.0.1", username="auth-failure", password="test")
+            with self.assertRaises(AuthenticationError):
+                await session.connect()
+            await session.close()
+
+    async def test_concurrent_callers_get_their_own_responses(self):
+        with zinoemu(executor):
+            async with AsyncRitz("127.0.0.1", username="testuser", password="test") as session:
+                self.assertTrue(session.connected)
+                results = await asyncio.gather(
+                    session.get_caseids(),
+                    session.get_raw_attributes(32802),
+                    session.get_raw_log(40959),
+                    session.add_history(40959, "Testmelding ifra pyRitz"),
+                    session.get_raw_attributes(34978),
+                    session.set_state(40959, "open"),
+                    session.get_history(40959),
+                )
+                caseids, attrs1, log, added, attrs2, state_set, history = results
+                self.assertEqual(caseids, [32802, 34978])
+                self.assertIn("id: 32802", attrs1)
+                self.assertEqual(len(log.data), 3)
+                self.assertTrue(added)
+                self.assertIn("id: 34978", attrs2)
+                self.assertTrue(state_set)
+                self.assertEqual(history[1]["user"], "runarb")
+
+    async def test_errors_are_per_command(self):
+        with zinoemu(executor):
+            async with AsyncRitz("127.0.0.1", username="testuser", password="test") as session:
+                with self.assertRaises(ProtocolError):
+                    await session.get_raw_attributes(40960)
+                with self.assertRaises(ValueError):
+                    await session.set_state(40960, "open")
+                self.assertTrue(await session.ntie("909e90c2eda89a09819ee7fe9b3f67cadb31449f"))
+                self.assertTrue(await session.poll_router("uninett-tor-sw3"))
+                self.assertTrue(await session.clear_flapping("uninett-tor-sw3", 707))
+
+    async def test_commands_fail_after_server_hangs_up(self):
+        def hang_up(client):
+            client.send("200 2f88fe9d496b1c1a33a8d69f5c3ff7e8c34a1069 Hello, there\r\n")
+            client.executor({
+                "user testuser 7f53cac4ffa877616b8472d3b33a44cbba1907ad  -\r\n": ["200 ok\r\n"],
+                "caseids\r\n": [],
+            })
+
+        with zinoemu(hang_up):
+            async with AsyncRitz("127.0.0.1", username="testuser", password="test") as session:
+                with self.assertRaises(ProtocolError):
+                    await session.get_caseids()
+                self.assertFalse(session.connected)
+                with self.assertRaises(NotConnectedError):
+                    await session.get_caseids()
+                with self.assertRaises(NotConnectedError):
+                    await session.add_history(40959, "Testmelding ifra pyRitz")
+
+    async def test_connect_timeout_is_timeout_error(self):
+        async def never(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        with patch("asyncio.open_connection", never):
+            session = AsyncRitz("127.0.0.1", timeout=0.05)
+            with self.assertRaises(TimeoutError):
+                await session.connect()
+            with self.assertRaises(TimeoutError):
+                await AsyncNotifier(session, timeout=0.05).connect()
+
+
+def notifications(client):
+    client.send("909e90c2eda89a09819ee7fe9b3f67cadb31449f\r\n")
+    client.send(["32802 state open working\r\n", "32802 attr\r\n", "34978 log\r\n"])
+
+
+class AsyncNotifierTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_async_for_yields_updates_until_connection_is_lost(self):
+        with zinoemu(executor), zinoemu(notifications, bind_port=8002):
+            async with AsyncRitz("127.0.0.1", username="testuser", password="test") as session:
+                notifier = AsyncNotifier(session)
+                await notifier.connect()
+                updates = []
+                with self.assertRaises(NotConnectedError):
+                    async for update in notifier:
+                        updates.append(update)
+                await notifier.close()
+        expected = [
+            NotifierResponse(32802, "state", "open working"),
+            NotifierResponse(32802, "attr", ""),
+            NotifierResponse(34978, "log", ""),
+        ]
+        self.assertEqual(updates, expected)
+
+    async def test_wrong_key_fails(self):
+        def bad_key(client):
+            client.send("not-a-key Hello\r\n")
+
+        with zinoemu(executor), zinoemu(bad_key, bind_port=8002):
+            async with AsyncRitz("127.0.0.1", username="testuser", password="test") as session:
+                with self.assertRaises(NotConnectedError):
+                    await AsyncNotifier(session).connect()
+
+    async def test_failed_tie_closes_notifier(self):
+        def unknown_key(client):
+            client.send("x" * 40 + " Hello\r\n")
+
+        with zinoemu(executor), zinoemu(unknown_key, bind_port=8002):
+            async with AsyncRitz("127.0.0.1", username="testuser", password="test") as session:
+                notifier = AsyncNotifier(session)
+                with self.assertRaises(ZinoError):
+                    await notifier.connect()
+                self.assertIsNone(notifier._writer)
+                self.assertFalse(notifier.connStatus)
@@ -0,0 +1,181 @@
+import asyncio
+import queue
+import socket
+import time
+import unittest
+
+from zinolib.controllers.worker import AsyncUpdateWorker, Change, Subscription, UpdateWorker
+from zinolib.controllers.zino1 import UpdateHandler
+from zinolib.ritz import NotConnectedError, notifier
+
+from .test_zinolib_controllers_zino1 import FakeZino1EventManager, raw_event_id
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+class SubscriptionTest(unittest.TestCase):
+
+    def test_drops_oldest_when_full(self):
+        subscription = Subscription(None, maxsize=2)
+        for event_id in range(5):
+            subscription._offer(Change(event_id, None, 1))
+        self.assertEqual(subscription.dropped, 3)
+        self.assertEqual([subscription.get(0).event_id for _ in range(2)], [3, 4])
+        with self.assertRaises(queue.Empty):
+            subscription.get(0)
+
+    def test_close_ends_iteration(self):
+        subscription = Subscription(None, maxsize=1)
+        subscription._offer(Change(1, None, 1))
+        subscription._close()
+        self.assertEqual(list(subscription), [])
+        self.assertIsNone(subscription.get())
+
+
+class WorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.zino1 = FakeZino1EventManager.configure(None)
+        self.zino1.get_events()
+        push = notifier(None)
+        sock, self.server = socket.socketpair()
+        sock.setblocking(False)
+        push._attach(sock)
+        self.zino1.session.push = push
+        self.handler = UpdateHandler(self.zino1, autoremove=True)
+
+    def tearDown(self):
+        self.zino1.session.push.close()
+        self.server.close()
+
+
+class UpdateWorkerTest(WorkerTestCase):
+
+    def test_publishes_changes(self):
+        with UpdateWorker(self.handler) as worker:
+            changes = worker.subscribe()
+            self.server.sendall(b"%d attr\r\n" % raw_event_id)
+            change = changes.get(timeout=5)
+            self.assertEqual(change.event_id, raw_event_id)
+            self.assertFalse(change.removed)
+            self.assertIs(change.event, self.zino1.events[raw_event_id])
+            self.assertEqual(change.version, self.zino1.versions[raw_event_id])
+            self.server.sendall(b"%d scavenged\r\n" % raw_event_id)
+            self.assertTrue(changes.get(timeout=5).removed)
+        self.assertEqual(list(changes), [])
+        self.assertFalse(worker.running)
+
+    def test_filters(self):
+        with UpdateWorker(self.handler) as worker:
+            none = worker.subscribe(lambda change: change.event_id == 1)
+            removals = worker.subscribe(lambda change: change.removed)
+            self.server.sendall(b"%d attr\r\n%d scavenged\r\n" % (raw_event_id, raw_event_id))
+            self.assertTrue(removals.get(timeout=5).removed)
+            self.assertEqual(len(none), 0)
+
+    def test_slow_subscriber_does_not_stall(self):
+        with UpdateWorker(self.handler) as worker:
+            slow = worker.subscribe(maxsize=2)
+            fast = worker.subscribe()
+            self.server.sendall(b"".join(b"%d attr\r\n" % raw_event_id for _ in range(10)))
+            wait_for(lambda: worker.published == 10)
+            self.assertEqual(len(fast), 10)
+            self.assertEqual(len(slow), 2)
+            self.assertEqual(slow.dropped, 8)
+
+    def test_cancel(self):
+        with UpdateWorker(self.handler) as worker:
+            changes = worker.subscribe()
+            changes.cancel()
+            self.server.sendall(b"%d attr\r\n" % raw_event_id)
+            wait_for(lambda: worker.published == 1)
+            self.assertEqual(list(changes), [])
+
+    def test_stops_on_lost_connection(self):
+        worker = UpdateWorker(self.handler)
+        worker.start()
+        changes = worker.subscribe()
+        with self.assertLogs('zinolib.controllers.worker', level='ERROR'):
+            self.server.close()
+            wait_for(lambda: not worker.running)
+        worker.stop()
+        self.assertIsNotNone(worker.error)
+        self.assertEqual(list(changes), [])
+
+
+class RecoveryTest(WorkerTestCase):
+
+    def fail_once(self, error, disconnect=False):
+        request = self.zino1.session.request
+        create_event_from_id = self.zino1.create_event_from_id
+        failures = []
+
+        def failing(*args, **kwargs):
+            if not failures:
+                failures.append(error)
+                if disconnect:
+                    request.connected = False
+                raise error
+            return create_event_from_id(*args, **kwargs)
+
+        self.zino1.create_event_from_id = failing
+
+    def test_timeout_is_not_fatal(self):
+        self.fail_once(TimeoutError("timed out"))
+        with UpdateWorker(self.handler, retry_delay=0.01) as worker:
+            changes = worker.subscribe()
+            with self.assertLogs('zinolib.controllers.worker', level='WARNING'):
+                self.server.sendall(b"%d attr\r\n" % raw_event_id)
+                # The resync publishes the event
+                self.assertEqual(changes.get(timeout=5).event_id, raw_event_id)
+            self.assertTrue(worker.running)
+            self.assertEqual(worker.recoveries, 1)
+            self.assertEqual(self.handler.resyncs, 1)
+            self.server.sendall(b"%d attr\r\n" % raw_event_id)
+            self.assertEqual(changes.get(timeout=5).event_id, raw_event_id)
+
+    def test_reconnects_data_channel(self):
+        request = self.zino1.session.request
+        request.connect = lambda: setattr(request, "connected", True)
+        self.fail_once(NotConnectedError("Lost connection"), disconnect=True)
+        with UpdateWorker(self.handler, retry_delay=0.01) as worker:
+            changes = worker.subscribe()
+            with self.assertLogs('zinolib.controllers.worker', level='WARNING'):
+                self.server.sendall(b"%d attr\r\n" % raw_event_id)
+                self.assertEqual(changes.get(timeout=5).event_id, raw_event_id)
+            self.assertTrue(worker.running)
+            self.assertTrue(request.connected)
+
+    def test_delivered_events_are_not_changed(self):
+        # As if fetched in full, with an empty history
+        self.zino1._set_event(self.zino1.events[raw_event_id])
+        with UpdateWorker(self.handler) as worker:
+            changes = worker.subscribe()
+            self.server.sendall(b"%d attr\r\n" % raw_event_id)
+            first = changes.get(timeout=5)
+            self.assertEqual(first.event.history, [])
+            self.server.sendall(b"%d history\r\n" % raw_event_id)
+            second = changes.get(timeout=5)
+        self.assertEqual(len(second.event.history), 5)
+        self.assertEqual(first.event.history, [])
+        self.assertLess(first.version, second.version)
+
+
+class AsyncUpdateWorkerTest(WorkerTestCase):
+
+    def test_async_subscription(self):
+        async def run():
+            async with AsyncUpdateWorker(self.handler) as worker:
+                changes = worker.subscribe()
+                self.server.sendall(b"%d attr\r\n" % raw_event_id)
+                change = await asyncio.wait_for(changes.get(), 5)
+                self.assertEqual(change.event_id, raw_event_id)
+            return [change async for change in changes]
+
+        self.assertEqual(asyncio.run(run()), [])
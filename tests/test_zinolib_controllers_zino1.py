@@ -1,10 +1,14 @@
+import socket
 import unittest
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 
 from zinolib.event_types import AdmState, Event, HistoryEntry, LogEntry
 from zinolib.controllers.zino1 import EventAdapter, HistoryAdapter, LogAdapter, SessionAdapter, Zino1EventManager, UpdateHandler
-from zinolib.controllers.zino1 import RetryError, NotConnectedError
-from zinolib.ritz import NotifierResponse
+from zinolib.controllers.zino1 import RetryError, NotConnectedError, TailCache
+from zinolib.pool import RitzPool
+from zinolib.singleflight import SingleFlight
+from zinolib.ritz import NotifierResponse, ProtocolError, notifier
 
 raw_event_id = 139110
 raw_attrlist = [
@@ -46,6 +50,11 @@ class FakeEventAdapter:
     def get_attrlist(request, event_id: int):
         return raw_attrlist.copy()
 
+    @classmethod
+    def get_attrlists(cls, request, event_ids):
+        for event_id in event_ids:
+            yield event_id, cls.get_attrlist(request, event_id)
+
     @classmethod
     def attrlist_to_attrdict(cls, attrlist):
         return EventAdapter.attrlist_to_attrdict(attrlist)
@@ -68,12 +77,22 @@ class FakeHistoryAdapter(HistoryAdapter):
     def get_history(request, event_id: int):
         return raw_history.copy()
 
+    @classmethod
+    def get_histories(cls, request, event_ids):
+        for event_id in event_ids:
+            yield event_id, cls.get_history(request, event_id)
+
 
 class FakeLogAdapter(LogAdapter):
     @staticmethod
     def get_log(request, event_id: int):
         return raw_log.copy()
 
+    @classmethod
+    def get_logs(cls, request, event_ids):
+        for event_id in event_ids:
+            yield event_id, cls.get_log(request, event_id)
+
 
 class FakeSessionAdapter(SessionAdapter):
 
@@ -161,6 +180,103 @@ class Zino1EventManagerTest(unittest.TestCase):
         self.assertIn(raw_event_id, zino1.events)
         self.assertEqual(zino1.events[raw_event_id].id, raw_event_id)
 
+    def test_get_events_removes_events_the_server_has_errors_for(self):
+        class ErrorEventAdapter(FakeEventAdapter):
+            @staticmethod
+            def get_event_ids(request):
+                return [raw_event_id, 1337]
+
+            @classmethod
+            def get_attrlists(cls, request, event_ids):
+                yield raw_event_id, cls.get_attrlist(request, raw_event_id)
+                yield 1337, ProtocolError((500, "no such case"))
+
+        zino1 = self.init_manager()
+        zino1._event_adapter = ErrorEventAdapter
+        zino1.get_events()
+        self.assertIn(raw_event_id, zino1.events)
+        self.assertNotIn(1337, zino1.events)
+        self.assertIn(1337, zino1.removed_ids)
+
+    def test_requests_use_pooled_sessions_if_configured(self):
+        class PooledRequest:
+            connected = True
+
+            def close(self):
+                pass
+
+        zino1 = self.init_manager()
+        zino1.pool = RitzPool(PooledRequest, size=2)
+        zino1.get_events()
+        zino1.get_updated_event_for_id(raw_event_id)
+        self.assertEqual(zino1.pool.idle, 1)
+        self.assertEqual(zino1.pool.in_use, 0)
+
+    def test_coalesced_reads_still_work_sequentially(self):
+        zino1 = self.init_manager()
+        zino1.singleflight = SingleFlight()
+        zino1.get_events()
+        event = zino1.get_updated_event_for_id(raw_event_id)
+        self.assertEqual(len(event.history), 5)
+        self.assertEqual(zino1.singleflight.stats, {"hits": 0, "misses": 4})
+
+    def test_coalesced_results_are_not_changed(self):
+        zino1 = self.init_manager()
+        zino1.singleflight = SingleFlight()
+        zino1.get_events()
+        created = []
+        create_event_from_id = zino1.create_event_from_id
+
+        def create(*args, **kwargs):
+            event = create_event_from_id(*args, **kwargs)
+            created.append(event)
+            return event
+
+        zino1.create_event_from_id = create
+        event = zino1.get_updated_event_for_id(raw_event_id)
+        self.assertEqual(len(event.history), 5)
+        self.assertIsNot(event, created[0])
+        self.assertEqual(created[0].history, [])
+        self.assertEqual(created[0].log, [])
+        self.assertIs(zino1.events[raw_event_id], event)
+
+    def test_get_updated_event_for_id_shares_one_timeout(self):
+        budgets = []
+
+        class BudgetedRequest:
+            connected = True
+
+            @contextmanager
+            def budget(self, timeout):
+                budgets.append(timeout)
+                yield
+
+        zino1 = self.init_manager()
+        zino1.session.request = BudgetedRequest()
+        zino1.get_updated_event_for_id(raw_event_id, timeout=5)
+        self.assertEqual(len(budgets), 3)
+        self.assertTrue(5 >= budgets[0] >= budgets[1] >= budgets[2] > 0)
+
+    def test_coalesced_reads_take_positional_arguments(self):
+        budgets = []
+
+        class BudgetedRequest:
+            connected = True
+
+            @contextmanager
+            def budget(self, timeout):
+                budgets.append(timeout)
+                yield
+
+        zino1 = self.init_manager()
+        zino1.session.request = BudgetedRequest()
+        zino1.get_events()
+        for singleflight in (None, SingleFlight()):
+            zino1.singleflight = singleflight
+            event = zino1.get_updated_event_for_id(raw_event_id, 5)
+            self.assertEqual(event.id, raw_event_id)
+        self.assertEqual(len(budgets), 6)
+
     def test_get_history_for_id(self):
         zino1 = self.init_manager()
         history_list = zino1.get_history_for_id(4567)
@@ -202,6 +318,22 @@ class Zino1EventManagerTest(unittest.TestCase):
         self.assertEqual(log_list, expected_log_list)
 
 
+class SessionAdapterTest(unittest.TestCase):
+
+    def test_close_push_channel_closes_all_sockets(self):
+        class Session:
+            push = notifier(None)
+
+        sock, server = socket.socketpair()
+        self.addCleanup(server.close)
+        Session.push._attach(sock)
+        list(Session.push.updates(timeout=0))
+        wakeup = [Session.push._wakeup_recv, Session.push._wakeup_send]
+        SessionAdapter.close_push_channel(Session)
+        self.assertIsNone(Session.push)
+        self.assertEqual([s.fileno() for s in [sock] + wakeup], [-1, -1, -1])
+
+
 class UpdateHandlerTest(unittest.TestCase):
 
     def init_manager(self):
@@ -282,13 +414,12 @@ class UpdateHandlerTest(unittest.TestCase):
     def test_handle_known_type(self):
         zino1 = self.init_manager()
         zino1.get_events()
-        old_events = zino1.events.copy()
-        old_events[raw_event_id].priority = 500
+        zino1.events[raw_event_id].log = []
         updates = UpdateHandler(zino1)
         update = NotifierResponse(raw_event_id, updates.UpdateType.LOG, "")
-        ok = updates.handle_event_update(update)  # will refetch events
+        ok = updates.handle_event_update(update)  # will refetch the log
         self.assertTrue(ok)
-        self.assertNotEqual(zino1.events[raw_event_id].priority, old_events[raw_event_id].priority)
+        self.assertEqual(len(zino1.events[raw_event_id].log), 2)
 
     def test_handle_unknown_type(self):
         zino1 = self.init_manager()
@@ -298,3 +429,462 @@ class UpdateHandlerTest(unittest.TestCase):
         with self.assertLogs('zinolib.controllers.zino1', level='WARNING'):
             ok = updates.handle_event_update(update)  # will run fallback
             self.assertFalse(ok)
+
+
+class FakePush:
+    class _sock:
+        @staticmethod
+        def fileno():
+            return 3
+
+    def __init__(self, pending=()):
+        self.pending = list(pending)
+
+    def poll_many(self, max_items=None, timeout=0):
+        count = len(self.pending) if max_items is None else max_items
+        batch, self.pending = self.pending[:count], self.pending[count:]
+        return batch
+
+
+class BoundedQueueTest(unittest.TestCase):
+
+    def init_manager(self, pending):
+        zino1 = FakeZino1EventManager.configure(None)
+        zino1.get_events()
+        zino1.session.push = FakePush(pending)
+        return zino1
+
+    def attr_updates(self, count):
+        return [NotifierResponse(raw_event_id, "attr", "")] * count
+
+    def test_unbounded_queue(self):
+        zino1 = self.init_manager(self.attr_updates(5))
+        updates = UpdateHandler(zino1)
+        handled = 0
+        while updates.get_event_update():
+            handled += 1
+        self.assertEqual(handled, 5)
+        self.assertEqual(updates.stats["received"], 5)
+        self.assertEqual(updates.stats["overflows"], 0)
+
+    def test_below_high_water_mark(self):
+        zino1 = self.init_manager(self.attr_updates(3))
+        updates = UpdateHandler(zino1, queue_size=3)
+        self.assertEqual(updates.ingest(), 3)
+        self.assertEqual(len(updates.queue), 3)
+        self.assertFalse(updates.resync_pending)
+
+    def test_overflow_drops_and_resyncs(self):
+        zino1 = self.init_manager(self.attr_updates(5000))
+        zino1.events[42] = zino1.events[raw_event_id].model_copy(update={"id": 42})
+        updates = UpdateHandler(zino1, queue_size=10)
+        with self.assertLogs('zinolib.controllers.zino1', level='WARNING'):
+            self.assertIs(updates.get_event_update(), True)
+        self.assertEqual(zino1.session.push.pending, [])
+        self.assertEqual(len(updates.queue), 0)
+        stats = updates.stats
+        self.assertEqual(
+            {key: stats[key] for key in ("queued", "received", "overflows", "dropped", "resyncs")},
+            {"queued": 0, "received": 5000, "overflows": 1, "dropped": 5000, "resyncs": 1},
+        )
+        # The server does not have 42
+        self.assertNotIn(42, zino1.events)
+        self.assertIn(42, zino1.removed_ids)
+        self.assertIn(raw_event_id, zino1.events)
+        self.assertFalse(updates.get_event_update())
+
+    def test_handles_updates_after_resync(self):
+        zino1 = self.init_manager(self.attr_updates(11))
+        updates = UpdateHandler(zino1, queue_size=10)
+        with self.assertLogs('zinolib.controllers.zino1', level='WARNING'):
+            updates.get_event_update()
+        zino1.session.push.pending = self.attr_updates(1)
+        self.assertEqual(updates.get_event_update(), raw_event_id)
+
+
+class StormModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zino1 = FakeZino1EventManager.configure(None)
+        self.zino1.get_events()
+        self.zino1.session.push = FakePush()
+        self.now = 1000.0
+        self.mode_changes = []
+        self.updates = UpdateHandler(
+            self.zino1,
+            storm_threshold=10,
+            storm_interval=1.0,
+            on_mode_change=lambda mode, rate: self.mode_changes.append(mode),
+        )
+        self.updates._clock = lambda: self.now
+        self.refreshed = []
+        refresh_events = self.zino1.refresh_events
+
+        def counting_refresh(event_ids):
+            self.refreshed.append(list(event_ids))
+            return refresh_events(event_ids)
+
+        self.zino1.refresh_events = counting_refresh
+
+    def send(self, *updates):
+        self.zino1.session.push.pending.extend(updates)
+
+    def test_normal_rate_refreshes_each(self):
+        self.send(NotifierResponse(raw_event_id, "attr", ""))
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        self.assertEqual(self.updates.mode, UpdateHandler.Mode.NORMAL)
+        self.assertEqual(self.refreshed, [])
+
+    def test_storm_marks_dirty_and_refreshes_in_bulk(self):
+        self.send(*[NotifierResponse(raw_event_id, "attr", "")] * 50)
+        with self.assertLogs('zinolib.controllers.zino1', level='INFO'):
+            self.assertFalse(self.updates.get_event_update())
+        self.assertEqual(self.mode_changes, [UpdateHandler.Mode.STORM])
+        self.assertEqual(self.updates.dirty, {raw_event_id})
+        self.assertEqual(len(self.updates.queue), 0)
+        # Nothing is refreshed before the interval has passed
+        self.now += 0.5
+        self.assertFalse(self.updates.get_event_update())
+        self.now += 0.6
+        self.send(*[NotifierResponse(raw_event_id, "log", "")] * 50)
+        self.assertTrue(self.updates.get_event_update())
+        self.assertEqual(self.refreshed, [[raw_event_id]])
+        self.assertEqual(self.updates.dirty, set())
+        self.assertEqual(self.updates.mode, UpdateHandler.Mode.STORM)
+        self.assertEqual(self.zino1.events[raw_event_id].log[0].log, "some log message")
+
+    def test_back_to_normal(self):
+        self.send(*[NotifierResponse(raw_event_id, "attr", "")] * 50)
+        with self.assertLogs('zinolib.controllers.zino1', level='INFO'):
+            self.updates.get_event_update()
+            self.now += 1.5
+            self.send(NotifierResponse(raw_event_id, "attr", ""))
+            self.updates.get_event_update()
+        self.assertEqual(self.mode_changes, [UpdateHandler.Mode.STORM, UpdateHandler.Mode.NORMAL])
+        # The dirty events are refreshed on the way out
+        self.assertEqual(self.refreshed, [[raw_event_id]])
+        self.assertEqual(self.updates.stats["storms"], 1)
+        self.send(NotifierResponse(raw_event_id, "attr", ""))
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+
+    def test_removals_are_immediate(self):
+        self.send(*[NotifierResponse(raw_event_id, "attr", "")] * 50)
+        self.send(NotifierResponse(raw_event_id, "scavenged", ""))
+        with self.assertLogs('zinolib.controllers.zino1', level='INFO'):
+            self.updates.get_event_update()
+        self.assertNotIn(raw_event_id, self.zino1.events)
+        self.assertEqual(self.updates.dirty, set())
+
+
+class RefreshEventsTest(unittest.TestCase):
+
+    def test_refresh_events(self):
+        zino1 = FakeZino1EventManager.configure(None)
+        refreshed = zino1.refresh_events([raw_event_id])
+        self.assertEqual(refreshed, {raw_event_id})
+        event = zino1.events[raw_event_id]
+        self.assertEqual(len(event.history), 5)
+        self.assertEqual(len(event.log), 2)
+
+    def test_gone_events_are_removed(self):
+        class GoneHistoryAdapter(FakeHistoryAdapter):
+            @staticmethod
+            def get_histories(request, event_ids):
+                for event_id in event_ids:
+                    yield event_id, ProtocolError((500, "No such case"))
+
+        zino1 = FakeZino1EventManager.configure(None)
+        zino1.get_events()
+        zino1._history_adapter = GoneHistoryAdapter
+        self.assertEqual(zino1.refresh_events([raw_event_id]), set())
+        self.assertNotIn(raw_event_id, zino1.events)
+        self.assertIn(raw_event_id, zino1.removed_ids)
+
+
+class CoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zino1 = FakeZino1EventManager.configure(None)
+        self.zino1.get_events()
+        self.zino1.session.push = FakePush()
+        self.now = 1000.0
+        self.updates = UpdateHandler(self.zino1, autoremove=True, coalesce_window=0.2)
+        self.updates._clock = lambda: self.now
+        self.refreshed = []
+        self.updates.refresh = lambda event_id, parts: self.refreshed.append((event_id, parts))
+
+    def send(self, *updates):
+        self.zino1.session.push.pending.extend(updates)
+
+    def test_merges_updates_for_one_id(self):
+        self.send(
+            NotifierResponse(raw_event_id, "attr", ""),
+            NotifierResponse(raw_event_id, "log", ""),
+            NotifierResponse(raw_event_id, "state", "open working"),
+        )
+        self.assertFalse(self.updates.get_event_update())
+        self.now += 0.1
+        self.send(NotifierResponse(raw_event_id, "history", ""))
+        self.assertFalse(self.updates.get_event_update())
+        self.now += 0.1
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        self.assertFalse(self.updates.get_event_update())
+        self.assertEqual(self.refreshed, [(raw_event_id, {"attrs", "history", "log"})])
+        self.assertEqual(self.updates.stats["coalesced"], 3)
+
+    def test_refreshes_in_order_first_notified(self):
+        self.send(NotifierResponse(raw_event_id, "attr", ""), NotifierResponse(5, "state", "embryonic open"))
+        self.updates.get_event_update()
+        self.now += 0.3
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        self.assertEqual(self.updates.get_event_update(), 5)
+        self.assertEqual(self.refreshed, [(raw_event_id, {"attrs"}), (5, {"attrs", "history"})])
+
+    def test_removal_is_immediate(self):
+        self.send(
+            NotifierResponse(raw_event_id, "attr", ""),
+            NotifierResponse(raw_event_id, "state", "open closed"),
+        )
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        self.assertNotIn(raw_event_id, self.zino1.events)
+        self.now += 0.3
+        self.assertFalse(self.updates.get_event_update())
+        self.assertEqual(self.refreshed, [])
+
+
+class PartialRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zino1 = FakeZino1EventManager.configure(None)
+        self.zino1.get_events()
+        self.event = self.zino1.events[raw_event_id]
+        self.event.history = ["old history"]
+        self.event.log = ["old log"]
+        # As if fetched in full
+        self.zino1._set_event(self.event)
+        self.fetched = []
+        for name in ("create_event_from_id", "get_history_for_id", "get_log_for_id"):
+            self.count(name)
+        self.updates = UpdateHandler(self.zino1)
+
+    def count(self, name):
+        method = getattr(self.zino1, name)
+
+        def counted(*args, **kwargs):
+            self.fetched.append(name)
+            return method(*args, **kwargs)
+
+        setattr(self.zino1, name, counted)
+
+    def test_attr_keeps_history_and_log(self):
+        self.updates.cmd_attr(NotifierResponse(raw_event_id, "attr", ""))
+        self.assertEqual(self.fetched, ["create_event_from_id"])
+        event = self.zino1.events[raw_event_id]
+        self.assertIsNot(event, self.event)
+        self.assertEqual(event.history, ["old history"])
+        self.assertEqual(event.log, ["old log"])
+
+    def test_log(self):
+        self.updates.cmd_log(NotifierResponse(raw_event_id, "log", ""))
+        self.assertEqual(self.fetched, ["get_log_for_id"])
+        self.assertEqual(len(self.zino1.events[raw_event_id].log), 2)
+        self.assertEqual(self.zino1.events[raw_event_id].history, ["old history"])
+
+    def test_history(self):
+        self.updates.cmd_history(NotifierResponse(raw_event_id, "history", ""))
+        self.assertEqual(self.fetched, ["get_history_for_id"])
+        self.assertEqual(len(self.zino1.events[raw_event_id].history), 5)
+
+    def test_state(self):
+        self.updates.cmd_state(NotifierResponse(raw_event_id, "state", "open working"))
+        self.assertEqual(sorted(self.fetched), ["create_event_from_id", "get_history_for_id"])
+        self.assertEqual(self.zino1.events[raw_event_id].log, ["old log"])
+
+    def test_cached_event_is_not_changed(self):
+        self.updates.cmd_history(NotifierResponse(raw_event_id, "history", ""))
+        self.updates.cmd_log(NotifierResponse(raw_event_id, "log", ""))
+        self.assertIsNot(self.zino1.events[raw_event_id], self.event)
+        self.assertEqual(self.event.history, ["old history"])
+        self.assertEqual(self.event.log, ["old log"])
+
+    def test_parts_never_fetched_are_fetched(self):
+        # get_events() only fetches the attributes
+        self.zino1.get_events()
+        self.updates.cmd_attr(NotifierResponse(raw_event_id, "attr", ""))
+        self.assertEqual(
+            self.fetched,
+            ["create_event_from_id", "get_history_for_id", "get_log_for_id"],
+        )
+        event = self.zino1.events[raw_event_id]
+        self.assertEqual(len(event.history), 5)
+        self.assertEqual(len(event.log), 2)
+        # Now they are known
+        self.fetched.clear()
+        self.updates.cmd_log(NotifierResponse(raw_event_id, "log", ""))
+        self.assertEqual(self.fetched, ["get_log_for_id"])
+
+    def test_unknown_event_is_fetched_in_full(self):
+        self.zino1.events.clear()
+        self.updates.cmd_state(NotifierResponse(raw_event_id, "state", "embryonic open"))
+        self.assertEqual(
+            self.fetched,
+            ["create_event_from_id", "get_history_for_id", "get_log_for_id"],
+        )
+
+
+class ApplyStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zino1 = FakeZino1EventManager.configure(None)
+        self.zino1.get_events()
+        self.zino1.session.push = FakePush()
+        self.now = 1000.0
+        self.updates = UpdateHandler(self.zino1, apply_state=True, verify_delay=2.0)
+        self.updates._clock = lambda: self.now
+        self.changed = []
+        self.updates.subscribe(self.changed.append)
+        self.fetched = []
+        method = self.zino1.create_event_from_id
+
+        def counted(*args, **kwargs):
+            self.fetched.append(args[0])
+            return method(*args, **kwargs)
+
+        self.zino1.create_event_from_id = counted
+
+    def test_applied_without_round_trip(self):
+        old = self.zino1.events[raw_event_id]
+        version = self.zino1.versions[raw_event_id]
+        self.zino1.session.push.pending.append(NotifierResponse(raw_event_id, "state", "ignored working"))
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        event = self.zino1.events[raw_event_id]
+        self.assertEqual(event.adm_state, AdmState.WORKING)
+        self.assertEqual(old.adm_state, AdmState.IGNORED)
+        self.assertEqual(self.zino1.versions[raw_event_id], version + 1)
+        self.assertEqual(self.changed, [raw_event_id])
+        self.assertEqual(self.fetched, [])
+        self.assertEqual(self.updates.stats["applied"], 1)
+
+    def test_verified_later(self):
+        self.zino1.session.push.pending.append(NotifierResponse(raw_event_id, "state", "ignored working"))
+        self.updates.get_event_update()
+        self.now += 1
+        self.assertFalse(self.updates.get_event_update())
+        self.now += 1.5
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        self.assertEqual(self.fetched, [raw_event_id])
+        # The fake server still says "ignored"
+        self.assertEqual(self.zino1.events[raw_event_id].adm_state, AdmState.IGNORED)
+        self.assertEqual(self.changed, [raw_event_id, raw_event_id])
+
+    def test_unknown_event_is_fetched(self):
+        self.zino1.events.clear()
+        self.zino1.session.push.pending.append(NotifierResponse(raw_event_id, "state", "embryonic open"))
+        self.assertEqual(self.updates.get_event_update(), raw_event_id)
+        self.assertEqual(self.fetched, [raw_event_id])
+        self.assertEqual(self.updates.stats["applied"], 0)
+
+    def test_failing_subscriber_is_logged(self):
+        def fail(event_id):
+            raise ValueError(event_id)
+
+        self.updates.subscribe(fail)
+        self.zino1.session.push.pending.append(NotifierResponse(raw_event_id, "state", "ignored working"))
+        with self.assertLogs('zinolib.controllers.zino1', level='ERROR'):
+            self.updates.get_event_update()
+        self.assertEqual(self.changed, [raw_event_id])
+
+
+class TailCacheTest(unittest.TestCase):
+
+    def test_first_time_is_a_miss(self):
+        tail = TailCache()
+        self.assertIsNone(tail.parsed(1, raw_log))
+        self.assertEqual(tail.stats, {"hits": 0, "misses": 1})
+
+    def test_new_suffix(self):
+        tail = TailCache()
+        tail.remember(1, raw_log[:1], ["entry"])
+        self.assertEqual(tail.parsed(1, raw_log), (["entry"], raw_log[1:]))
+        self.assertEqual(tail.parsed(1, raw_log[:1]), (["entry"], []))
+        self.assertEqual(tail.stats, {"hits": 2, "misses": 0})
+
+    def test_entries_are_copied(self):
+        tail = TailCache()
+        tail.remember(1, raw_log[:1], ["entry"])
+        entries, _ = tail.parsed(1, raw_log)
+        entries.append("more")
+        self.assertEqual(tail.parsed(1, raw_log), (["entry"], raw_log[1:]))
+
+    def test_prefix_mismatch(self):
+        tail = TailCache()
+        tail.remember(1, raw_log, ["a", "b"])
+        self.assertIsNone(tail.parsed(1, raw_log[:1]))
+        self.assertIsNone(tail.parsed(1, ["1 other", raw_log[1]]))
+
+    def test_changed_middle_line(self):
+        tail = TailCache()
+        lines = ["1 first", "2 second", "3 third"]
+        tail.remember(1, lines, ["a", "b", "c"])
+        self.assertIsNone(tail.parsed(1, ["1 first", "2 changed", "3 third", "4 fourth"]))
+
+    def test_continued_history_entry(self):
+        tail = TailCache()
+        tail.remember(1, raw_history[:2], ["a", "b"])
+        self.assertIsNone(tail.parsed(1, raw_history))
+        tail.remember(1, raw_history[:4], ["a", "b"])
+        self.assertEqual(tail.parsed(1, raw_history), (["a", "b"], raw_history[4:]))
+
+    def test_forget(self):
+        tail = TailCache()
+        tail.remember(1, raw_log, ["a", "b"])
+        tail.forget(1)
+        self.assertIsNone(tail.parsed(1, raw_log))
+
+
+class IncrementalHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zino1 = FakeZino1EventManager.configure(None)
+        self.zino1.get_events()
+        self.lines = {"history": raw_history[:4], "log": raw_log[:1]}
+        lines = self.lines
+
+        class GrowingHistoryAdapter(FakeHistoryAdapter):
+            @staticmethod
+            def get_history(request, event_id):
+                return list(lines["history"])
+
+        class GrowingLogAdapter(FakeLogAdapter):
+            @staticmethod
+            def get_log(request, event_id):
+                return list(lines["log"])
+
+        self.zino1._history_adapter = GrowingHistoryAdapter
+        self.zino1._log_adapter = GrowingLogAdapter
+
+    def fetch(self):
+        event = self.zino1.get_updated_event_for_id(raw_event_id)
+        self.zino1._set_event(event)
+        return event
+
+    def test_appends_new_entries(self):
+        first = self.fetch()
+        self.assertEqual(len(first.history), 2)
+        self.assertEqual(len(first.log), 1)
+        self.lines["history"] = raw_history
+        self.lines["log"] = raw_log
+        second = self.fetch()
+        self.assertIs(second.history[0], first.history[0])
+        self.assertIs(second.log[0], first.log[0])
+        full = HistoryEntry.create_list(HistoryAdapter.parse_response(raw_history))
+        self.assertEqual(second.history, full)
+        self.assertEqual(len(second.log), 2)
+        self.assertEqual(self.zino1.history_tail.stats, {"hits": 1, "misses": 1})
+
+    def test_rebuilds_on_mismatch(self):
+        self.fetch()
+        self.lines["log"] = ["1683159999 rewritten log message"]
+        event = self.fetch()
+        self.assertEqual([entry.log for entry in event.log], ["rewritten log message"])
+        self.assertEqual(self.zino1.log_tail.stats, {"hits": 0, "misses": 2})
@@ -0,0 +1,83 @@
+import socket
+import unittest
+
+from zinolib.framing import LineFramer
+
+
+class LineFramerTest(unittest.TestCase):
+
+    def test_next_line_returns_complete_lines_only(self):
+        framer = LineFramer()
+        framer.feed(b"200 ok\r\n303 foo")
+        self.assertEqual(framer.next_line(), "200 ok")
+        self.assertIsNone(framer.next_line())
+        framer.feed(b"\r\n")
+        self.assertEqual(framer.next_line(), "303 foo")
+        self.assertEqual(len(framer), 0)
+        self.assertEqual(framer.pending, b"")
+
+    def test_delimiter_split_across_feeds_is_found(self):
+        framer = LineFramer()
+        framer.feed(b"abc\r")
+        self.assertIsNone(framer.next_line())
+        framer.feed(b"\ndef\r\n")
+        self.assertEqual(list(framer), ["abc", "def"])
+
+    def test_multibyte_character_split_across_feeds_is_decoded_once(self):
+        framer = LineFramer()
+        encoded = "blåbær\r\n".encode("UTF-8")
+        framer.feed(encoded[:3])
+        self.assertIsNone(framer.next_line())
+        framer.feed(encoded[3:])
+        self.assertEqual(framer.next_line(), "blåbær")
+
+    def test_invalid_utf8_falls_back_to_cp1252(self):
+        framer = LineFramer()
+        framer.feed(b"\x80 \xe6\r\n")
+        self.assertEqual(framer.next_line(), "€ \xe6")
+
+    def test_consumed_counts_bytes_not_characters(self):
+        framer = LineFramer()
+        framer.count_bytes()
+        framer.feed("blåbær\r\n".encode("UTF-8") + b"\x80 \xe6\r\nok\r\n")
+        self.assertEqual(framer.next_line(), "blåbær")
+        self.assertEqual(framer.consumed, 10)
+        self.assertEqual(list(framer), ["€ \xe6", "ok"])
+        self.assertEqual(framer.consumed, 19)
+
+    def test_consumed_is_not_counted_by_default(self):
+        framer = LineFramer()
+        framer.feed(b"200 ok\r\n")
+        framer.next_line()
+        self.assertEqual(framer.consumed, 0)
+
+    def test_pending_holds_unconsumed_bytes(self):
+        framer = LineFramer()
+        framer.feed(b"a\r\nbc")
+        framer.next_line()
+        self.assertEqual(framer.pending, b"bc")
+        framer.clear()
+        self.assertEqual(framer.pending, b"")
+
+    def test_compaction_keeps_lines_intact(self):
+        framer = LineFramer()
+        framer.COMPACT_THRESHOLD = 8
+        lines = [f"line {i}" for i in range(100)]
+        for line in lines:
+            framer.feed(line.encode() + b"\r\n")
+            self.assertEqual(framer.next_line(), line)
+
+    def test_readline_reads_from_socket(self):
+        left, right = socket.socketpair()
+        try:
+            framer = LineFramer(left, recv_buffer=4)
+            right.sendall(b"304 list follows\r\n1\r\n.\r\n")
+            self.assertEqual(framer.readline(), "304 list follows")
+            self.assertEqual(framer.readline(), "1")
+            self.assertEqual(framer.readline(), ".")
+            right.sendall(b"partial")
+            right.close()
+            self.assertIsNone(framer.readline())
+            self.assertEqual(framer.pending, b"partial")
+        finally:
+            left.close()
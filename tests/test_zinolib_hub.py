@@ -0,0 +1,96 @@
+import socket
+import time
+import unittest
+
+from zinolib.hub import NotifierHub
+from zinolib.ritz import NotConnectedError, NotifierResponse, notifier
+
+
+class NotifierHubTest(unittest.TestCase):
+    def setUp(self):
+        self.lost = []
+        self.hub = NotifierHub(on_disconnect=lambda *args: self.lost.append(args))
+        self.notifiers = {}
+        self.servers = {}
+        for name in ("zino1", "zino2", "zino3"):
+            notify = notifier(None)
+            sock, self.servers[name] = socket.socketpair()
+            sock.setblocking(False)
+            notify._attach(sock)
+            self.notifiers[name] = notify
+            self.hub.register(notify, name)
+
+    def tearDown(self):
+        self.hub.close()
+        for notify in self.notifiers.values():
+            if notify._sock:
+                notify._sock.close()
+        for server in self.servers.values():
+            server.close()
+
+    def test_nothing_to_read(self):
+        self.assertEqual(self.hub.poll(timeout=0), [])
+
+    def test_waits_for_timeout(self):
+        start = time.monotonic()
+        self.assertEqual(self.hub.poll(timeout=0.05), [])
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_register_unconnected(self):
+        with self.assertRaises(NotConnectedError):
+            self.hub.register(notifier(None), "zino4")
+
+    def test_reads_from_all(self):
+        self.servers["zino1"].sendall(b"1 attr\r\n2 log\r\n")
+        self.servers["zino3"].sendall(b"3 state open working\r\n")
+        updates = sorted(self.hub.poll(timeout=1))
+        self.assertEqual(
+            updates,
+            [
+                ("zino1", NotifierResponse(1, "attr", "")),
+                ("zino1", NotifierResponse(2, "log", "")),
+                ("zino3", NotifierResponse(3, "state", "open working")),
+            ],
+        )
+
+    def test_keeps_order_per_server(self):
+        self.servers["zino2"].sendall(b"".join(b"%d attr\r\n" % i for i in range(3000)))
+        ids = [update.id for _, update in self.hub.poll(timeout=1)]
+        self.assertEqual(ids, list(range(3000)))
+
+    def test_max_items(self):
+        self.servers["zino1"].sendall(b"1 attr\r\n2 log\r\n")
+        self.servers["zino2"].sendall(b"3 attr\r\n")
+        first = self.hub.poll(timeout=1, max_items=2)
+        self.assertEqual(len(first), 2)
+        rest = self.hub.poll(timeout=1)
+        self.assertEqual(sorted(u.id for _, u in first + rest), [1, 2, 3])
+
+    def test_disconnect_is_per_server(self):
+        self.servers["zino1"].sendall(b"1 attr\r\n")
+        self.servers["zino1"].close()
+        self.servers["zino2"].sendall(b"2 attr\r\n")
+        updates = []
+        for _ in range(3):
+            updates.extend(self.hub.poll(timeout=0.1))
+        self.assertEqual(sorted(updates), [
+            ("zino1", NotifierResponse(1, "attr", "")),
+            ("zino2", NotifierResponse(2, "attr", "")),
+        ])
+        self.assertEqual([lost[0] for lost in self.lost], ["zino1"])
+        self.assertIsInstance(self.lost[0][2], NotConnectedError)
+        self.assertNotIn(self.notifiers["zino1"], self.hub)
+        self.assertEqual(len(self.hub), 2)
+        self.servers["zino3"].sendall(b"3 attr\r\n")
+        self.assertEqual(self.hub.poll(timeout=1), [("zino3", NotifierResponse(3, "attr", ""))])
+
+    def test_garbage_is_skipped(self):
+        self.servers["zino1"].sendall(b"garbage\r\n1 attr\r\n")
+        with self.assertLogs("zinolib.hub", level="WARNING"):
+            self.assertEqual(self.hub.poll(timeout=1), [])
+        self.assertEqual(self.hub.poll(timeout=0), [("zino1", NotifierResponse(1, "attr", ""))])
+
+    def test_unregister(self):
+        self.assertEqual(self.hub.unregister(self.notifiers["zino2"]), "zino2")
+        self.servers["zino2"].sendall(b"2 attr\r\n")
+        self.assertEqual(self.hub.poll(timeout=0.05), [])
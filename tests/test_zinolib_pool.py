@@ -0,0 +1,145 @@
+import threading
+import unittest
+
+from zinolib.pool import RitzPool, PoolTimeoutError, is_healthy
+from zinolib.ritz import NotConnectedError, ProtocolError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRequest:
+    def __init__(self, number):
+        self.number = number
+        self.connected = True
+        self.healthy = True
+        self.closed = False
+
+    def get_raw_attributes(self, caseid):
+        if not self.healthy:
+            raise BrokenPipeError
+        raise ProtocolError((500, "no such case"))
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class RitzPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+        self.clock = FakeClock()
+
+    def factory(self):
+        request = FakeRequest(len(self.created))
+        self.created.append(request)
+        return request
+
+    def make_pool(self, **kwargs):
+        return RitzPool(self.factory, clock=self.clock, **kwargs)
+
+    def test_is_healthy(self):
+        request = FakeRequest(0)
+        self.assertTrue(is_healthy(request))
+        request.healthy = False
+        self.assertFalse(is_healthy(request))
+
+    def test_is_healthy_with_other_test(self):
+        def test_connection(session):
+            raise TimeoutError("Timed out waiting for data")
+
+        self.assertFalse(is_healthy(FakeRequest(0), test_connection))
+
+    def test_sessions_are_reused(self):
+        pool = self.make_pool(size=2)
+        with pool.session() as first:
+            pass
+        with pool.session() as second:
+            self.assertIs(first, second)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(pool.idle, 1)
+        self.assertEqual(pool.in_use, 0)
+
+    def test_checkout_times_out_when_pool_is_exhausted(self):
+        pool = self.make_pool(size=1)
+        request = pool.checkout()
+        self.clock.now = 0  # the deadline is already passed
+        with self.assertRaises(PoolTimeoutError):
+            pool.checkout(timeout=0)
+        pool.checkin(request)
+        self.assertIs(pool.checkout(timeout=0), request)
+
+    def test_checkout_waits_for_checkin(self):
+        pool = RitzPool(self.factory, size=1)
+        request = pool.checkout()
+        got = []
+        thread = threading.Thread(target=lambda: got.append(pool.checkout(timeout=5)))
+        thread.start()
+        pool.checkin(request)
+        thread.join()
+        self.assertEqual(got, [request])
+
+    def test_idle_sessions_are_evicted(self):
+        pool = self.make_pool(size=1, max_idle=10)
+        with pool.session() as first:
+            pass
+        self.clock.now = 11
+        with pool.session() as second:
+            self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    def test_unhealthy_sessions_are_replaced(self):
+        pool = self.make_pool(size=1, check_after=5)
+        with pool.session() as first:
+            pass
+        first.healthy = False
+        self.clock.now = 6
+        with pool.session() as second:
+            self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.idle, 1)
+
+    def test_broken_sessions_are_thrown_away(self):
+        pool = self.make_pool(size=1)
+        with self.assertRaises(BrokenPipeError):
+            with pool.session() as first:
+                raise BrokenPipeError
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.idle, 0)
+        self.assertEqual(pool.in_use, 0)
+
+    def test_timed_out_sessions_are_kept(self):
+        pool = self.make_pool(size=1)
+        with self.assertRaises(TimeoutError):
+            with pool.session() as first:
+                raise TimeoutError
+        self.assertFalse(first.closed)
+        self.assertEqual(pool.idle, 1)
+
+    def test_run_retries_once_on_a_new_session(self):
+        pool = self.make_pool(size=1)
+        used = []
+
+        def function(request):
+            used.append(request)
+            if request.number == 0:
+                raise NotConnectedError("Lost connection to server: broken pipe")
+            return "ok"
+
+        self.assertEqual(pool.run(function), "ok")
+        self.assertEqual([request.number for request in used], [0, 1])
+
+    def test_closed_pool_refuses_checkout(self):
+        pool = self.make_pool(size=1)
+        with pool.session() as request:
+            pass
+        pool.close()
+        self.assertTrue(request.closed)
+        with self.assertRaises(NotConnectedError):
+            pool.checkout()
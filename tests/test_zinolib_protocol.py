@@ -0,0 +1,88 @@
+import unittest
+
+from zinolib.protocol import (
+    END, HEADER, LINE,
+    DataResponse, NotifierResponse, ProtocolError,
+    NotificationParser, ResponseParser, is_single_line, parse_header,
+)
+
+
+class HeaderTest(unittest.TestCase):
+
+    def test_parse_header(self):
+        self.assertEqual(parse_header("200 ok"), (200, "ok"))
+        self.assertEqual(parse_header("304 list follows"), (304, "list follows"))
+        for garbage in ("", "ok", "abc def", "200"):
+            with self.assertRaises(ProtocolError):
+                parse_header(garbage)
+
+    def test_is_single_line(self):
+        for code in (200, 302, 500, 599):
+            self.assertTrue(is_single_line(code))
+        for code in (300, 301, 303, 304):
+            self.assertFalse(is_single_line(code))
+
+
+class ResponseParserTest(unittest.TestCase):
+
+    def test_events(self):
+        parser = ResponseParser()
+        parser.feed(b"304 list follows\r\n1\r")
+        self.assertEqual(list(parser), [(HEADER, (304, "list follows"))])
+        self.assertTrue(parser.in_response)
+        parser.feed(b"\n.\r\n500 no\r\n302 go on\r\n")
+        self.assertEqual(list(parser), [
+            (LINE, "1"),
+            (END, (304, "list follows")),
+            (END, (500, "no")),
+            (END, (302, "go on")),
+        ])
+        self.assertFalse(parser.in_response)
+
+    def test_responses_across_feeds(self):
+        parser = ResponseParser()
+        data = b"200 ok\r\n303 attrs\r\nid: 1\r\nstate: open\r\n.\r\n200 bye\r\n"
+        responses = []
+        for i in range(len(data)):
+            parser.feed(data[i:i + 1])
+            responses.extend(parser.responses())
+        self.assertEqual(responses, [
+            DataResponse("ok", (200, "ok")),
+            DataResponse(["id: 1", "state: open"], (303, "attrs")),
+            DataResponse("bye", (200, "bye")),
+        ])
+
+    def test_dot_is_data_inside_a_line(self):
+        parser = ResponseParser()
+        parser.feed(b"301 log\r\n . \r\n..\r\n.\r\n")
+        self.assertEqual(parser.next_response().data, [" . ", ".."])
+
+    def test_eof_returns_partial_response(self):
+        parser = ResponseParser()
+        parser.feed(b"304 list\r\n1\r\n2")
+        self.assertIsNone(parser.next_response())
+        self.assertEqual(parser.eof(), DataResponse(["1"], (304, "list")))
+        self.assertIsNone(parser.eof())
+
+    def test_illegal_header(self):
+        parser = ResponseParser()
+        parser.feed(b"something-gurba-happened\r\n")
+        with self.assertRaises(ProtocolError):
+            parser.next_event()
+
+
+class NotificationParserTest(unittest.TestCase):
+
+    def test_notifications(self):
+        parser = NotificationParser()
+        parser.feed(b"32802 state open working\r\n32802 at")
+        self.assertEqual(parser.next_notification(), NotifierResponse(32802, "state", "open working"))
+        self.assertIsNone(parser.next_notification())
+        parser.feed(b"tr\r\n")
+        self.assertEqual(list(parser), [NotifierResponse(32802, "attr", "")])
+
+    def test_illegal_notification(self):
+        parser = NotificationParser()
+        parser.feed(b"garbage\r\n")
+        with self.assertRaises(ProtocolError):
+            parser.next_notification()
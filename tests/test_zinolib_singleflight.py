@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from zinolib.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def run_concurrently(self, flight, key, function, count=3):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do(key, function)))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_calls_share_one_request(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        threads, results = self.run_concurrently(flight, ("getattrs", 1), fetch)
+        # Wait until every caller is either running or waiting
+        while flight.hits + flight.misses < 3:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["result"] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats, {"hits": 2, "misses": 1})
+
+    def test_sequential_calls_are_not_shared(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+        self.assertEqual(flight.stats, {"hits": 0, "misses": 2})
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def fetch():
+            release.wait(5)
+            raise ValueError("boom")
+
+        def call():
+            try:
+                flight.do("key", fetch)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while flight.hits + flight.misses < 2:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 2)
+
+    def test_forget_starts_a_new_request(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return "old"
+
+        thread = threading.Thread(target=lambda: flight.do("key", slow))
+        thread.start()
+        while flight.misses < 1:
+            threading.Event().wait(0.001)
+        flight.forget("key")
+        self.assertEqual(flight.do("key", lambda: "new"), "new")
+        release.set()
+        thread.join()
+        self.assertEqual(flight.stats, {"hits": 0, "misses": 2})
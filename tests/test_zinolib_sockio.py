@@ -0,0 +1,49 @@
+import socket
+import unittest
+
+from zinolib.sockio import CountingSocket, SocketStats
+
+
+class CountingSocketTest(unittest.TestCase):
+
+    def setUp(self):
+        left, right = socket.socketpair()
+        self.sock = CountingSocket(left)
+        self.peer = right
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def test_counts_sends(self):
+        self.sock.sendall(b"caseids\r\n")
+        self.assertEqual(self.sock.send(b"x"), 1)
+        self.assertEqual(self.sock.stats.sends, 2)
+        self.assertEqual(self.sock.stats.bytes_sent, 10)
+
+    def test_counts_receives_and_short_reads(self):
+        self.peer.sendall(b"abcdef")
+        self.assertEqual(self.sock.recv(4), b"abcd")
+        buffer = bytearray(8)
+        self.assertEqual(self.sock.recv_into(buffer), 2)
+        stats = self.sock.stats
+        self.assertEqual(stats.recvs, 2)
+        self.assertEqual(stats.bytes_received, 6)
+        self.assertEqual(stats.short_reads, 1)
+
+    def test_wait_readable(self):
+        self.assertFalse(self.sock.wait_readable(0))
+        self.peer.sendall(b"a")
+        self.assertTrue(self.sock.wait_readable(1))
+        self.assertEqual(self.sock.stats.selects, 2)
+
+    def test_shared_stats_and_reset(self):
+        stats = SocketStats()
+        other = CountingSocket(self.peer, stats)
+        self.sock.stats = stats
+        other.sendall(b"ab")
+        self.sock.recv(2)
+        self.assertEqual(stats.as_dict()["bytes_sent"], 2)
+        self.assertEqual(stats.as_dict()["bytes_received"], 2)
+        stats.reset()
+        self.assertEqual(stats.bytes_sent, 0)
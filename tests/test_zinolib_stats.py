@@ -0,0 +1,53 @@
+import unittest
+
+from zinolib.stats import Histogram, RequestStats, command_verb
+
+
+class CommandVerbTest(unittest.TestCase):
+
+    def test_command_verb(self):
+        self.assertEqual(command_verb(b"getattrs 123\r\n"), "getattrs")
+        self.assertEqual(command_verb(b"pm log 12\r\n"), "pm log")
+        self.assertEqual(command_verb(b"caseids"), "caseids")
+        self.assertEqual(command_verb(None), "connect")
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_values_land_in_the_right_buckets(self):
+        histogram = Histogram((1, 10, 100))
+        for value in (0.5, 1, 5, 50, 500):
+            histogram.add(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.min, 0.5)
+        self.assertEqual(histogram.max, 500)
+        self.assertEqual(histogram.quantile(0.5), 10)
+        self.assertEqual(histogram.quantile(1.0), 500)
+
+    def test_empty_histogram(self):
+        histogram = Histogram((1,))
+        self.assertIsNone(histogram.mean)
+        self.assertIsNone(histogram.quantile(0.5))
+
+
+class RequestStatsTest(unittest.TestCase):
+
+    def test_record_per_verb(self):
+        stats = RequestStats()
+        stats.record("getattrs", 0.001, 0.002, 300, 12)
+        stats.record("getattrs", 0.001, 0.004, 300, 12)
+        stats.record("caseids", 0.01, 0.5, 60000, 10000)
+        snapshot = stats.snapshot()
+        self.assertEqual(set(snapshot), {"getattrs", "caseids"})
+        self.assertEqual(snapshot["getattrs"]["total"]["count"], 2)
+        self.assertEqual(stats["caseids"].lines.max, 10000)
+        stats.reset()
+        self.assertEqual(stats.snapshot(), {})
+
+    def test_slow_callback(self):
+        slow = []
+        stats = RequestStats(slow_threshold=0.1, on_slow=lambda *args: slow.append(args))
+        stats.record("getattrs", 0.001, 0.002, 300, 12, b"getattrs 1\r\n")
+        stats.record("getlog", 0.001, 0.2, 300, 12, b"getlog 1\r\n")
+        self.assertEqual(slow, [("getlog", 0.2, b"getlog 1\r\n")])
@@ -0,0 +1,77 @@
+import io
+import unittest
+
+from zinolib.framing import LineFramer
+from zinolib.ritz import ritz
+from zinolib.trace import (
+    DATA, NOTIFY, RECV, SEND, ReplaySocket, TraceWriter, read_trace,
+)
+from zinolib.zino_emu import zinoemu
+
+from .utils import executor
+
+
+class TraceFileTest(unittest.TestCase):
+
+    def test_roundtrip(self):
+        f = io.BytesIO()
+        trace = TraceWriter(f)
+        trace.write(DATA, SEND, b"caseids\r\n")
+        trace.write(DATA, RECV, memoryview(b"\x80\xe6\r\n"))
+        trace.write(NOTIFY, RECV, b"")
+        trace.close()
+        f.seek(0)
+        records = list(read_trace(f))
+        self.assertEqual(
+            [(r.channel, r.direction, r.data) for r in records],
+            [(DATA, SEND, b"caseids\r\n"), (DATA, RECV, b"\x80\xe6\r\n"), (NOTIFY, RECV, b"")],
+        )
+        self.assertTrue(records[0].time <= records[1].time <= records[2].time)
+
+    def test_truncated_trace_stops_at_last_whole_record(self):
+        f = io.BytesIO()
+        trace = TraceWriter(f)
+        trace.write(DATA, RECV, b"200 ok\r\n")
+        trace.write(DATA, RECV, b"more")
+        f = io.BytesIO(f.getvalue()[:-2])
+        self.assertEqual([r.data for r in read_trace(f)], [b"200 ok\r\n"])
+
+    def test_not_a_trace(self):
+        with self.assertRaises(ValueError):
+            list(read_trace(io.BytesIO(b"garbage garbage garbage")))
+
+    def test_replay_socket(self):
+        f = io.BytesIO()
+        trace = TraceWriter(f)
+        trace.write(DATA, RECV, b"304 list follows\r\n1\r")
+        trace.write(NOTIFY, RECV, b"1 state open closed\r\n")
+        trace.write(DATA, RECV, b"\n.\r\n")
+        f.seek(0)
+        framer = LineFramer(ReplaySocket(read_trace(f), DATA), recv_buffer=8)
+        self.assertEqual(
+            [framer.readline() for _ in range(4)],
+            ["304 list follows", "1", ".", None],
+        )
+
+
+class TraceSessionTest(unittest.TestCase):
+
+    def test_ritz_session_is_traced(self):
+        f = io.BytesIO()
+        trace = TraceWriter(f)
+        with zinoemu(executor):
+            with ritz("127.0.0.1", username="testuser", password="test", trace=trace) as sess:
+                caseids = sess.get_caseids()
+        trace.close()
+        f.seek(0)
+        records = list(read_trace(f))
+        sent = b"".join(r.data for r in records if r.direction == SEND)
+        self.assertTrue(sent.endswith(b"caseids\r\n"))
+        # Replay the recorded responses to a session that is not connected
+        replayed = ritz("127.0.0.1")
+        replayed._attach(ReplaySocket(records, DATA))
+        replayed._outstanding = 2
+        replayed._request(None)  # The greeting
+        replayed._request(None)  # The response to "user"
+        replayed.connStatus = replayed.authenticated = True
+        self.assertEqual(replayed.get_caseids(), caseids)
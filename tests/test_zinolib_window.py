@@ -0,0 +1,51 @@
+import unittest
+
+from zinolib.window import AdaptiveWindow
+
+
+def run_rounds(window, rounds, latency):
+    "Feed ``latency(size)`` for every response of ``rounds`` rounds"
+    for _ in range(rounds):
+        size = window.size
+        for _ in range(size):
+            window.observe(latency(size))
+
+
+class AdaptiveWindowTest(unittest.TestCase):
+
+    def test_slow_start_doubles_while_latency_is_flat(self):
+        window = AdaptiveWindow(initial=4, maximum=64)
+        run_rounds(window, 3, lambda size: 0.05)
+        self.assertEqual(window.size, 32)
+        self.assertTrue(window.slow_start)
+        run_rounds(window, 5, lambda size: 0.05)
+        self.assertEqual(window.size, 64)
+
+    def test_settles_where_commands_start_to_queue(self):
+        # The network takes 10ms, the server 1ms per command: more than
+        # about 10 commands in flight only queue up in the server
+        window = AdaptiveWindow(initial=4)
+        run_rounds(window, 50, lambda size: max(0.010, size * 0.001))
+        self.assertFalse(window.slow_start)
+        self.assertTrue(10 <= window.size <= 16, window.size)
+        self.assertAlmostEqual(window.min_rtt, 0.010)
+
+    def test_backs_off_on_overload(self):
+        window = AdaptiveWindow(initial=16)
+        run_rounds(window, 1, lambda size: 0.01)
+        self.assertEqual(window.size, 32)
+        run_rounds(window, 1, lambda size: 0.1)
+        self.assertEqual(window.size, 16)
+        self.assertFalse(window.slow_start)
+        self.assertEqual(window.stats["decreases"], 1)
+
+    def test_reset(self):
+        window = AdaptiveWindow(initial=2)
+        run_rounds(window, 2, lambda size: 0.01)
+        window.reset()
+        self.assertEqual(window.stats["size"], 2)
+        self.assertIsNone(window.stats["srtt"])
+
+    def test_bounds_are_checked(self):
+        with self.assertRaises(ValueError):
+            AdaptiveWindow(initial=8, maximum=4)
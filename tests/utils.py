@@ -53,6 +53,7 @@ def executor(client):
             "303 simple attributes follow, terminated with '.'\r\n",
             "state: open\r\nrouter: oslo-gw1\r\ntype: bgp\r\nopened: 1539480952\r\nremote-addr: 193.108.152.34\r\nid: 40959\r\npeer-uptime: 503\r\nupdated: 1539485757\r\npolladdr: 128.39.0.1\r\npriority: 500\r\nbgpOS: established\r\nremote-AS: 21357\r\nbgpAS: running\r\nlastevent: peer was reset (now up)\r\n.\r\n",
         ],
+        "getattrs 40960\r\n": ["500 no such case\r\n"],
         "gethist 40959\r\n": [
             "301 history follows, terminated with '.'\r\n",
             "1539480952 state change embryonic -> open (monitor)\r\n1539509123 runarb\r\n Testmelding ifra pyRitz\r\n \r\n.\r\n",